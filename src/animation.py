@@ -1,5 +1,7 @@
-from typing import List, Dict, TYPE_CHECKING
+import logging
+from typing import List, Dict, Tuple, Optional, TYPE_CHECKING
 
+import numpy as np
 import pygame
 from pygame.surface import Surface
 
@@ -9,6 +11,8 @@ from src.utils import Milliseconds, load_scaled_surfaces
 if TYPE_CHECKING:
     from src.scene import GameScene
 
+log = logging.getLogger(__name__)
+
 
 class AnimationException(Exception):
     pass
@@ -19,21 +23,57 @@ class Animation(object):
     Class defining a discrete animation of multiple frames.
     The 'speed' determines the number of milliseconds between two
     frames and is constant during the whole animation.
+    Mirrored variants of the frames are built once and shared by all
+    copies of the animation.
     """
     frames: List[Surface]
+    # frames by (flip_x, flip_y), shared by all copies of the animation
+    flipped_frames: Dict[Tuple[bool, bool], List[Surface]]
     speed: Milliseconds  # number of milliseconds between two frames
     loop: bool  # whether to loop this animation
     start_time: Milliseconds  # when did this animation start
     current_time: Milliseconds  # internal number of ms for the animation
 
     def __init__(self, frames: List[Surface], speed: Milliseconds,
-                 loop: bool = False):
+                 loop: bool = False,
+                 flipped_frames: Optional[
+                     Dict[Tuple[bool, bool], List[Surface]]] = None):
         self.frames = frames
+        self.flipped_frames = {(False, False): frames} \
+            if flipped_frames is None else flipped_frames
         self.speed = speed
         self.loop = loop
         self.start_time = 0
         self.current_time = 0
 
+    def add_flipped_frames(self, flip_x: bool, flip_y: bool,
+                           frames: List[Surface] = None) -> 'Animation':
+        """Pre-build a mirrored variant of the frames.
+        :param frames: the mirrored frames (flipped from the original
+        frames if not given)
+        :return: this animation"""
+        if frames is None:
+            frames = [pygame.transform.flip(frame, flip_x, flip_y)
+                      for frame in self.frames]
+        if len(frames) != len(self.frames):
+            raise AnimationException(
+                f"Mirrored animation has {len(frames)} frames, "
+                f"expected {len(self.frames)}")
+
+        self.flipped_frames[(flip_x, flip_y)] = frames
+        return self
+
+    def get_frames(self, flip_x: bool = False,
+                   flip_y: bool = False) -> List[Surface]:
+        """:return: the frames (mirrored according to the flips)"""
+        frames = self.flipped_frames.get((flip_x, flip_y))
+        if frames is None:
+            log.warning(f"Mirrored frames (flip_x={flip_x}, "
+                        f"flip_y={flip_y}) were not pre-built")
+            frames = self.add_flipped_frames(flip_x, flip_y).flipped_frames[
+                (flip_x, flip_y)]
+        return frames
+
     def start(self, current_time: Milliseconds = None) -> None:
         """Starts the animation from the beginning."""
         self.current_time = current_time
@@ -45,6 +85,10 @@ class Animation(object):
         """
         return self.start_time
 
+    def update(self, current_time: Milliseconds) -> None:
+        """Moves the animation to 'current_time' without getting its frame."""
+        self.current_time = current_time
+
     def get_duration(self) -> Milliseconds:
         return len(self.frames) * self.speed
 
@@ -52,25 +96,29 @@ class Animation(object):
         return (not self.loop
                 and self._get_animation_time() >= self.get_duration())
 
-    def get_image(self, current_time: Milliseconds) -> Surface:
+    def get_image(self, current_time: Milliseconds, flip_x: bool = False,
+                  flip_y: bool = False) -> Surface:
         """Get the corresponding animation frame.
         :return: the surface of the frame that should be active at 'current_time'
+        (from the pre-built mirrored frames if any flip is requested)
         """
         self.current_time = current_time
-        time = self._get_animation_time()
+        return self.get_frames(flip_x, flip_y)[self._get_frame_index()]
 
-        frame_index = time // self.speed
+    def _get_frame_index(self) -> int:
+        """:return: index of the frame active at the current time"""
+        frame_index = self._get_animation_time() // self.speed
 
         if frame_index < len(self.frames):
-            return self.frames[frame_index]
+            return frame_index
         else:
             # there are no images that far in the animation
             if self.loop:
                 # return cyclic animation if looping is enabled
-                return self.frames[frame_index % len(self.frames)]
+                return frame_index % len(self.frames)
             else:
                 # return last image if looping is not enabled
-                return self.frames[-1]
+                return len(self.frames) - 1
 
     def _get_animation_time(self) -> Milliseconds:
         return self.current_time - self.start_time
@@ -79,8 +127,8 @@ class Animation(object):
         """Creates a new copy of this animation. The frames are
         shallow-copied, other attributes are deep-copied.
         :return a copy of this animation"""
-        # return Animation(self.frames, self.speed, self.loop)
-        return Animation(self.frames, self.speed, self.loop)
+        return Animation(self.frames, self.speed, self.loop,
+                         self.flipped_frames)
 
 
 class LinearAlphaFadeAnimation(Animation):
@@ -88,27 +136,152 @@ class LinearAlphaFadeAnimation(Animation):
     Animates frames so that the first frame is opaque and the
     last frame is transparent. Frames in between are interpolated
     linearly.
+    The alpha is quantized into 'alpha_levels' levels - copies of each
+    frame with the alpha of every level multiplied into their pixels are
+    built once and shared by all copies of the animation (the frames are
+    never modified). The copies are blitted without any surface alpha.
     """
+    alpha_levels: int
+    # frames by (flip_x, flip_y), frame index and alpha level
+    fade_tables: Dict[Tuple[bool, bool], List[List[Surface]]]
 
     def __init__(self, frames: List[Surface], speed: Milliseconds,
-                 loop: bool = False):
-        super().__init__(frames, speed, loop)
-
-    def get_image(self, current_time: Milliseconds) -> Surface:
-        image = super().get_image(current_time)
+                 loop: bool = False,
+                 flipped_frames: Optional[
+                     Dict[Tuple[bool, bool], List[Surface]]] = None,
+                 alpha_levels: int = ALPHA_FADE_LEVELS,
+                 fade_tables: Optional[
+                     Dict[Tuple[bool, bool], List[List[Surface]]]] = None):
+        super().__init__(frames, speed, loop, flipped_frames)
+        if alpha_levels < 2:
+            raise AnimationException(f"At least 2 alpha levels are needed, "
+                                     f"got {alpha_levels}")
+        self.alpha_levels = alpha_levels
+        self.fade_tables = {} if fade_tables is None else fade_tables
+
+    def get_image(self, current_time: Milliseconds, flip_x: bool = False,
+                  flip_y: bool = False) -> Surface:
+        self.current_time = current_time
         time = self._get_animation_time()
         duration = self.get_duration()
 
         # determine how much alpha should the image have (from 1. to 0.)
         alpha_fraction = (duration - time) / duration if time < duration else 0
-        # rescale it to the 0-255 values (255 is opaque)
-        alpha = int(255 * alpha_fraction)
+        # round it to the nearest of the pre-built alpha levels
+        level = int(alpha_fraction * (self.alpha_levels - 1) + 0.5)
+
+        return self.get_fade_table(flip_x, flip_y)[
+            self._get_frame_index()][level]
+
+    def get_fade_table(self, flip_x: bool = False,
+                       flip_y: bool = False) -> List[List[Surface]]:
+        """:return: faded copies of the frames for every alpha level
+        (built on the first use of the flips)"""
+        table = self.fade_tables.get((flip_x, flip_y))
+        if table is None:
+            table = self._build_fade_table(self.get_frames(flip_x, flip_y))
+            self.fade_tables[(flip_x, flip_y)] = table
+        return table
+
+    def _build_fade_table(self,
+                          frames: List[Surface]) -> List[List[Surface]]:
+        # repeated frames share their faded copies
+        faded_frames = {}
+        for frame in frames:
+            if id(frame) not in faded_frames:
+                faded_frames[id(frame)] = [
+                    self._fade(frame, 255 * level // (self.alpha_levels - 1))
+                    for level in range(self.alpha_levels)]
+        return [faded_frames[id(frame)] for frame in frames]
+
+    @staticmethod
+    def _fade(frame: Surface, alpha: int) -> Surface:
+        """:return: copy of the frame with per-pixel alpha multiplied
+        by alpha / 255 (the opaque level is the frame itself)"""
+        if alpha == 255:
+            return frame
+
+        if frame.get_flags() & pygame.SRCALPHA:
+            faded_frame = frame.copy()
+        else:
+            faded_frame = Surface(frame.get_size(), pygame.SRCALPHA)
+            faded_frame.blit(frame, (0, 0))
 
-        image.set_alpha(alpha)
-        return image
+        pixel_alphas = pygame.surfarray.pixels_alpha(faded_frame)
+        pixel_alphas[:] = pixel_alphas.astype(np.uint16) * alpha // 255
+        del pixel_alphas  # unlocks the surface
+        return faded_frame
 
     def copy(self) -> 'LinearAlphaFadeAnimation':
-        return LinearAlphaFadeAnimation(self.frames, self.speed, self.loop)
+        return LinearAlphaFadeAnimation(self.frames, self.speed, self.loop,
+                                        self.flipped_frames,
+                                        self.alpha_levels, self.fade_tables)
+
+
+class AnimationClock(object):
+    """
+    Moves to the time of each frame once and computes the current frame
+    of every looping animation (clip) once for all the sprites showing it.
+    Clips are the looping animations of the animation manager, they all
+    start at time 0. A sprite only keeps its phase - the number of frames
+    by which it is ahead of the shared clip.
+    """
+    animation_manager: 'AnimationManager'
+    current_time: Milliseconds
+    clips: Dict[str, Animation]
+    frame_indices: Dict[str, int]  # frame index of each clip at current_time
+
+    def __init__(self, animation_manager: 'AnimationManager',
+                 current_time: Milliseconds = 0):
+        self.animation_manager = animation_manager
+        self.clips = {}
+        self.frame_indices = {}
+        self.tick(current_time)
+
+    def tick(self, current_time: Milliseconds) -> Milliseconds:
+        """Move the clips to the time of this frame.
+        :return: the time of the frame"""
+        self.current_time = current_time
+        self.frame_indices.clear()
+        return self.current_time
+
+    def get_clip(self, name: str) -> Animation:
+        """:return: the shared looping animation (loaded on the first use)"""
+        clip = self.clips.get(name)
+        if clip is None:
+            clip = self.animation_manager.get_animation(name)
+            if not clip.loop:
+                raise AnimationException(f"Animation '{name}' does not loop "
+                                         f"and can not be a shared clip")
+            clip.start(0)
+            self.clips[name] = clip
+        return clip
+
+    def get_frame_index(self, name: str) -> int:
+        """:return: index of the frame of the clip active at current_time
+        (computed once per tick)"""
+        frame_index = self.frame_indices.get(name)
+        if frame_index is None:
+            clip = self.get_clip(name)
+            clip.update(self.current_time)
+            frame_index = clip._get_frame_index()
+            self.frame_indices[name] = frame_index
+        return frame_index
+
+    def get_phase(self, name: str, start_time: Milliseconds = None) -> int:
+        """:return: phase making the clip appear to start from its first
+        frame at 'start_time' (at current_time if not given)"""
+        clip = self.get_clip(name)
+        if start_time is None:
+            start_time = self.current_time
+        return -(start_time // clip.speed) % len(clip.frames)
+
+    def get_image(self, name: str, phase: int = 0, flip_x: bool = False,
+                  flip_y: bool = False) -> Surface:
+        """:return: the current frame of the clip shifted by 'phase' frames
+        (from the pre-built mirrored frames if any flip is requested)"""
+        frames = self.get_clip(name).get_frames(flip_x, flip_y)
+        return frames[(self.get_frame_index(name) + phase) % len(frames)]
 
 
 class FallbackAnimator(object):
@@ -117,13 +290,21 @@ class FallbackAnimator(object):
     and multiple one-shot animations.
     Whenever a one-shot animation ends,
     the animator switches to the looping animation.
+    If a clock is given, the looping animation is the clock's shared clip
+    of the same name (shown at the time of the clock) and only its phase
+    is kept by the animator.
     """
     fallback_animation_name: str
     animations: Dict[str, Animation]
     current_animation: Animation
+    clock: Optional[AnimationClock]
+    fallback_phase: int  # phase of the clip of the looping animation
 
-    def __init__(self, animations: Dict[str, Animation]):
+    def __init__(self, animations: Dict[str, Animation],
+                 clock: Optional[AnimationClock] = None):
         self.animations = animations
+        self.clock = clock
+        self.fallback_phase = 0
 
         n_looping_animations = 0
         for animation_name, animation in animations.items():
@@ -140,7 +321,7 @@ class FallbackAnimator(object):
 
     def start(self, current_time: Milliseconds) -> None:
         """Start animating the looping animation."""
-        self.current_animation.start(current_time)
+        self._start_fallback(current_time)
 
     def start_animation(self, animation_name: str,
                         current_time: Milliseconds) -> None:
@@ -152,12 +333,16 @@ class FallbackAnimator(object):
         self.current_animation = self.animations[animation_name]
         self.current_animation.start(current_time)
 
-    def get_image(self, current_time: Milliseconds) -> Surface:
+    def get_image(self, current_time: Milliseconds, flip_x: bool = False,
+                  flip_y: bool = False) -> Surface:
         """Get the corresponding frame of current animation.
         :return: the surface of the animation frame"""
+        if self._is_fallback_clocked():
+            return self.clock.get_image(self.fallback_animation_name,
+                                        self.fallback_phase, flip_x, flip_y)
 
         current_animation_frame = self.current_animation.get_image(
-            current_time)
+            current_time, flip_x, flip_y)
 
         if not self.current_animation.is_over():
             # current animation frame is from the correct animation
@@ -172,73 +357,108 @@ class FallbackAnimator(object):
                 raise AnimationException("Unexpected animator timing")
 
             # switch to fallback animation
-            self.current_animation = self.animations[
-                self.fallback_animation_name]
-            self.current_animation.start(end)
-            return self.current_animation.get_image(current_time)
+            self._start_fallback(end)
+            return self.get_image(current_time, flip_x, flip_y)
+
+    def _start_fallback(self, start_time: Milliseconds) -> None:
+        self.current_animation = self.animations[self.fallback_animation_name]
+        self.current_animation.start(start_time)
+        if self.clock is not None:
+            self.fallback_phase = self.clock.get_phase(
+                self.fallback_animation_name, start_time)
+
+    def _is_fallback_clocked(self) -> bool:
+        return (self.clock is not None and self.current_animation
+                is self.animations[self.fallback_animation_name])
 
 
 class AnimationManager(object):
     animations: Dict[str, Animation]
 
     def __init__(self, scene: 'GameScene'):
-        scale_factor = scene.settings.scale_factor
+        scale_factor = scene.settings.render_scale
 
         dash_image = load_scaled_surfaces(ANIM_VIZARD_DASH, scale_factor)[0]
         ascent_image = load_scaled_surfaces(ANIM_VIZARD_ASCENT, scale_factor)[0]
         descent_image = load_scaled_surfaces(ANIM_VIZARD_DESCENT, scale_factor)[0]
-
+        dash_image_left = load_scaled_surfaces(
+            ANIM_VIZARD_DASH, scale_factor, flip_x=True)[0]
+        ascent_image_left = load_scaled_surfaces(
+            ANIM_VIZARD_ASCENT, scale_factor, flip_x=True)[0]
+        descent_image_left = load_scaled_surfaces(
+            ANIM_VIZARD_DESCENT, scale_factor, flip_x=True)[0]
+        shard_pointer_images = load_scaled_surfaces(
+            ANIM_PARTICLE_SHARD_POINTER, scale_factor)
+        shard_pointer_images_south = load_scaled_surfaces(
+            ANIM_PARTICLE_SHARD_POINTER, scale_factor, flip_y=True)
+
+        def load_mirrored_frames(path: str) -> Tuple[List[Surface],
+                                                      List[Surface]]:
+            return (load_scaled_surfaces(path, scale_factor),
+                    load_scaled_surfaces(path, scale_factor, flip_x=True))
+
+        # the character and the directional particles get their
+        # mirrored frames pre-built instead of flipping them every frame
         self.animations = {
             # character movement
-            "idle": Animation(
-                load_scaled_surfaces(ANIM_VIZARD_IDLE, scale_factor),
-                600, loop=True),
-            "dash": Animation(
-                load_scaled_surfaces(ANIM_VIZARD_DASH, scale_factor),
-                100),
-            "ascent": Animation(
-                load_scaled_surfaces(ANIM_VIZARD_ASCENT, scale_factor),
-                100
-            ),
-            "descent": Animation(
-                load_scaled_surfaces(ANIM_VIZARD_DESCENT, scale_factor),
-                100
-            ),
-            "blink-in": Animation(
-                load_scaled_surfaces(ANIM_VIZARD_BLINK_IN, scale_factor),
-                100
+            "idle": self._build_mirrored_animation(
+                *load_mirrored_frames(ANIM_VIZARD_IDLE), 600, loop=True),
+            "dash": self._build_mirrored_animation(
+                *load_mirrored_frames(ANIM_VIZARD_DASH), 100),
+            "ascent": self._build_mirrored_animation(
+                *load_mirrored_frames(ANIM_VIZARD_ASCENT), 100),
+            "descent": self._build_mirrored_animation(
+                *load_mirrored_frames(ANIM_VIZARD_DESCENT), 100),
+            "blink-in": self._build_mirrored_animation(
+                *load_mirrored_frames(ANIM_VIZARD_BLINK_IN), 100),
+            "shard-idle": Animation(
+                load_scaled_surfaces(ANIM_SHARD_IDLE, scale_factor),
+                75, loop=True
             ),
             "particle-dash-right":
-                LinearAlphaFadeAnimation([dash_image.copy()], 150),
+                LinearAlphaFadeAnimation([dash_image], 150),
             "particle-dash-left": LinearAlphaFadeAnimation(
-                [pygame.transform.flip(dash_image, True, False)], 150),
+                [dash_image_left], 150),
             "particle-ascent-right":
-                LinearAlphaFadeAnimation([ascent_image.copy()], 150),
+                LinearAlphaFadeAnimation([ascent_image], 150),
             "particle-ascent-left": LinearAlphaFadeAnimation(
-                [pygame.transform.flip(ascent_image, True, False)], 150),
+                [ascent_image_left], 150),
             "particle-descent-right":
-                LinearAlphaFadeAnimation([descent_image.copy()], 150),
+                LinearAlphaFadeAnimation([descent_image], 150),
             "particle-descent-left": LinearAlphaFadeAnimation(
-                [pygame.transform.flip(descent_image, True, False)], 150),
+                [descent_image_left], 150),
             "particle-blink-in": Animation(
                 load_scaled_surfaces(ANIM_PARTICLE_BLINK_IN, scale_factor),
                 70
             ),
-            "particle-blink-out": Animation(
-                load_scaled_surfaces(ANIM_PARTICLE_BLINK_OUT, scale_factor),
-                70
-            ),
+            "particle-blink-out": self._build_mirrored_animation(
+                *load_mirrored_frames(ANIM_PARTICLE_BLINK_OUT), 70),
             "particle-shard-collected": Animation(
                 load_scaled_surfaces(ANIM_PARTICLE_SHARD_COLLECTED,
                                      scale_factor),
                 70
             ),
             "particle-shard-pointer": LinearAlphaFadeAnimation(
-                load_scaled_surfaces(ANIM_PARTICLE_SHARD_POINTER,
-                                     scale_factor) * 10,
+                shard_pointer_images * 10,
                 100
-            ),
+            ).add_flipped_frames(False, True, shard_pointer_images_south * 10),
         }
 
+        # build the alpha levels of the fading animations in advance
+        for animation in self.animations.values():
+            if isinstance(animation, LinearAlphaFadeAnimation):
+                for flip_x, flip_y in animation.flipped_frames:
+                    animation.get_fade_table(flip_x, flip_y)
+
+    @staticmethod
+    def _build_mirrored_animation(frames: List[Surface],
+                                  mirrored_frames: List[Surface],
+                                  speed: Milliseconds,
+                                  loop: bool = False) -> Animation:
+        return Animation(frames, speed, loop).add_flipped_frames(
+            True, False, mirrored_frames)
+
     def get_animation(self, name: str) -> Animation:
+        """:return: a new copy of the animation - its mirrored variants
+        are available through the flips of 'Animation.get_image'"""
         return self.animations[name].copy()
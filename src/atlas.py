@@ -0,0 +1,217 @@
+"""
+Sprite atlas packing all graphic assets into a single image.
+
+Build the atlas (from the working directory of the game) with:
+
+    python -m src.atlas
+
+At runtime the atlas image is decoded and scaled once and the individual
+frames are served as its subsurfaces.
+"""
+import argparse
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import pygame
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+from src.bundle import open_asset, asset_exists
+from src.constants import ATLAS_ROOT, ATLAS_IMAGE, ATLAS_MANIFEST, \
+    ATLAS_WIDTH_PX, ATLAS_PADDING_PX
+
+log = logging.getLogger(__name__)
+
+
+class AtlasException(Exception):
+    pass
+
+
+def find_frames(root: str) -> List[str]:
+    """:return: sorted paths (relative to 'root') of all PNG images"""
+    frames = []
+    for directory, _, files in os.walk(root):
+        for file in files:
+            if file.lower().endswith(".png"):
+                path = os.path.relpath(os.path.join(directory, file), root)
+                frames.append(path.replace(os.sep, "/"))
+    return sorted(frames)
+
+
+def pack_frames(sizes: Dict[str, Tuple[int, int]], width: int,
+                padding: int = ATLAS_PADDING_PX
+                ) -> Tuple[Tuple[int, int], Dict[str, Rect]]:
+    """
+    Pack rectangles of the given sizes into shelves (rows) of an atlas.
+    The tallest frames are placed first so the shelves are filled evenly.
+    :return: size of the atlas and the placement of each frame
+    """
+    width = max([width] + [w + 2 * padding for w, _ in sizes.values()])
+    placement = {}
+    x, y, shelf_height = padding, padding, 0
+
+    for name in sorted(sizes, key=lambda n: (-sizes[n][1], n)):
+        w, h = sizes[name]
+        if x + w + padding > width:
+            x, y = padding, y + shelf_height + padding
+            shelf_height = 0
+        placement[name] = Rect(x, y, w, h)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+
+    return (width, y + shelf_height + padding), placement
+
+
+def build_atlas(root: str = ATLAS_ROOT, image_path: str = ATLAS_IMAGE,
+                manifest_path: str = ATLAS_MANIFEST,
+                width: int = ATLAS_WIDTH_PX) -> Dict[str, Rect]:
+    """Pack all images found under 'root' into one atlas image
+    and write its manifest (placement of the images within the atlas)."""
+    images = {name: pygame.image.load(os.path.join(root, name))
+              for name in find_frames(root)}
+    if not images:
+        raise AtlasException(f"No images found in {root}")
+
+    size, placement = pack_frames(
+        {name: image.get_size() for name, image in images.items()}, width)
+
+    atlas = Surface(size, pygame.SRCALPHA, depth=32)
+    atlas.blits([(images[name], rect) for name, rect in placement.items()],
+                doreturn=False)
+
+    os.makedirs(os.path.dirname(os.path.abspath(image_path)), exist_ok=True)
+    pygame.image.save(atlas, image_path)
+    with open(manifest_path, "w") as manifest:
+        json.dump({
+            "image": os.path.relpath(image_path,
+                                     os.path.dirname(manifest_path)),
+            "frames": {name: list(rect)
+                       for name, rect in sorted(placement.items())},
+        }, manifest, indent=1)
+
+    log.info(f"Packed {len(placement)} images into {image_path} "
+             f"({size[0]}x{size[1]})")
+    return placement
+
+
+class SpriteAtlas(object):
+    """
+    Serves frames as subsurfaces of a single (scaled) atlas surface.
+    Frames are identified by their paths relative to the atlas root.
+    """
+    image: Surface
+    frames: Dict[str, Rect]
+    scaled_images: Dict[int, Surface]  # by integer scale factors
+
+    def __init__(self, image: Surface, frames: Dict[str, Rect]):
+        self.image = image
+        self.frames = frames
+        self.scaled_images = {1: image}
+
+    def contains(self, name: str) -> bool:
+        return name in self.frames
+
+    def list_directory(self, directory: str) -> List[str]:
+        """:return: sorted names of the frames within the directory"""
+        prefix = directory.rstrip("/") + "/"
+        return sorted(name for name in self.frames
+                      if name.startswith(prefix)
+                      and "/" not in name[len(prefix):])
+
+    def get_frame(self, name: str, scale_factor: float) -> Surface:
+        """
+        :return: surface of the frame scaled by 'scale_factor' - a subsurface
+        of the scaled atlas (shares its pixels) for integer scale factors,
+        a separately scaled copy otherwise
+        """
+        rect = self.frames.get(name)
+        if rect is None:
+            raise AtlasException(f"Frame {name} is not in the atlas")
+
+        if scale_factor == int(scale_factor):
+            scale = int(scale_factor)
+            return self._get_scaled_image(scale).subsurface(
+                Rect(rect.x * scale, rect.y * scale,
+                     rect.w * scale, rect.h * scale))
+
+        # frame borders would not be aligned to the pixels of a scaled atlas
+        return pygame.transform.scale(self.image.subsurface(rect), (
+            int(rect.w * scale_factor), int(rect.h * scale_factor)))
+
+    def _get_scaled_image(self, scale: int) -> Surface:
+        image = self.scaled_images.get(scale)
+        if image is None:
+            w, h = self.image.get_size()
+            image = pygame.transform.scale(self.image, (w * scale, h * scale))
+            self.scaled_images[scale] = image
+        return image
+
+
+def read_atlas_manifest(manifest_path: str = ATLAS_MANIFEST
+                        ) -> Tuple[str, Dict[str, Rect]]:
+    """:return: path to the atlas image and the placement of its frames"""
+    with open_asset(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    image_path = os.path.join(os.path.dirname(manifest_path),
+                              manifest["image"])
+    frames = {name: Rect(*rect) for name, rect in manifest["frames"].items()}
+    return image_path, frames
+
+
+def load_sprite_atlas(manifest_path: str = ATLAS_MANIFEST) -> SpriteAtlas:
+    image_path, frames = read_atlas_manifest(manifest_path)
+    with open_asset(image_path) as image_file:
+        image = pygame.image.load(image_file, image_path).convert_alpha()
+
+    log.debug(f"Loaded sprite atlas with {len(frames)} frames")
+    return SpriteAtlas(image, frames)
+
+
+_sprite_atlas: Optional[SpriteAtlas] = None
+_sprite_atlas_loaded = False
+
+
+def get_sprite_atlas() -> Optional[SpriteAtlas]:
+    """:return: the process-wide sprite atlas or None if it was not built"""
+    global _sprite_atlas, _sprite_atlas_loaded
+    if not _sprite_atlas_loaded:
+        _sprite_atlas_loaded = True
+        if asset_exists(ATLAS_MANIFEST):
+            _sprite_atlas = load_sprite_atlas(ATLAS_MANIFEST)
+        else:
+            log.info(f"No sprite atlas found at {ATLAS_MANIFEST} - "
+                     f"images are loaded separately")
+    return _sprite_atlas
+
+
+def set_sprite_atlas(atlas: Optional[SpriteAtlas]) -> None:
+    """Replace the process-wide sprite atlas (e.g. by a preloaded one)."""
+    global _sprite_atlas, _sprite_atlas_loaded
+    _sprite_atlas = atlas
+    _sprite_atlas_loaded = True
+
+
+def get_atlas_name(path: str, root: str = ATLAS_ROOT) -> Optional[str]:
+    """:return: name of the asset within the atlas or None if the path
+    lies outside of the atlas root"""
+    relative = os.path.relpath(os.path.normpath(path), os.path.normpath(root))
+    if relative.startswith(os.pardir):
+        return None
+    return relative.replace(os.sep, "/")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Pack the graphic assets into a sprite atlas")
+    parser.add_argument("--root", default=ATLAS_ROOT)
+    parser.add_argument("--image", default=ATLAS_IMAGE)
+    parser.add_argument("--manifest", default=ATLAS_MANIFEST)
+    parser.add_argument("--width", type=int, default=ATLAS_WIDTH_PX)
+    args = parser.parse_args()
+
+    build_atlas(args.root, args.image, args.manifest, args.width)
@@ -0,0 +1,232 @@
+"""
+Single-file bundle of all the game assets.
+
+The bundle starts with an index of all the packed files (name, offset
+and length) followed by their contents. It is memory-mapped once and
+the files are read from the mapping without any further system calls.
+
+Pack the 'assets' directory (from the working directory of the game) with:
+
+    python -m src.bundle
+"""
+import argparse
+import io
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Tuple, IO
+
+from src.constants import ASSETS_ROOT, ASSET_BUNDLE
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"VZBN"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")  # magic, version, number of entries
+ENTRY = struct.Struct("<HQQ")  # length of the name, offset, length
+
+
+class BundleException(Exception):
+    pass
+
+
+def pack_bundle(root: str = ASSETS_ROOT,
+                bundle_path: str = ASSET_BUNDLE) -> Dict[str, int]:
+    """Pack all files found under 'root' into a single bundle.
+    :return: lengths of the packed files by their names"""
+    names = []
+    for directory, _, files in os.walk(root):
+        for file in files:
+            path = os.path.relpath(os.path.join(directory, file), root)
+            names.append(path.replace(os.sep, "/"))
+    names.sort()
+
+    contents = []
+    for name in names:
+        with open(os.path.join(root, name), "rb") as file:
+            contents.append(file.read())
+
+    encoded_names = [name.encode("utf-8") for name in names]
+    offset = HEADER.size + sum(ENTRY.size + len(encoded)
+                               for encoded in encoded_names)
+
+    temporary_path = f"{bundle_path}.tmp"
+    with open(temporary_path, "wb") as bundle:
+        bundle.write(HEADER.pack(MAGIC, VERSION, len(names)))
+        for encoded, content in zip(encoded_names, contents):
+            bundle.write(ENTRY.pack(len(encoded), offset, len(content)))
+            bundle.write(encoded)
+            offset += len(content)
+        for content in contents:
+            bundle.write(content)
+    os.replace(temporary_path, bundle_path)
+
+    log.info(f"Packed {len(names)} files into {bundle_path} ({offset} B)")
+    return {name: len(content) for name, content in zip(names, contents)}
+
+
+class AssetBundle(object):
+    """Memory-mapped bundle of assets identified by their paths
+    relative to the assets root (e.g. 'maps/default.txt')."""
+    data: mmap.mmap
+    index: Dict[str, Tuple[int, int]]  # offset and length by name
+
+    def __init__(self, bundle_path: str):
+        with open(bundle_path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = self._read_index()
+
+    def contains(self, name: str) -> bool:
+        return name in self.index
+
+    def read(self, name: str) -> memoryview:
+        """:return: view of the file contents (without copying them)"""
+        entry = self.index.get(name)
+        if entry is None:
+            raise BundleException(f"File {name} is not in the bundle")
+        offset, length = entry
+        return memoryview(self.data)[offset:offset + length]
+
+    def open(self, name: str) -> IO[bytes]:
+        """:return: file-like object with the contents of the file"""
+        return io.BytesIO(self.read(name))
+
+    def close(self) -> None:
+        self.data.close()
+
+    def list_directory(self, directory: str) -> List[str]:
+        """:return: sorted names of the files within the directory"""
+        prefix = directory.rstrip("/") + "/"
+        return sorted(name for name in self.index
+                      if name.startswith(prefix)
+                      and "/" not in name[len(prefix):])
+
+    def find(self, directory: str) -> List[str]:
+        """:return: sorted names of all the files under the directory"""
+        prefix = directory.rstrip("/") + "/"
+        return sorted(name for name in self.index if name.startswith(prefix))
+
+    def _read_index(self) -> Dict[str, Tuple[int, int]]:
+        try:
+            magic, version, n_entries = HEADER.unpack_from(self.data)
+        except struct.error:
+            raise BundleException("Bundle is too short")
+        if magic != MAGIC or version != VERSION:
+            raise BundleException(f"Unsupported bundle format "
+                                  f"({magic}, version {version})")
+
+        index = {}
+        position = HEADER.size
+        for _ in range(n_entries):
+            name_length, offset, length = ENTRY.unpack_from(self.data,
+                                                            position)
+            position += ENTRY.size
+            name = self.data[position:position + name_length].decode("utf-8")
+            position += name_length
+
+            if offset + length > len(self.data):
+                raise BundleException(f"File {name} exceeds the bundle")
+            index[name] = (offset, length)
+        return index
+
+
+_asset_bundle: Optional[AssetBundle] = None
+_asset_bundle_loaded = False
+
+
+def get_asset_bundle() -> Optional[AssetBundle]:
+    """:return: the process-wide asset bundle or None if it was not packed"""
+    global _asset_bundle, _asset_bundle_loaded
+    if not _asset_bundle_loaded:
+        _asset_bundle_loaded = True
+        if os.path.exists(ASSET_BUNDLE):
+            _asset_bundle = AssetBundle(ASSET_BUNDLE)
+            log.debug(f"Loaded asset bundle with "
+                      f"{len(_asset_bundle.index)} files")
+        else:
+            log.info(f"No asset bundle found at {ASSET_BUNDLE} - "
+                     f"assets are loaded from separate files")
+    return _asset_bundle
+
+
+def get_bundle_name(path: str, root: str = ASSETS_ROOT) -> Optional[str]:
+    """:return: name of the asset within the bundle or None if the path
+    lies outside of the assets root"""
+    relative = os.path.relpath(os.path.normpath(path), os.path.normpath(root))
+    if relative.startswith(os.pardir):
+        return None
+    return relative.replace(os.sep, "/")
+
+
+def _find_in_bundle(path: str) -> Optional[Tuple[AssetBundle, str]]:
+    """:return: the bundle and the name of the asset within it
+    or None if the asset is not bundled"""
+    bundle = get_asset_bundle()
+    name = get_bundle_name(path)
+    if bundle is None or name is None:
+        return None
+    return bundle, name
+
+
+def is_bundled(path: str) -> bool:
+    found = _find_in_bundle(path)
+    return found is not None and found[0].contains(found[1])
+
+
+def asset_exists(path: str) -> bool:
+    return is_bundled(path) or os.path.exists(path)
+
+
+def open_asset(path: str) -> IO[bytes]:
+    """Open the asset for binary reading - from the bundle
+    if it is packed there, otherwise from its separate file."""
+    if is_bundled(path):
+        bundle, name = _find_in_bundle(path)
+        return bundle.open(name)
+    return open(path, "rb")
+
+
+def read_asset_text(path: str) -> str:
+    with open_asset(path) as file:
+        return file.read().decode("utf-8")
+
+
+def find_assets(root: str, extension: str) -> List[str]:
+    """:return: sorted paths of all the assets under 'root'
+    with the given extension"""
+    found = _find_in_bundle(root)
+    if found is not None:
+        bundle, name = found
+        paths = [os.path.join(root, os.path.relpath(asset, name))
+                 for asset in bundle.find(name) if asset.endswith(extension)]
+        if paths:
+            return paths
+
+    paths = []
+    for directory, _, files in os.walk(root):
+        paths.extend(os.path.join(directory, file) for file in files
+                     if file.endswith(extension))
+    return sorted(paths)
+
+
+def list_asset_directory(path: str) -> List[str]:
+    """:return: sorted names of the files within the asset directory"""
+    found = _find_in_bundle(path)
+    if found is not None:
+        names = found[0].list_directory(found[1])
+        if names:
+            return [os.path.basename(name) for name in names]
+    return sorted(os.listdir(path))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Pack the assets into a single bundle")
+    parser.add_argument("--root", default=ASSETS_ROOT)
+    parser.add_argument("--bundle", default=ASSET_BUNDLE)
+    args = parser.parse_args()
+
+    pack_bundle(args.root, args.bundle)
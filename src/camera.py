@@ -0,0 +1,129 @@
+from typing import Dict, Iterator, List, Tuple
+
+from pygame.sprite import Group, Sprite
+from pygame.surface import Surface
+
+from src.constants import TILE_SIZE_PX, WIDTH_IN_TILES, HEIGHT_IN_TILES
+from src.utils import Position, Point
+
+
+class Camera(object):
+    """
+    Viewport of the world. The camera owns the vertical shift of the view
+    (the first visible row) and converts tile positions to screen pixels
+    using lookup tables precomputed for the visible area.
+    """
+    scale_factor: float
+    vertical_shift: int  # the first visible row of the world
+    width: int  # in tiles
+    height: int  # in tiles
+    margin: int  # rows around the view with precomputed pixel coordinates
+
+    column_px: List[int]  # screen x of the left edge of each column
+    row_px: List[int]  # screen y of the top edge of each row relative to the view
+
+    def __init__(self, scale_factor: float, width: int = WIDTH_IN_TILES,
+                 height: int = HEIGHT_IN_TILES, margin: int = 2):
+        self.scale_factor = scale_factor
+        self.vertical_shift = 0
+        self.width = width
+        self.height = height
+        self.margin = margin
+
+        tile_size_px = TILE_SIZE_PX * scale_factor
+        self.column_px = [int(x * tile_size_px) for x in range(width + 1)]
+        self.row_px = [int(y * tile_size_px)
+                       for y in range(-margin, height + margin + 1)]
+
+    def shift(self, amount: int) -> int:
+        """Shift the view of the world by +amount rows.
+        :return the new vertical_shift"""
+        self.vertical_shift += amount
+        return self.vertical_shift
+
+    def follow(self, position: Position, padding: int = 2) -> None:
+        """Shift the view so that the position is at least 'padding' rows
+        away from the top and the bottom edge of the view."""
+        screen_y = position.y - self.vertical_shift
+        if screen_y < padding:
+            self.shift(screen_y - padding)
+        elif screen_y > self.height - 1 - padding:
+            self.shift(screen_y + padding - (self.height - 1))
+
+    def is_visible(self, y: int, margin: int = 0) -> bool:
+        """:return: True if the row y (extended by margin rows) is in view"""
+        return (self.vertical_shift - margin <= y
+                < self.vertical_shift + self.height + margin)
+
+    def visible_rows(self, margin: int = 0) -> range:
+        """:return: the rows in view (extended by margin rows)"""
+        return range(self.vertical_shift - margin,
+                     self.vertical_shift + self.height + margin)
+
+    def tile_to_px(self, position: Position,
+                   px_offset: Point = Point(0, 0)) -> Tuple[int, int]:
+        """
+        :param position: tile position in the world
+        :param px_offset: unscaled pixel offset from the top left tile corner
+        :return: screen pixel coordinates of the point
+        """
+        return (self._column_to_px(position.x)
+                + int(px_offset.x * self.scale_factor),
+                self.row_to_px(position.y)
+                + int(px_offset.y * self.scale_factor))
+
+    def row_to_px(self, y: int) -> int:
+        """:return: screen y of the top edge of the row y of the world"""
+        i = y - self.vertical_shift + self.margin
+        if 0 <= i < len(self.row_px):
+            return self.row_px[i]
+        return int((y - self.vertical_shift) * TILE_SIZE_PX * self.scale_factor)
+
+    def _column_to_px(self, x: int) -> int:
+        if 0 <= x < len(self.column_px):
+            return self.column_px[x]
+        return int(x * TILE_SIZE_PX * self.scale_factor)
+
+
+class CameraGroup(Group):
+    """
+    Sprite group that updates and draws only the sprites in view of the camera.
+    Sprites are indexed by their row, so the cost of a frame depends on the
+    number of visible sprites only. Sprites must not change their row and
+    have to implement get_tile_position().
+    """
+    camera: Camera
+    margin: int  # rows around the view that are still considered visible
+    rows: Dict[int, Dict[Sprite, None]]  # ordered sets of sprites by rows
+
+    def __init__(self, camera: Camera, *sprites: Sprite, margin: int = 2):
+        self.camera = camera
+        self.margin = margin
+        self.rows = {}
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite: Sprite, *args) -> None:
+        super().add_internal(sprite, *args)
+        self.rows.setdefault(sprite.get_tile_position().y, {})[sprite] = None
+
+    def remove_internal(self, sprite: Sprite) -> None:
+        super().remove_internal(sprite)
+        row = self.rows.get(sprite.get_tile_position().y)
+        if row is not None:
+            row.pop(sprite, None)
+            if not row:
+                del self.rows[sprite.get_tile_position().y]
+
+    def visible_sprites(self) -> Iterator[Sprite]:
+        for y in self.camera.visible_rows(self.margin):
+            if y in self.rows:
+                # copy, sprites can remove themselves while being iterated
+                yield from list(self.rows[y])
+
+    def update(self, *args, **kwargs) -> None:
+        for sprite in self.visible_sprites():
+            sprite.update(*args, **kwargs)
+
+    def draw(self, surface: Surface) -> None:
+        surface.blits([(sprite.image, sprite.rect)
+                       for sprite in self.visible_sprites()], doreturn=False)
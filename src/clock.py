@@ -0,0 +1,99 @@
+"""
+Clocks timing the frames of the scenes.
+
+The clock is sampled once per frame - everything updated during the frame
+reads its 'current_time' instead of asking pygame for the ticks. The clock
+decides how the game time relates to the real time:
+
+* real-time - the game time is the real time, frames are paced
+  to TICK_SPEED frames per second
+* fixed - every frame advances the game time by a fixed step without
+  any waiting (deterministic, as fast as the CPU allows)
+* accelerated - frames are paced like in real-time, but the game time
+  runs 'speed' times faster (e.g. to fast-forward a replay)
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Type
+
+import pygame
+
+from src.constants import TICK_SPEED, TICK_DURATION
+from src.utils import Milliseconds
+
+
+class ClockException(Exception):
+    pass
+
+
+class FrameClock(ABC):
+    current_time: Milliseconds  # game time of the current frame
+
+    @abstractmethod
+    def tick(self) -> Milliseconds:
+        """End the current frame (waiting if the clock paces the frames)
+        and sample the time of the next one.
+        :return: the game time of the next frame"""
+        raise NotImplementedError
+
+
+class RealTimeClock(FrameClock):
+    clock: pygame.time.Clock
+    tick_speed: int  # frames per second
+
+    def __init__(self, tick_speed: int = TICK_SPEED):
+        self.clock = pygame.time.Clock()
+        self.tick_speed = tick_speed
+        self.current_time = pygame.time.get_ticks()
+
+    def tick(self) -> Milliseconds:
+        self.clock.tick(self.tick_speed)
+        self.current_time = pygame.time.get_ticks()
+        return self.current_time
+
+
+class FixedStepClock(FrameClock):
+    step: Milliseconds
+
+    def __init__(self, step: Milliseconds = TICK_DURATION,
+                 start_time: Milliseconds = 0):
+        self.step = step
+        self.current_time = start_time
+
+    def tick(self) -> Milliseconds:
+        self.current_time += self.step
+        return self.current_time
+
+
+class AcceleratedClock(RealTimeClock):
+    speed: float  # how many times faster than real time
+    real_start_time: Milliseconds
+
+    def __init__(self, speed: float, tick_speed: int = TICK_SPEED):
+        super().__init__(tick_speed)
+        if speed <= 0:
+            raise ClockException(f"Clock speed must be positive, got {speed}")
+        self.speed = speed
+        self.real_start_time = self.current_time
+
+    def tick(self) -> Milliseconds:
+        self.clock.tick(self.tick_speed)
+        self.current_time = self.real_start_time + int(
+            (pygame.time.get_ticks() - self.real_start_time) * self.speed)
+        return self.current_time
+
+
+CLOCK_MODES: Dict[str, Type[FrameClock]] = {
+    "real-time": RealTimeClock,
+    "fixed": FixedStepClock,
+    "accelerated": AcceleratedClock,
+}
+
+
+def create_frame_clock(mode: str, speed: float = 1.) -> FrameClock:
+    """:param speed: speed of the game time (for the accelerated mode)"""
+    if mode not in CLOCK_MODES:
+        raise ClockException(f"Unknown clock mode '{mode}', "
+                             f"expected one of {list(CLOCK_MODES)}")
+    if mode == "accelerated":
+        return AcceleratedClock(speed)
+    return CLOCK_MODES[mode]()
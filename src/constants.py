@@ -1,43 +1,80 @@
+from pathlib import Path
+
 import pygame
 
+# the paths below are relative to the repository root,
+# so they do not depend on the working directory
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CONFIG = str(ROOT_DIR / "config.yaml")
+
 VERSION = "Vizard_0.1"
 
 TILE_SIZE_PX = 16
 TICK_SPEED = 64
+TICK_DURATION = 1000 // TICK_SPEED  # in ms, of a fixed-step tick
 WIDTH_IN_TILES = 20
 HEIGHT_IN_TILES = 12
+BACKGROUND_COLOR = "dimgray"
+
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024  # in bytes
+TEXTURE_CACHE_DIR = str(ROOT_DIR / "cache/textures")  # scaled textures kept between runs
+CHUNK_CACHE_BUDGET = 32 * 1024 * 1024  # in bytes
+CHUNK_HEIGHT_IN_TILES = HEIGHT_IN_TILES  # rows of one pre-rendered strip
+TILE_VARIANT_SEED = 42  # seed of the random grass and stone variants
+ALPHA_FADE_LEVELS = 16  # pre-built alpha levels of fading animations
+PARTICLE_CAPACITY = 64  # initial number of particle slots (grows on demand)
+ASSET_LOADER_WORKERS = 4  # threads decoding the assets during startup
+HUD_FONT_SIZE = 20
+REPLAY_EXTENSIONS = (".txt", ".vzr")  # of the recordings found in directories
+REPLAY_VERIFICATION_CHUNK = 16  # recordings sent to a verifying process at once
+REPLAY_BLOCK_SIZE = 4096  # events in a block of a binary replay
+REPLAY_COMPRESSION = "zlib"  # of the blocks of the binary replays
+REPLAY_FLUSH_INTERVAL = 60_000  # in ms, the longest time span of a block
+REPLAY_STATE_HASH_INTERVAL = 16  # inputs between the recorded state hashes
 
 
 # asset paths
 
-IMG_VIZARD =            "../assets/graphics/characters/vizard/vizard.png"
-ANIM_VIZARD_IDLE =      "../assets/graphics/characters/vizard/animation/idle/"
-ANIM_VIZARD_DASH =      "../assets/graphics/characters/vizard/animation/dash/"
-ANIM_VIZARD_ASCENT =    "../assets/graphics/characters/vizard/animation/ascent/"
-ANIM_VIZARD_DESCENT =   "../assets/graphics/characters/vizard/animation/descent/"
-ANIM_VIZARD_BLINK_IN =  "../assets/graphics/characters/vizard/animation/blink-in/"
+ASSETS_ROOT =           str(ROOT_DIR / "assets")
+ASSET_BUNDLE =          str(ROOT_DIR / "assets.bundle")
+
+MAP_DEFAULT =           str(ROOT_DIR / "assets/maps/default.txt")
+FONT_JOYSTIX =          str(ROOT_DIR / "assets/fonts/joystix.monospace.ttf")
+
+ATLAS_ROOT =            str(ROOT_DIR / "assets/graphics")
+ATLAS_IMAGE =           str(ROOT_DIR / "assets/atlas/atlas.png")
+ATLAS_MANIFEST =        str(ROOT_DIR / "assets/atlas/atlas.json")
+ATLAS_WIDTH_PX = 256
+ATLAS_PADDING_PX = 1
+
+IMG_VIZARD =            str(ROOT_DIR / "assets/graphics/characters/vizard/vizard.png")
+ANIM_VIZARD_IDLE =      str(ROOT_DIR / "assets/graphics/characters/vizard/animation/idle")
+ANIM_VIZARD_DASH =      str(ROOT_DIR / "assets/graphics/characters/vizard/animation/dash")
+ANIM_VIZARD_ASCENT =    str(ROOT_DIR / "assets/graphics/characters/vizard/animation/ascent")
+ANIM_VIZARD_DESCENT =   str(ROOT_DIR / "assets/graphics/characters/vizard/animation/descent")
+ANIM_VIZARD_BLINK_IN =  str(ROOT_DIR / "assets/graphics/characters/vizard/animation/blink-in")
 
-IMG_SHARD =             "../assets/graphics/effects/shard/shard.png"
-ANIM_SHARD_IDLE =       "../assets/graphics/effects/shard/animation/idle/"
+IMG_SHARD =             str(ROOT_DIR / "assets/graphics/effects/shard/shard.png")
+ANIM_SHARD_IDLE =       str(ROOT_DIR / "assets/graphics/effects/shard/animation/idle")
 
-ANIM_PARTICLE_BLINK_IN = "../assets/graphics/particles/animation/blink-in/"
-ANIM_PARTICLE_BLINK_OUT = "../assets/graphics/particles/animation/blink-out/"
-ANIM_PARTICLE_SHARD_COLLECTED = "../assets/graphics/particles/animation/shard-collected/"
-ANIM_PARTICLE_SHARD_POINTER = "../assets/graphics/particles/animation/shard-pointer/"
+ANIM_PARTICLE_BLINK_IN = str(ROOT_DIR / "assets/graphics/particles/animation/blink-in")
+ANIM_PARTICLE_BLINK_OUT = str(ROOT_DIR / "assets/graphics/particles/animation/blink-out")
+ANIM_PARTICLE_SHARD_COLLECTED = str(ROOT_DIR / "assets/graphics/particles/animation/shard-collected")
+ANIM_PARTICLE_SHARD_POINTER = str(ROOT_DIR / "assets/graphics/particles/animation/shard-pointer")
 
-IMG_TILE_DIRT =         "../assets/graphics/environment/tile_dirt.png"
-IMG_TILE_DIRT_SIDES =   "../assets/graphics/environment/tile_dirt_sides.png"
-IMG_TILE_DIRT_LEFT_TOP = "../assets/graphics/environment/tile_dirt_left_top.png"
-IMG_TILE_DIRT_SIDES_TOP = "../assets/graphics/environment/tile_dirt_sides_top.png"
-IMG_TILE_DIRT_LEFT_SIDE = "../assets/graphics/environment/tile_dirt_left_side.png"
-IMG_TILE_DIRT_LEFT_SOLO = "../assets/graphics/environment/tile_dirt_left_solo.png"
+IMG_TILE_DIRT =         str(ROOT_DIR / "assets/graphics/environment/tile_dirt.png")
+IMG_TILE_DIRT_SIDES =   str(ROOT_DIR / "assets/graphics/environment/tile_dirt_sides.png")
+IMG_TILE_DIRT_LEFT_TOP = str(ROOT_DIR / "assets/graphics/environment/tile_dirt_left_top.png")
+IMG_TILE_DIRT_SIDES_TOP = str(ROOT_DIR / "assets/graphics/environment/tile_dirt_sides_top.png")
+IMG_TILE_DIRT_LEFT_SIDE = str(ROOT_DIR / "assets/graphics/environment/tile_dirt_left_side.png")
+IMG_TILE_DIRT_LEFT_SOLO = str(ROOT_DIR / "assets/graphics/environment/tile_dirt_left_solo.png")
 
 IMG_TILE_GRASS_LIST = [
-                        "../assets/graphics/environment/tile_grass_01.png",
-                        "../assets/graphics/environment/tile_grass_02.png",
+                        str(ROOT_DIR / "assets/graphics/environment/tile_grass_01.png"),
+                        str(ROOT_DIR / "assets/graphics/environment/tile_grass_02.png"),
 ]
 IMG_TILE_STONE_LIST = [
-                        "../assets/graphics/environment/tile_stone_01.png",
-                        "../assets/graphics/environment/tile_stone_02.png",
+                        str(ROOT_DIR / "assets/graphics/environment/tile_stone_01.png"),
+                        str(ROOT_DIR / "assets/graphics/environment/tile_stone_02.png"),
 ]
 
@@ -1,14 +1,17 @@
-import random
 from dataclasses import dataclass
-from typing import List, TYPE_CHECKING, Tuple, Dict, Any
+from typing import List, TYPE_CHECKING, Tuple, Dict, Any, Optional, \
+    NamedTuple
 
+import numpy as np
 from pygame import Surface
 
 from src.constants import *
 from src.settings import GameSettings
-from src.utils import Position, load_scaled_surface
+from src.utils import Position, CardinalDirection, load_scaled_surface
 
+from src.camera import Camera
 from src.renderer import AbstractRenderer
+from src.texture import SurfaceCache
 
 
 class EnvironmentException(Exception):
@@ -20,7 +23,22 @@ class CharacterEncodedMap(str):
     pass
 
 
-@dataclass
+# tile flags - every tile of the environment grid is a combination of these
+WALKABLE = 1
+DIRT = 2
+GRASS = 4
+STONE = 8
+
+# lookup table translating map characters (ascii codes) into tile flags,
+# the dirt flag depends on the character above and is resolved separately
+CHARACTER_FLAGS = np.zeros(256, dtype=np.uint8)
+CHARACTER_FLAGS[ord(".")] = WALKABLE
+CHARACTER_FLAGS[ord("S")] = WALKABLE
+CHARACTER_FLAGS[ord("/")] = WALKABLE | GRASS
+CHARACTER_FLAGS[ord("o")] = WALKABLE | STONE
+
+
+@dataclass(frozen=True)
 class Tile:
     walkable: bool
     dirt: bool
@@ -40,307 +58,510 @@ class Tile:
         return self.stone
 
 
+# every possible tile exists only once and is shared by the whole grid
+TILES_BY_FLAGS = [Tile(bool(flags & WALKABLE), bool(flags & DIRT),
+                       bool(flags & GRASS), bool(flags & STONE))
+                  for flags in range(16)]
+
+
+class VegetationIndex(object):
+    """
+    Run-length index of vegetation "words" in row-major order.
+    A word is a run of consecutive tiles of the same vegetation class,
+    runs continue from the end of one row to the start of the next row.
+    Every word is described by the flat index of its first and last tile.
+    """
+    starts: np.ndarray  # sorted flat indices of the first tile of each word
+    ends: np.ndarray  # sorted flat indices of the last tile of each word
+
+    def __init__(self, vegetation: np.ndarray):
+        """
+        :param vegetation: flat array of vegetation classes in row-major
+        order - 0 for tiles without vegetation
+        """
+        padded = np.concatenate(([0], vegetation, [0]))
+        boundaries = padded[1:] != padded[:-1]
+        self.starts = np.flatnonzero(boundaries[:-1] & (vegetation > 0))
+        self.ends = np.flatnonzero(boundaries[1:] & (vegetation > 0))
+
+    def next_start(self, index: int) -> Optional[int]:
+        """:return: the first word start after index or None"""
+        return self._at(self.starts,
+                        np.searchsorted(self.starts, index, side="right"))
+
+    def previous_start(self, index: int) -> Optional[int]:
+        """:return: the last word start before index or None"""
+        return self._at(self.starts,
+                        np.searchsorted(self.starts, index, side="left") - 1)
+
+    def next_end(self, index: int) -> Optional[int]:
+        """:return: the first word end after index or None"""
+        return self._at(self.ends,
+                        np.searchsorted(self.ends, index, side="right"))
+
+    def previous_end(self, index: int) -> Optional[int]:
+        """:return: the last word end before index or None"""
+        return self._at(self.ends,
+                        np.searchsorted(self.ends, index, side="left") - 1)
+
+    @staticmethod
+    def _at(indices: np.ndarray, i: int) -> Optional[int]:
+        if 0 <= i < len(indices):
+            return int(indices[i])
+        return None
+
+
 class Environment(object):
-    tiles: List[List[Tile]]  # tile matrix indexed by (y, x)
+    grid: np.ndarray  # flat array of tile flags indexed by y * width + x
+    width: int  # in number of tiles
+    height: int  # in number of tiles (including the bottom dirt row)
     starting_position: Position
+    word_index: VegetationIndex  # grass and stone are different words
+    chunk_index: VegetationIndex  # grass and stone form one word (chunk)
+    contours: Dict[str, np.ndarray]  # per-row x of the outermost tiles or -1
+    vegetation_rows: Dict[int, np.ndarray]  # nearest row with vegetation or -1
 
     def __init__(self, settings: GameSettings,
                  encoded_map: CharacterEncodedMap):
         self.settings = settings
-        self.tiles = self._construct_tiles(encoded_map)
-        self.starting_position = self._get_starting_position(encoded_map)
+        character_matrix = self._parse_characters(encoded_map)
+        self.height, self.width = (character_matrix.shape[0] + 1,
+                                   character_matrix.shape[1])
+        self.grid = self._construct_grid(character_matrix)
+        self.starting_position = self._get_starting_position(character_matrix)
+        self.word_index, self.chunk_index = self._construct_vegetation_indices()
+        self.contours = self._construct_contours()
+        self.vegetation_rows = self._construct_vegetation_rows()
 
     def get_tile_matrix(self) -> List[List[Tile]]:
-        return self.tiles
+        tiles = self.get_all_tiles()
+        return [tiles[y * self.width:(y + 1) * self.width]
+                for y in range(self.height)]
 
     def get_all_tiles(self) -> List[Tile]:
-        tiles = []
-        for row in self.tiles:
-            tiles.extend(row)
-        return tiles
+        return [TILES_BY_FLAGS[flags] for flags in self.grid.tolist()]
 
     def get_tile_dimensions(self) -> Tuple[int, int]:
         """:return: (width, height) - in number of tiles"""
-        height = len(self.tiles)
-        width = len(self.tiles[0])
-        return width, height
+        return self.width, self.height
 
     def get_starting_position(self) -> Position:
         return self.starting_position
 
-    def tile_at(self, position: Position):
-        return self.tiles[position.y][position.x]
+    def tile_at(self, position: Position) -> Tile:
+        return TILES_BY_FLAGS[self.flags_at(position)]
+
+    def flags_at(self, position: Position) -> int:
+        """:return: the raw tile flags (WALKABLE, DIRT, GRASS, STONE)"""
+        return int(self.grid[position.y * self.width + position.x])
+
+    def get_index(self, position: Position) -> int:
+        """:return: the flat (row-major) index of the position"""
+        return position.y * self.width + position.x
+
+    def get_position(self, index: int) -> Position:
+        """:return: the position of the flat (row-major) index"""
+        y, x = divmod(index, self.width)
+        return Position(x, y)
+
+    def get_vegetation_index(self, ignore_stones: bool) -> VegetationIndex:
+        """
+        :param ignore_stones: whether grass and stone tiles are treated
+        as the same kind of vegetation
+        :return: the index of vegetation words (or chunks)
+        """
+        return self.chunk_index if ignore_stones else self.word_index
+
+    def find_contour_x(self, y: int, direction: CardinalDirection,
+                       to_vegetation: bool = False) -> Optional[int]:
+        """
+        :param y: the row to search in
+        :param direction: EAST for the last tile of the row, WEST for the first
+        :param to_vegetation: search for grass/stone instead of walkable tiles
+        :return: x of the outermost matching tile of the row or None
+        """
+        if not 0 <= y < self.height:
+            return None
+        side = "last" if direction == CardinalDirection.EAST else "first"
+        kind = "vegetation" if to_vegetation else "walkable"
+        x = int(self.contours[f"{side}-{kind}"][y])
+        return x if x >= 0 else None
+
+    def find_vegetation_row(self, y: int, shift: int) -> Optional[int]:
+        """
+        :param y: the row to start the search from (inclusive)
+        :param shift: 1 to search downwards, -1 to search upwards
+        :return: the nearest row containing vegetation or None
+        """
+        if not 0 <= y < self.height:
+            return None
+        row = int(self.vegetation_rows[shift][y])
+        return row if row >= 0 else None
 
     def contains(self, position: Position):
-        w, h = self.get_tile_dimensions()
-        if 0 <= position.x < w and 0 <= position.y < h:
+        if 0 <= position.x < self.width and 0 <= position.y < self.height:
             return True
         return False
 
-    def _construct_tiles(self,
-                         encoded_map: CharacterEncodedMap) -> List[List[Tile]]:
+    @staticmethod
+    def _parse_characters(encoded_map: CharacterEncodedMap) -> np.ndarray:
         """
-        :param encoded_map: constructs the tiles from a character encoded map
-        :return: matrix of tiles
+        :param encoded_map: character encoded map
+        :return: matrix of character codes indexed by (y, x)
         """
-        character_matrix = [[char for char in line]
-                            for line in encoded_map.split("\n")]
+        rows = encoded_map.split("\n")
 
-        if len(character_matrix) < 1:
+        if len(rows) < 1:
             raise EnvironmentException("Not a valid map encoding - bad size")
 
-        height = len(character_matrix) + 1
-
-        width = len(character_matrix[0])
-        for row in character_matrix:
+        width = len(rows[0])
+        for row in rows:
             if len(row) != width:
                 raise EnvironmentException(
                     "Not a valid map encoding - all rows must have the same size")
 
-        tile_matrix = [[None for _ in range(width)] for _ in range(height)]
-        tile_matrix = self._construct_bottom_row(tile_matrix)
-        for y in range(height - 1):
-            for x in range(width):
-                tile_matrix[y][x] = self._construct_tile(Position(x, y),
-                                                         character_matrix)
-        return tile_matrix
-
-    def _construct_bottom_row(self, tile_matrix: List[List[Tile]]) -> List[
-        List[Tile]]:
-        width = len(tile_matrix[0])
-        height = len(tile_matrix)
-
-        for i in range(width):
-            tile_matrix[height - 1][i] = Tile(False, True, False, False)
+        # unknown characters are replaced (one by one) and become blank tiles
+        encoded_bytes = "".join(rows).encode("ascii", errors="replace")
+        return np.frombuffer(encoded_bytes, dtype=np.uint8).reshape(
+            len(rows), width)
 
-        return tile_matrix
-
-    def _construct_tile(self, position: Position,
-                        character_matrix: List[List[str]]) -> Tile:
-        target_character = character_matrix[position.y][position.x]
-        character_above = character_matrix[position.y - 1][
-            position.x] if position.y > 0 else None
+    @staticmethod
+    def _construct_grid(character_matrix: np.ndarray) -> np.ndarray:
+        """
+        :param character_matrix: matrix of character codes
+        :return: flat array of tile flags including the bottom dirt row
+        """
+        height, width = character_matrix.shape
+        grid = np.empty((height + 1, width), dtype=np.uint8)
 
-        walkable = True if target_character in (".", "/", "o", "S") else False
-        dirt = True if character_above in (".", "/", "o", "S") else False
-        grass = True if target_character == "/" else False
-        stone = True if target_character == "o" else False
+        grid[:height] = CHARACTER_FLAGS[character_matrix]
+        # tiles below walkable tiles are dirt
+        grid[1:height] |= np.where(grid[:height - 1] & WALKABLE,
+                                   DIRT, 0).astype(np.uint8)
+        # the bottom row is always non-walkable dirt
+        grid[height] = DIRT
 
-        return Tile(walkable, dirt, grass, stone)
+        return grid.ravel()
 
-    def _get_starting_position(self, encoded_map) -> Position:
-        starting_positions = []
+    def _construct_vegetation_indices(self) -> Tuple[VegetationIndex,
+                                                     VegetationIndex]:
+        """
+        Indexes vegetation of all rows except the bottom dirt row.
+        :return: (word index, chunk index)
+        """
+        flags = self.grid[:(self.height - 1) * self.width]
+        # 0 - no vegetation, 1 - grass, 2 - stone
+        vegetation = np.where(flags & GRASS, 1, 0) + np.where(flags & STONE, 2, 0)
+        return VegetationIndex(vegetation), VegetationIndex(vegetation > 0)
+
+    def _construct_contours(self) -> Dict[str, np.ndarray]:
+        """:return: per-row tables of the first/last walkable/vegetation x"""
+        matrix = self.grid.reshape(self.height, self.width)
+        masks = {
+            "walkable": (matrix & WALKABLE) > 0,
+            "vegetation": (matrix & (GRASS | STONE)) > 0,
+        }
+
+        contours = {}
+        for kind, mask in masks.items():
+            has_any = mask.any(axis=1)
+            first = mask.argmax(axis=1)
+            last = self.width - 1 - mask[:, ::-1].argmax(axis=1)
+            contours[f"first-{kind}"] = np.where(has_any, first, -1)
+            contours[f"last-{kind}"] = np.where(has_any, last, -1)
+        return contours
+
+    def _construct_vegetation_rows(self) -> Dict[int, np.ndarray]:
+        """:return: nearest rows with vegetation below (1) and above (-1)"""
+        rows = np.arange(self.height)
+        has_vegetation = self.contours["first-vegetation"] >= 0
+
+        below = np.where(has_vegetation, rows, self.height)
+        below = np.minimum.accumulate(below[::-1])[::-1]
+        above = np.maximum.accumulate(np.where(has_vegetation, rows, -1))
+
+        return {
+            1: np.where(below < self.height, below, -1),
+            -1: above,
+        }
 
-        for y, row in enumerate(encoded_map.split("\n")):
-            for x, character in enumerate(row):
-                if character == "S":
-                    starting_positions.append(Position(x, y))
+    @staticmethod
+    def _get_starting_position(character_matrix: np.ndarray) -> Position:
+        width = character_matrix.shape[1]
+        starting_positions = np.flatnonzero(character_matrix == ord("S"))
 
         if len(starting_positions) != 1:
             raise EnvironmentException(
                 f"Wrong number of starting positions (expected 1, got {len(starting_positions)})")
-        return starting_positions[0]
+        y, x = divmod(int(starting_positions[0]), width)
+        return Position(x, y)
+
+
+# neighbours of a tile in the order of their bits in the dirt bitmask
+NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+              if (dy, dx) != (0, 0)]
+
+# smooth tiling rules for dirt tiles - the first fitting rule is used
+# mask explanation:
+# 0 - must not be dirt,
+# 1 - must be dirt,
+# 2 - doesnt matter
+DIRT_TILE_RULES = [
+    {
+        "mask": [
+            [2, 2, 2],
+            [1, 1, 1],
+            [0, 0, 0],
+        ],
+        "image": IMG_TILE_DIRT_SIDES,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [1, 1, 1],
+            [1, 0, 1],
+        ],
+        "image": IMG_TILE_DIRT_SIDES_TOP,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [1, 1, 0],
+            [1, 0, 2],
+        ],
+        "image": IMG_TILE_DIRT_LEFT_TOP,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [0, 1, 1],
+            [2, 0, 1],
+        ],
+        "image": IMG_TILE_DIRT_LEFT_TOP,
+        "flip_x": True,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [1, 1, 1],
+            [1, 0, 0],
+        ],
+        "image": IMG_TILE_DIRT_LEFT_SIDE,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [1, 1, 1],
+            [0, 0, 1],
+        ],
+        "image": IMG_TILE_DIRT_LEFT_SIDE,
+        "flip_x": True,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [1, 1, 0],
+            [0, 0, 0],
+        ],
+        "image": IMG_TILE_DIRT_LEFT_SOLO,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [0, 1, 1],
+            [0, 0, 0],
+        ],
+        "image": IMG_TILE_DIRT_LEFT_SOLO,
+        "flip_x": True,
+    },
+    {
+        "mask": [
+            [2, 2, 2],
+            [2, 2, 2],
+            [2, 2, 2],
+        ],
+        "image": IMG_TILE_DIRT,
+        "has_alpha": False,
+    },
+]
+
+
+def construct_dirt_bitmasks(dirt: np.ndarray) -> np.ndarray:
+    """
+    :param dirt: matrix of booleans indexed by (y, x) - True for dirt tiles
+    :returns a flat array of 8-bit masks (one per tile) -
+    a bit is set when the corresponding neighbour (see NEIGHBOURS)
+    is dirt, tiles outside of the map are not dirt
+    """
+    h, w = dirt.shape
+    padded = np.pad(dirt, 1).astype(np.uint8)
+
+    bitmasks = np.zeros((h, w), dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(NEIGHBOURS):
+        bitmasks |= padded[1 + dy:1 + dy + h, 1 + dx:1 + dx + w] << bit
+
+    return bitmasks.ravel()
+
+
+def compile_dirt_lookup_table() -> np.ndarray:
+    """
+    :returns an array mapping each of the 256 dirt bitmasks to the index
+    of the first fitting rule of DIRT_TILE_RULES
+    """
+    lookup_table = np.full(256, -1, dtype=np.int64)
+
+    for bitmask in range(256):
+        for i, rule in enumerate(DIRT_TILE_RULES):
+            if does_tile_fit(bitmask, rule["mask"]):
+                lookup_table[bitmask] = i
+                break
+        else:
+            raise EnvironmentException("Smooth tiling ended unexpectedly")
+
+    return lookup_table
+
+
+def does_tile_fit(bitmask: int, tile_mask: List[List[int]]) -> bool:
+    """
+    :returns True if the tile option fits the neighbourhood of a dirt
+    tile described by the bitmask, False otherwise.
+    """
+    for bit, (dy, dx) in enumerate(NEIGHBOURS):
+        is_dirt = bool(bitmask >> bit & 1)
+        mask_number = tile_mask[dy + 1][dx + 1]
+        if mask_number == 0 and is_dirt:
+            return False
+        if mask_number == 1 and not is_dirt:
+            return False
+
+    return True
+
+
+class TileLayout(NamedTuple):
+    """Images chosen for the tiles - every tile refers to a combination
+    of image indices of the dirt, grass and stone layers (-1 = no image)."""
+    combinations: List[List[int]]
+    tile_combinations: List[int]  # index of the combination of each tile
 
 
 class EnvironmentRenderer(AbstractRenderer):
+    """
+    Renders the environment in horizontal strips (chunks) of
+    CHUNK_HEIGHT_IN_TILES rows. A chunk is pre-rendered the first time it
+    becomes visible and kept in a cache limited by chunk_cache_budget.
+    """
     # matrix of tile surfaces - one tile can have multiple overlapping surfaces
     surfaces: List[List[List[Surface]]]
+    chunks: SurfaceCache  # pre-rendered chunks indexed by their number
 
-    def __init__(self, environment: Environment, settings: GameSettings):
+    def __init__(self, environment: Environment, settings: GameSettings,
+                 layout: Optional[TileLayout] = None):
+        """:param layout: of the tiles if it was computed in advance
+        (e.g. by the asset loader in the background)"""
         self.environment = environment
         self.settings = settings
 
-        self.surfaces = self._prepare_surfaces_for_tiles()
+        if layout is None:
+            layout = self.compute_tile_layout(environment)
+        self.surfaces = self._prepare_surfaces_for_tiles(layout)
+        self.chunks = SurfaceCache(settings.chunk_cache_budget)
 
     def render(self, screen: Surface, *args, **kwargs):
-        vertical_shift = args[0]
-
+        camera: Camera = args[0]
+        screen.blits(self.get_blits(camera), doreturn=False)
+
+    def get_blits(self, camera: Camera) -> List[Tuple[Surface, Tuple[int, int]]]:
+        """:return: the visible chunks and their screen positions"""
+        h = self.environment.get_tile_dimensions()[1]
+        visible_rows = camera.visible_rows()
+
+        first_chunk = visible_rows.start // CHUNK_HEIGHT_IN_TILES
+        last_chunk = (visible_rows.stop - 1) // CHUNK_HEIGHT_IN_TILES
+
+        return [(self._get_chunk(chunk),
+                 (0, camera.row_to_px(chunk * CHUNK_HEIGHT_IN_TILES)))
+                for chunk in range(max(first_chunk, 0),
+                                   min(last_chunk,
+                                       (h - 1) // CHUNK_HEIGHT_IN_TILES) + 1)]
+
+    def _get_chunk(self, chunk: int) -> Surface:
+        surface = self.chunks.get(chunk)
+        if surface is None:
+            surface = self.chunks.put(chunk, self._render_chunk(chunk))
+        return surface
+
+    def _render_chunk(self, chunk: int) -> Surface:
+        """:return: a new surface with all tiles of the chunk rendered"""
         w, h = self.environment.get_tile_dimensions()
+        tile_size_px = TILE_SIZE_PX * self.settings.render_scale
 
-        for y in range(h):
-            for x in range(w):
-
-                surfaces = self.surfaces[y][x]
-
-                coordinates = (
-                    int(x * TILE_SIZE_PX * self.settings.scale_factor),
-                    int((
-                                y - vertical_shift) * TILE_SIZE_PX * self.settings.scale_factor))
-
-                for surface in surfaces:
-                    screen.blit(surface, coordinates)
-
-    def _prepare_surfaces_for_tiles(self) -> List[List[List[Surface]]]:
-        tile_matrix = self.environment.get_tile_matrix()
-        surfaces = [[None for _ in row]
-                    for row in tile_matrix]
-
-        for y in range(len(tile_matrix)):
-            for x in range(len(tile_matrix[y])):
-                surfaces[y][x] = \
-                    self._prepare_surfaces_for_tile(Position(x, y),
-                                                    tile_matrix)
-
-        return surfaces
-
-    def _prepare_surfaces_for_tile(self, position: Position,
-                                   tile_matrix: List[List[Tile]]) -> List[
-        Surface]:
-        surfaces = []
-        tile = tile_matrix[position.y][position.x]
-        dirt_map = self._construct_dirt_map(tile_matrix)
-        scale_factor = self.settings.scale_factor
-
-        if tile.is_dirt():
-            surfaces.append(self._prepare_dirt_surface(position, dirt_map))
-        if tile.is_grass():
-            surfaces.append(
-                load_scaled_surface(random.choice(IMG_TILE_GRASS_LIST),
-                                    scale_factor))
-        if tile.is_stone():
-            surfaces.append(
-                load_scaled_surface(random.choice(IMG_TILE_STONE_LIST),
-                                    scale_factor))
-        return surfaces
-
-    def _prepare_dirt_surface(self, position: Position,
-                              dirt_map: List[List[bool]]) -> Surface:
-        scale_factor = self.settings.scale_factor
-
-        # mask explanation:
-        # 0 - must not be dirt,
-        # 1 - must be dirt,
-        # 2 - doesnt matter
-        tile_options = [
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [1, 1, 1],
-                    [0, 0, 0],
-                ],
-                "image": load_scaled_surface(IMG_TILE_DIRT_SIDES, scale_factor)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [1, 1, 1],
-                    [1, 0, 1],
-                ],
-                "image": load_scaled_surface(IMG_TILE_DIRT_SIDES_TOP, scale_factor)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [1, 1, 0],
-                    [1, 0, 2],
-                ],
-                "image": load_scaled_surface(IMG_TILE_DIRT_LEFT_TOP,
-                                             scale_factor)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [0, 1, 1],
-                    [2, 0, 1],
-                ],
-                "image": pygame.transform.flip(load_scaled_surface(IMG_TILE_DIRT_LEFT_TOP,
-                                             scale_factor), True, False)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [1, 1, 1],
-                    [1, 0, 0],
-                ],
-                "image": load_scaled_surface(IMG_TILE_DIRT_LEFT_SIDE,
-                                             scale_factor)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [1, 1, 1],
-                    [0, 0, 1],
-                ],
-                "image": pygame.transform.flip(
-                    load_scaled_surface(IMG_TILE_DIRT_LEFT_SIDE,
-                                        scale_factor), True, False)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [1, 1, 0],
-                    [0, 0, 0],
-                ],
-                "image": load_scaled_surface(IMG_TILE_DIRT_LEFT_SOLO,
-                                             scale_factor)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [0, 1, 1],
-                    [0, 0, 0],
-                ],
-                "image": pygame.transform.flip(
-                    load_scaled_surface(IMG_TILE_DIRT_LEFT_SOLO,
-                                        scale_factor), True, False)
-            },
-            {
-                "mask": [
-                    [2, 2, 2],
-                    [2, 2, 2],
-                    [2, 2, 2],
-                ],
-                "image": load_scaled_surface(IMG_TILE_DIRT, scale_factor,
-                                             has_alpha=False)
-            }
-        ]
+        surface = Surface((int(w * tile_size_px),
+                           int(CHUNK_HEIGHT_IN_TILES * tile_size_px)),
+                          pygame.SRCALPHA)
+
+        first_row = chunk * CHUNK_HEIGHT_IN_TILES
+        rows = range(first_row, min(first_row + CHUNK_HEIGHT_IN_TILES, h))
+        surface.blits([
+            (tile_surface, (int(x * tile_size_px),
+                            int((y - first_row) * tile_size_px)))
+            for y in rows
+            for x in range(w)
+            for tile_surface in self.surfaces[y][x]
+        ], doreturn=False)
 
-        for tile_option in tile_options:
-            if self._does_tile_fit(position, tile_option["mask"], dirt_map):
-                return tile_option["image"]
-        raise EnvironmentException("Smooth tiling ended unexpectedly")
+        return surface
 
     @staticmethod
-    def _does_tile_fit(position: Position,
-                       tile_mask: List[List[int]],
-                       dirt_map: List[List[bool]]) -> bool:
+    def compute_tile_layout(environment: Environment) -> TileLayout:
         """
-        :returns True if the tile option fits into the dirt_map, False otherwise.
-        """
-        x_lb = position.x
-        x_ub = position.x + 3
-        y_lb = position.y
-        y_ub = position.y + 3
-
-        for y, dirt_y in zip((0, 1, 2), range(y_lb, y_ub)):
-            for x, dirt_x in zip((0, 1, 2), range(x_lb, x_ub)):
-                is_dirt = dirt_map[dirt_y][dirt_x]
-                mask_number = tile_mask[y][x]
-                if mask_number == 0 and is_dirt:
-                    return False
-                if mask_number == 1 and not is_dirt:
-                    return False
-
-        return True
-
-    def _construct_dirt_map(self, tile_matrix: List[List[Tile]]
-                            ) -> List[List[bool]]:
-        """
-        :returns a matrix of size h + 2 x w + 2 that contains booleans -
-        True position means there is a dirt
-        False position means there is not dirt
+        Choose the images of all tiles without loading them
+        (safe to run outside of the main thread).
         """
+        w, h = environment.get_tile_dimensions()
+        flags = environment.grid
+
+        # index of the used image of every layer, -1 means no image
+        dirt = (flags.reshape(h, w) & DIRT) > 0
+        dirt_layer = np.where(
+            flags & DIRT,
+            compile_dirt_lookup_table()[construct_dirt_bitmasks(dirt)], -1)
+        # the random variants are seeded, so every tile always looks the same
+        variants = np.random.RandomState(TILE_VARIANT_SEED)
+        grass_layer = np.where(
+            flags & GRASS,
+            variants.randint(len(IMG_TILE_GRASS_LIST), size=w * h), -1)
+        stone_layer = np.where(
+            flags & STONE,
+            variants.randint(len(IMG_TILE_STONE_LIST), size=w * h), -1)
+
+        # tiles with the same layers share one combination
+        combinations, tile_combinations = np.unique(
+            np.stack([dirt_layer, grass_layer, stone_layer], axis=1),
+            axis=0, return_inverse=True)
+        return TileLayout(combinations.tolist(),
+                          tile_combinations.ravel().tolist())
+
+    def _prepare_surfaces_for_tiles(self, layout: TileLayout
+                                    ) -> List[List[List[Surface]]]:
         w, h = self.environment.get_tile_dimensions()
+        scale_factor = self.settings.render_scale
+
+        # images of the dirt, grass and stone layers
+        images = [
+            [self._load_rule_image(rule) for rule in DIRT_TILE_RULES],
+            [load_scaled_surface(path, scale_factor)
+             for path in IMG_TILE_GRASS_LIST],
+            [load_scaled_surface(path, scale_factor)
+             for path in IMG_TILE_STONE_LIST],
+        ]
+        surface_lists = [[images[layer][i]
+                          for layer, i in enumerate(combination) if i >= 0]
+                         for combination in layout.combinations]
 
-        dirt_map = [[False for _ in range(len(tile_matrix[0]) + 2)]
-                    for _ in range(len(tile_matrix) + 2)]
-
-        # for x in range(w):
-        #     dirt_map[h + 1][x] = True
-
-        for y in range(h):
-            for x in range(w):
-                if tile_matrix[y][x].is_dirt():
-                    dirt_map[y + 1][x + 1] = True
+        tile_surfaces = [surface_lists[i] for i in layout.tile_combinations]
+        return [tile_surfaces[y * w:(y + 1) * w] for y in range(h)]
 
-        return dirt_map
+    def _load_rule_image(self, rule: Dict[str, Any]) -> Surface:
+        return load_scaled_surface(rule["image"], self.settings.render_scale,
+                                   has_alpha=rule.get("has_alpha", True),
+                                   flip_x=rule.get("flip_x", False))
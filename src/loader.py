@@ -0,0 +1,166 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+from typing import Callable, List, Tuple, Any, Iterable, Optional
+
+from src.atlas import read_atlas_manifest, SpriteAtlas, set_sprite_atlas
+from src.bundle import asset_exists, find_assets, read_asset_text
+from src.camera import Camera
+from src.constants import ASSET_LOADER_WORKERS, ATLAS_ROOT, ATLAS_MANIFEST, \
+    MAP_DEFAULT
+from src.environment import Environment, EnvironmentRenderer, TileLayout
+from src.settings import GameSettings
+from src.ui.font import Color, load_glyph_atlases, set_glyph_atlas, \
+    GlyphAtlas
+from src.utils import cache_source_surface, decode_image
+
+log = logging.getLogger(__name__)
+
+
+class GameAssets(object):
+    """
+    The world of the game prepared before the game starts. The environment
+    is not changed by playing, so all the games of the session share it.
+    """
+    encoded_map: Optional[str]
+    environment: Optional[Environment]
+    environment_renderer: Optional[EnvironmentRenderer]
+
+    def __init__(self):
+        self.encoded_map = None
+        self.environment = None
+        self.environment_renderer = None
+
+    def is_loaded(self) -> bool:
+        return self.environment_renderer is not None
+
+    def load(self, settings: GameSettings, map_path: str = MAP_DEFAULT) -> None:
+        """Load the world synchronously (when it was not preloaded)."""
+        self.set_environment(parse_map(settings, map_path))
+        self.set_environment_renderer(settings, None)
+
+    def set_environment(self, parsed_map: Tuple[str, Environment]) -> None:
+        self.encoded_map, self.environment = parsed_map
+
+    def set_environment_renderer(self, settings: GameSettings,
+                                 layout: Optional[TileLayout]) -> None:
+        renderer = EnvironmentRenderer(self.environment, settings, layout)
+        # bake the chunks of the first view, so the first frame is not late
+        renderer.get_blits(Camera(settings.render_scale))
+        self.environment_renderer = renderer
+
+
+def parse_map(settings: GameSettings,
+              map_path: str) -> Tuple[str, Environment]:
+    """:return: the encoded map and the environment parsed from it"""
+    encoded_map = read_asset_text(map_path)
+    return encoded_map, Environment(settings, encoded_map)
+
+
+class AssetLoader(object):
+    """
+    Loads assets on a pool of background threads.
+    Each task consists of a background part (e.g. decoding a file)
+    and a finishing part which is run on the main thread by 'poll'
+    (e.g. converting the decoded image into the display format).
+    """
+    executor: ThreadPoolExecutor
+    pending: List[Tuple[Future, Callable[[Any], None]]]
+    n_tasks: int
+    n_finished: int
+    n_failed: int
+
+    def __init__(self, max_workers: int = ASSET_LOADER_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="asset-loader")
+        self.pending = []
+        self.n_tasks = 0
+        self.n_finished = 0
+        self.n_failed = 0
+
+    def submit(self, load: Callable[..., Any],
+               finish: Callable[[Any], None], *args) -> None:
+        """Run load(*args) in the background and finish(result)
+        on the main thread once the loading is done."""
+        self.pending.append((self.executor.submit(load, *args), finish))
+        self.n_tasks += 1
+
+    def preload_images(self, paths: Iterable[str]) -> None:
+        """Decode images in the background and cache them
+        as the sources of their scaled variants."""
+        for path in paths:
+            self.submit(decode_image,
+                        lambda image, path=path: cache_source_surface(
+                            path, image),
+                        path)
+
+    def preload_graphics(self, root: str = ATLAS_ROOT,
+                         manifest_path: str = ATLAS_MANIFEST) -> None:
+        """Preload the sprite atlas if it was built,
+        otherwise preload all the separate images."""
+        if asset_exists(manifest_path):
+            image_path, frames = read_atlas_manifest(manifest_path)
+            self.submit(decode_image,
+                        lambda image: set_sprite_atlas(SpriteAtlas(
+                            image.convert_alpha(), frames)),
+                        image_path)
+        else:
+            self.preload_images(find_assets(root, ".png"))
+
+    def preload_game(self, assets: GameAssets, settings: GameSettings,
+                     map_path: str = MAP_DEFAULT) -> None:
+        """Parse the map and lay out its tiles in the background,
+        then scale the tile images and bake the environment renderer
+        on the main thread."""
+        def lay_out(parsed_map: Tuple[str, Environment]) -> None:
+            assets.set_environment(parsed_map)
+            self.submit(EnvironmentRenderer.compute_tile_layout,
+                        partial(assets.set_environment_renderer, settings),
+                        assets.environment)
+
+        self.submit(parse_map, lay_out, settings, map_path)
+
+    def preload_fonts(self, path: str, size: int,
+                      colors: Iterable[Color]) -> None:
+        """Rasterize the glyph atlases of the font in the given colors
+        in the background and share them."""
+        def finish(atlases: List[GlyphAtlas]) -> None:
+            for atlas in atlases:
+                set_glyph_atlas(path, size, atlas)
+
+        self.submit(load_glyph_atlases, finish, path, size, list(colors))
+
+    def poll(self) -> int:
+        """Finish all the tasks whose background part is done.
+        Must be called from the main thread.
+        :return: number of the tasks finished by this call"""
+        # finishing a task can submit a followup task
+        pending, self.pending = self.pending, []
+        still_pending = []
+        n_finished = 0
+        for future, finish in pending:
+            if not future.done():
+                still_pending.append((future, finish))
+                continue
+
+            try:
+                finish(future.result())
+            except Exception as e:
+                # the asset will be loaded synchronously when it is used
+                log.error(f"Preloading of an asset failed: {e}")
+                self.n_failed += 1
+            n_finished += 1
+
+        self.pending = still_pending + self.pending
+        self.n_finished += n_finished
+        return n_finished
+
+    def get_progress(self) -> float:
+        """:return: fraction of the finished tasks (from 0 to 1)"""
+        return self.n_finished / self.n_tasks if self.n_tasks else 1.
+
+    def is_done(self) -> bool:
+        return not self.pending
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
@@ -1,12 +1,17 @@
+import argparse
 import logging
+from functools import partial
 
 import pygame
 pygame.init()
-import yaml
 
+from src.clock import CLOCK_MODES, create_frame_clock
 from src.constants import *
-from src.scene import GameScene, EmptyScene
-from src.settings import GameSettings
+from src.loader import GameAssets
+from src.replay_format import load_recording
+from src.scene import GameScene, EmptyScene, LoadingScene
+from src.settings import load_settings
+from src.texture import texture_cache, disk_texture_cache
 from src.utils import load_scaled_surface
 
 if __name__ == '__main__':
@@ -15,20 +20,37 @@ if __name__ == '__main__':
                         level=logging.DEBUG)
     log = logging.getLogger(__name__)
 
-    settings = GameSettings(
-        **yaml.load(open("../config.yaml"), Loader=yaml.FullLoader))
-    clock = pygame.time.Clock()
+    parser = argparse.ArgumentParser(description="Vizard")
+    parser.add_argument("--replay",
+                        help="recording to play back (text or binary)")
+    parser.add_argument("--clock", choices=list(CLOCK_MODES),
+                        default="real-time", help="how the game time runs")
+    parser.add_argument("--speed", type=float, default=1.,
+                        help="speed of the game time in the accelerated mode")
+    args = parser.parse_args()
+
+    replay = None
+    if args.replay is not None:
+        replay = load_recording(args.replay)
+
+    settings = load_settings()
+    texture_cache.set_budget(settings.texture_cache_budget)
+    disk_texture_cache.set_directory(settings.texture_cache_dir)
+    clock = create_frame_clock(args.clock, args.speed)
     screen = pygame.display.set_mode((int(WIDTH_IN_TILES * TILE_SIZE_PX * settings.scale_factor),
                                       int(HEIGHT_IN_TILES * TILE_SIZE_PX * settings.scale_factor)))
     pygame.display.set_caption("Vizard")
     pygame.display.set_icon(load_scaled_surface(IMG_VIZARD, 1.))
 
+    # the world is loaded once and shared by all the games
+    assets = GameAssets()
     scene_classes = {
         EmptyScene.__name__: EmptyScene,
-        GameScene.__name__: GameScene
+        LoadingScene.__name__: partial(LoadingScene, assets=assets),
+        GameScene.__name__: partial(GameScene, replay=replay, assets=assets)
     }
 
-    active_scene = GameScene(screen, clock)
+    active_scene = LoadingScene(screen, clock, assets)
 
     # Application loop
     while True:
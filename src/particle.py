@@ -1,170 +1,375 @@
-from typing import TYPE_CHECKING, Dict
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Tuple, Hashable
 import logging
 
 log = logging.getLogger(__name__)
 
-import pygame
+import numpy as np
 from pygame.rect import Rect
-from pygame.sprite import AbstractGroup
 from pygame.surface import Surface
 
-from src.animation import Animation, LinearAlphaFadeAnimation
-from src.constants import TILE_SIZE_PX, ANIM_VIZARD_DASH
-from src.utils import Point, load_scaled_surfaces, Position, CardinalDirection
+from src.animation import Animation, LinearAlphaFadeAnimation, \
+    AnimationManager
+from src.camera import Camera
+from src.constants import TILE_SIZE_PX, PARTICLE_CAPACITY
+from src.utils import Position, CardinalDirection, Milliseconds
 
-if TYPE_CHECKING:
-    from src.scene import GameScene
-
-
-class ParticleSprite(pygame.sprite.Sprite):
-    scene: 'GameScene'
-    image: Surface
-    rect: Rect
-
-    flip_x: bool
-    flip_y: bool
 
+class ParticleSpec(NamedTuple):
+    """
+    Description of a particle to be spawned by the scene's ParticleSystem.
+    The particle plays the animation 'kind' once at its tile position
+    (shifted by the unscaled pixel offset) and then disappears.
+    """
+    kind: str  # name of the animation in the AnimationManager
     position: Position
-    px_offset: Position
-    animation: Animation
-
-    def __init__(self, scene: 'GameScene', animation: Animation,
-                 position: Position, px_offset: Position = Position(0, 0),
-                 flip_x: bool = False, flip_y: bool = False,
-                 *groups: AbstractGroup):
-        super().__init__(*groups)
-
-        self.scene = scene
-        self.animation = animation
-        self.position = position
-        self.px_offset = px_offset
-        self.flip_x = flip_x
-        self.flip_y = flip_y
-
-        # automatically start the animation on creation
-        self.animation.start(pygame.time.get_ticks())
-
-        self._update_image()
-
-        self.rect = self.image.get_rect()
-        self._update_rectangle_based_on_vertical_shift()
-
-    def update(self, *args, **kwargs) -> None:
-        self._update_image()
-        self._update_rectangle_based_on_vertical_shift()
-        self._destroy()
-
-    def _update_image(self):
-        image = self.animation.get_image(pygame.time.get_ticks())
-        if not self.flip_x and not self.flip_y:
-            self.image = image
-        else:
-            self.image = pygame.transform.flip(image, self.flip_x, self.flip_y)
-
-    def _update_rectangle_based_on_vertical_shift(self):
-        scale_factor = self.scene.settings.scale_factor
-        x = (self.position.x * TILE_SIZE_PX) + (
-                TILE_SIZE_PX // 2) + self.px_offset.x
-        x = x * scale_factor
-
-        y = ((self.position.y - self.scene.vertical_shift) * TILE_SIZE_PX) + (
-                TILE_SIZE_PX // 2) + self.px_offset.y
-        y = y * scale_factor
-
-        self.rect.center = (x, y)
+    px_offset: Position = Position(0, 0)
+    flip_x: bool = False
+    flip_y: bool = False
 
-    def _destroy(self):
-        if self.animation.is_over():
-            self.kill()
+    def get_tile_position(self) -> Position:
+        return self.position
 
     @staticmethod
-    def create_dash_left(scene: 'GameScene',
-                         position: Position) -> 'ParticleSprite':
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation("particle-dash-left"),
+    def create_dash_left(position: Position) -> 'ParticleSpec':
+        return ParticleSpec(
+            "particle-dash-left",
             position,
             px_offset=Position(-TILE_SIZE_PX // 2, 1)
         )
 
     @staticmethod
-    def create_dash_right(scene: 'GameScene',
-                          position: Position) -> 'ParticleSprite':
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation("particle-dash-right"),
+    def create_dash_right(position: Position) -> 'ParticleSpec':
+        return ParticleSpec(
+            "particle-dash-right",
             position,
             px_offset=Position(TILE_SIZE_PX // 2, 1)
         )
 
     @staticmethod
-    def create_ascent(scene: 'GameScene', position: Position,
-                      direction: CardinalDirection):
+    def create_ascent(position: Position,
+                      direction: CardinalDirection) -> 'ParticleSpec':
         animation_name = "particle-ascent-left" \
             if direction == CardinalDirection.WEST else "particle-ascent-right"
 
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation(animation_name),
+        return ParticleSpec(
+            animation_name,
             position,
             px_offset=Position(0, TILE_SIZE_PX // 2)
         )
 
     @staticmethod
-    def create_descent(scene: 'GameScene', position: Position,
-                       direction: CardinalDirection):
+    def create_descent(position: Position,
+                       direction: CardinalDirection) -> 'ParticleSpec':
         animation_name = "particle-descent-left" \
             if direction == CardinalDirection.WEST else "particle-descent-right"
 
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation(animation_name),
+        return ParticleSpec(
+            animation_name,
             position,
             px_offset=Position(0, -TILE_SIZE_PX // 2)
         )
 
     @staticmethod
-    def create_blink_in(scene: 'GameScene',
-                        position: Position) -> 'ParticleSprite':
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation("particle-blink-in"),
+    def create_blink_in(position: Position) -> 'ParticleSpec':
+        return ParticleSpec(
+            "particle-blink-in",
             position,
             px_offset=Position(0, -TILE_SIZE_PX // 4)
         )
 
     @staticmethod
-    def create_blink_out(scene: 'GameScene',
-                         position: Position,
-                         direction: CardinalDirection) -> 'ParticleSprite':
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation("particle-blink-out"),
+    def create_blink_out(position: Position,
+                         direction: CardinalDirection) -> 'ParticleSpec':
+        return ParticleSpec(
+            "particle-blink-out",
             position,
             px_offset=Position(0, 0),
             flip_x=direction != CardinalDirection.EAST
         )
 
     @staticmethod
-    def create_shard_collected(scene: 'GameScene',
-                               position: Position) -> 'ParticleSprite':
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation("particle-shard-collected"),
+    def create_shard_collected(position: Position) -> 'ParticleSpec':
+        return ParticleSpec(
+            "particle-shard-collected",
             position,
             px_offset=Position(0, -TILE_SIZE_PX)
         )
 
     @staticmethod
-    def create_shard_pointer(scene: 'GameScene',
-                             position: Position,
+    def create_shard_pointer(position: Position,
                              direction: CardinalDirection = CardinalDirection.NORTH
-                             ) -> 'ParticleSprite':
+                             ) -> 'ParticleSpec':
         flip_y = direction != CardinalDirection.NORTH
 
-        return ParticleSprite(
-            scene,
-            scene.animation_manager.get_animation("particle-shard-pointer"),
+        return ParticleSpec(
+            "particle-shard-pointer",
             position,
             flip_y=flip_y
         )
+
+
+@dataclass
+class ParticleKind:
+    """Animation of one kind of particles flattened into the image table
+    of the particle system."""
+    kind_id: int
+    animation: Animation
+    n_frames: int
+    alpha_levels: int  # 1 for animations that do not fade
+    # index of the first image of each (flip_x, flip_y) variant
+    image_offsets: Dict[Tuple[bool, bool], int] = field(default_factory=dict)
+
+
+class ParticleSystem(object):
+    """
+    Particle system storing all particles in NumPy arrays.
+    All particles are advanced by one vectorized step per frame
+    and the visible ones are drawn by a single 'Surface.blits' call.
+    Every frame of every particle animation (including the mirrored
+    and faded variants) is stored in one flat image table, so the image
+    of each particle is just an index into that table.
+    Slots of the dead particles are reused by the new ones.
+    """
+    camera: Camera
+    animation_manager: AnimationManager
+    margin: int  # rows around the view that are still considered visible
+
+    kinds: Dict[str, ParticleKind]
+    images: List[Surface]  # the image table
+    image_sizes: np.ndarray  # (width, height) of each image in the table
+
+    # per-kind attributes indexed by kind id
+    kind_speeds: np.ndarray
+    kind_frames: np.ndarray
+    kind_loops: np.ndarray
+    kind_alpha_levels: np.ndarray
+    kind_offsets: np.ndarray  # image offsets by kind id and flips (2 bits)
+
+    # per-particle attributes indexed by slot
+    alive: np.ndarray
+    kind_ids: np.ndarray
+    positions: np.ndarray  # tile x and y
+    px_offsets: np.ndarray  # unscaled pixel x and y offsets
+    start_times: np.ndarray
+    flips: np.ndarray  # flip_x in bit 0, flip_y in bit 1
+    serials: np.ndarray  # number of the spawn that occupies the slot
+
+    free_slots: List[int]
+    n_spawned: int
+    high_water_mark: int  # maximum of simultaneously alive particles
+
+    # results of the last update
+    visible_slots: np.ndarray
+    visible_images: np.ndarray  # indices into the image table
+    visible_topleft: np.ndarray  # screen pixel coordinates
+
+    def __init__(self, camera: Camera, animation_manager: AnimationManager,
+                 capacity: int = PARTICLE_CAPACITY, margin: int = 2):
+        self.camera = camera
+        self.animation_manager = animation_manager
+        self.margin = margin
+
+        self.kinds = {}
+        self.images = []
+        self.image_sizes = np.zeros((0, 2), dtype=np.int32)
+        self.kind_speeds = np.zeros(0, dtype=np.int64)
+        self.kind_frames = np.zeros(0, dtype=np.int64)
+        self.kind_loops = np.zeros(0, dtype=bool)
+        self.kind_alpha_levels = np.zeros(0, dtype=np.int64)
+        self.kind_offsets = np.full((0, 4), -1, dtype=np.int64)
+
+        self.alive = np.zeros(0, dtype=bool)
+        self.kind_ids = np.zeros(0, dtype=np.int64)
+        self.positions = np.zeros((0, 2), dtype=np.int64)
+        self.px_offsets = np.zeros((0, 2), dtype=np.int64)
+        self.start_times = np.zeros(0, dtype=np.int64)
+        self.flips = np.zeros(0, dtype=np.int64)
+        self.serials = np.zeros(0, dtype=np.int64)
+        self.free_slots = []
+        self._grow(capacity)
+
+        self.n_spawned = 0
+        self.high_water_mark = 0
+
+        self.visible_slots = np.zeros(0, dtype=np.int64)
+        self.visible_images = np.zeros(0, dtype=np.int64)
+        self.visible_topleft = np.zeros((0, 2), dtype=np.int64)
+
+    def spawn(self, particle: ParticleSpec,
+              current_time: Milliseconds) -> int:
+        """Spawn a particle, its animation starts immediately.
+        :return: the slot of the particle"""
+        kind = self._get_kind(particle.kind)
+        self._get_image_offset(kind, particle.flip_x, particle.flip_y)
+
+        if not self.free_slots:
+            self._grow(len(self.alive))
+        slot = self.free_slots.pop()
+
+        self.alive[slot] = True
+        self.kind_ids[slot] = kind.kind_id
+        self.positions[slot] = particle.position
+        self.px_offsets[slot] = particle.px_offset
+        self.start_times[slot] = current_time
+        self.flips[slot] = particle.flip_x | particle.flip_y << 1
+        self.serials[slot] = self.n_spawned
+
+        self.n_spawned += 1
+        self.high_water_mark = max(self.high_water_mark,
+                                   len(self.alive) - len(self.free_slots))
+        return slot
+
+    def update(self, current_time: Milliseconds) -> None:
+        """Advance all the particles - destroy the finished ones and find
+        the current images of the visible ones."""
+        slots = np.flatnonzero(self.alive)
+        kind_ids = self.kind_ids[slots]
+        times = current_time - self.start_times[slots]
+        speeds = self.kind_speeds[kind_ids]
+        n_frames = self.kind_frames[kind_ids]
+        loops = self.kind_loops[kind_ids]
+        durations = speeds * n_frames
+
+        over = ~loops & (times >= durations)
+        if over.any():
+            self.alive[slots[over]] = False
+            self.free_slots.extend(slots[over].tolist())
+
+        rows = self.positions[slots, 1]
+        visible = (~over
+                   & (rows >= self.camera.vertical_shift - self.margin)
+                   & (rows < self.camera.vertical_shift + self.camera.height
+                      + self.margin))
+        # draw by rows, the particles within a row in the order of spawning
+        order = np.flatnonzero(visible)
+        order = order[np.lexsort((self.serials[slots[order]], rows[order]))]
+        slots, kind_ids, times = slots[order], kind_ids[order], times[order]
+        speeds, n_frames, loops, durations = speeds[order], \
+            n_frames[order], loops[order], durations[order]
+
+        frames = times // speeds
+        frames = np.where(loops, frames % n_frames,
+                          np.minimum(frames, n_frames - 1))
+
+        # alpha of the fading animations rounded to their alpha levels
+        alpha_levels = self.kind_alpha_levels[kind_ids]
+        alpha_fractions = np.clip((durations - times) / durations, 0, 1)
+        levels = (alpha_fractions * (alpha_levels - 1) + 0.5).astype(np.int64)
+
+        images = (self.kind_offsets[kind_ids, self.flips[slots]]
+                  + frames * alpha_levels + levels)
+
+        # center of each image at the tile position shifted by the offset
+        tile_size_px = TILE_SIZE_PX * self.camera.scale_factor
+        positions = self.positions[slots]
+        centers = np.empty((len(slots), 2), dtype=np.int64)
+        centers[:, 0] = (positions[:, 0] * tile_size_px).astype(np.int64)
+        centers[:, 1] = ((positions[:, 1] - self.camera.vertical_shift)
+                         * tile_size_px).astype(np.int64)
+        centers += ((TILE_SIZE_PX // 2 + self.px_offsets[slots])
+                    * self.camera.scale_factor).astype(np.int64)
+
+        self.visible_slots = slots
+        self.visible_images = images
+        self.visible_topleft = centers - self.image_sizes[images] // 2
+
+    def draw(self, surface: Surface) -> None:
+        """Draw the visible particles (as of the last update)."""
+        surface.blits(self.get_blits(), doreturn=False)
+
+    def get_blits(self) -> List[Tuple[Surface, Tuple[int, int]]]:
+        """:return: image and destination of each visible particle
+        (as of the last update) in the drawing order"""
+        return list(zip(map(self.images.__getitem__,
+                            self.visible_images.tolist()),
+                        map(tuple, self.visible_topleft.tolist())))
+
+    def get_drawables(self) -> List[Tuple[Hashable, Surface, Rect]]:
+        """:return: identity, image and rectangle of each visible particle
+        (as of the last update) - used by the DirtyRenderer"""
+        return [((slot, serial), self.images[image], Rect((x, y), size))
+                for slot, serial, image, (x, y), size in zip(
+                    self.visible_slots.tolist(),
+                    self.serials[self.visible_slots].tolist(),
+                    self.visible_images.tolist(),
+                    self.visible_topleft.tolist(),
+                    self.image_sizes[self.visible_images].tolist())]
+
+    def __len__(self) -> int:
+        """:return: number of the alive particles"""
+        return len(self.alive) - len(self.free_slots)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "active": len(self),
+            "visible": len(self.visible_slots),
+            "spawned": self.n_spawned,
+            "high_water_mark": self.high_water_mark,
+            "capacity": len(self.alive),
+            "images": len(self.images),
+        }
+
+    def _grow(self, n_slots: int) -> None:
+        """Add 'n_slots' free slots to all per-particle arrays."""
+        capacity = len(self.alive)
+
+        def extend(array: np.ndarray) -> np.ndarray:
+            return np.concatenate([array, np.zeros(
+                (n_slots,) + array.shape[1:], dtype=array.dtype)])
+
+        self.alive = extend(self.alive)
+        self.kind_ids = extend(self.kind_ids)
+        self.positions = extend(self.positions)
+        self.px_offsets = extend(self.px_offsets)
+        self.start_times = extend(self.start_times)
+        self.flips = extend(self.flips)
+        self.serials = extend(self.serials)
+        # lower slots are taken first
+        self.free_slots.extend(range(capacity + n_slots - 1, capacity - 1, -1))
+
+    def _get_kind(self, name: str) -> ParticleKind:
+        kind = self.kinds.get(name)
+        if kind is None:
+            animation = self.animation_manager.get_animation(name)
+            alpha_levels = animation.alpha_levels \
+                if isinstance(animation, LinearAlphaFadeAnimation) else 1
+            kind = ParticleKind(len(self.kinds), animation,
+                                len(animation.frames), alpha_levels)
+            self.kinds[name] = kind
+
+            self.kind_speeds = np.append(self.kind_speeds, animation.speed)
+            self.kind_frames = np.append(self.kind_frames, kind.n_frames)
+            self.kind_loops = np.append(self.kind_loops, animation.loop)
+            self.kind_alpha_levels = np.append(self.kind_alpha_levels,
+                                               alpha_levels)
+            self.kind_offsets = np.append(
+                self.kind_offsets, np.full((1, 4), -1, dtype=np.int64),
+                axis=0)
+        return kind
+
+    def _get_image_offset(self, kind: ParticleKind, flip_x: bool,
+                          flip_y: bool) -> int:
+        """:return: offset of the images of the variant of the kind
+        in the image table (the images are added on the first use)"""
+        offset = kind.image_offsets.get((flip_x, flip_y))
+        if offset is None:
+            animation = kind.animation
+            if isinstance(animation, LinearAlphaFadeAnimation):
+                images = [image
+                          for levels in animation.get_fade_table(flip_x,
+                                                                 flip_y)
+                          for image in levels]
+            else:
+                images = animation.get_frames(flip_x, flip_y)
+
+            offset = len(self.images)
+            self.images.extend(images)
+            self.image_sizes = np.append(
+                self.image_sizes,
+                np.array([image.get_size() for image in images],
+                         dtype=np.int32).reshape(-1, 2), axis=0)
+
+            kind.image_offsets[(flip_x, flip_y)] = offset
+            self.kind_offsets[kind.kind_id, flip_x | flip_y << 1] = offset
+        return offset
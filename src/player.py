@@ -1,7 +1,7 @@
 import logging
 from abc import abstractmethod
 from dataclasses import dataclass
-from typing import Any, TYPE_CHECKING
+from typing import Any, TYPE_CHECKING, Optional
 
 log = logging.getLogger(__name__)
 
@@ -12,8 +12,8 @@ from pygame.surface import Surface
 from src.action import AbstractAction, ActionException
 from src.animation import FallbackAnimator
 from src.constants import *
-from src.environment import Environment
-from src.utils import Position, CardinalDirection
+from src.environment import Environment, VegetationIndex
+from src.utils import Position, CardinalDirection, Point
 
 if TYPE_CHECKING:
     from src.scene import GameScene
@@ -54,7 +54,7 @@ class PlayerSprite(pygame.sprite.Sprite):
         self.scene = scene
         self.scene.player = player
 
-        scale_factor = scene.settings.scale_factor
+        scale_factor = scene.settings.render_scale
 
         self.animator = FallbackAnimator({
             "idle": self.scene.animation_manager.get_animation("idle"),
@@ -62,42 +62,29 @@ class PlayerSprite(pygame.sprite.Sprite):
             "ascent": self.scene.animation_manager.get_animation("ascent"),
             "descent": self.scene.animation_manager.get_animation("descent"),
             "blink-in": self.scene.animation_manager.get_animation("blink-in"),
-        })
-        self.animator.start(pygame.time.get_ticks())
-        self.image = self.animator.get_image(pygame.time.get_ticks())
+        }, self.scene.animation_clock)
+        self.animator.start(self.scene.animation_clock.current_time)
+        self.image = self.animator.get_image(
+            self.scene.animation_clock.current_time)
 
         center_of_first_tile = ((TILE_SIZE_PX // 2) * scale_factor,
                                 (TILE_SIZE_PX + 1) * scale_factor)
         self.rect = self.image.get_rect(midbottom=center_of_first_tile)
 
     def update(self, *args, **kwargs) -> None:
-        self._check_for_vertical_shift()
+        self.scene.camera.follow(self.scene.player.position)
         self._update_rectangle_based_on_current_position()
 
     def _update_rectangle_based_on_current_position(self):
-        x = (self.scene.player.position.x * TILE_SIZE_PX) + (TILE_SIZE_PX // 2)
-        x = x * self.scene.settings.scale_factor
+        midbottom = self.scene.camera.tile_to_px(
+            self.scene.player.position,
+            Point(TILE_SIZE_PX // 2, TILE_SIZE_PX + 1))
 
-        y = ((
-                     self.scene.player.position.y - self.scene.vertical_shift) * TILE_SIZE_PX) \
-            + (TILE_SIZE_PX + 1)
-        y = y * self.scene.settings.scale_factor
+        self.rect = self.image.get_rect(midbottom=midbottom)
 
-        self.rect = self.image.get_rect(midbottom=(x, y))
-
-        image = self.animator.get_image(pygame.time.get_ticks())
-        if self.scene.player.direction == CardinalDirection.WEST:
-            self.image = pygame.transform.flip(image, True, False)
-        else:
-            self.image = image
-
-    def _check_for_vertical_shift(self):
-        current_screen_position = self.scene.player.position.y - self.scene.vertical_shift
-        if current_screen_position < 2:
-            self.scene.shift_view(0 + (current_screen_position - 2))
-        elif current_screen_position > HEIGHT_IN_TILES - 3:
-            self.scene.shift_view(
-                (current_screen_position + 2) - (HEIGHT_IN_TILES - 1))
+        self.image = self.animator.get_image(
+            self.scene.animation_clock.current_time,
+            flip_x=self.scene.player.direction == CardinalDirection.WEST)
 
 
 class HorizontalMoveAction(AbstractAction):
@@ -191,23 +178,25 @@ class GrassJumpAction(AbstractAction):
             raise ActionException(
                 f"Target position is not walkable: {future_position}")
 
-    def _increment_position_with_direction(self,
-                                           position: Position) -> Position:
-        x, y = position
-        width = self.environment.get_tile_dimensions()[0]
-
-        x = x + 1 if self.direction == CardinalDirection.EAST else x - 1
-        # if x is out of bounds, jump to the next/previous row
-        if x < 0:
-            x = width - 1
-            y -= 1
-        if x > width - 1:
-            x = 0
-            y += 1
-        return Position(x, y)
+    def _find_goal_position(self, current_position: Position) -> Position:
+        index = self.environment.get_index(current_position)
+        words = self.environment.get_vegetation_index(self.ignore_stones)
+
+        goal_index = self._find_goal_index(index, words)
+
+        if goal_index is None:
+            raise ActionException(
+                f"No vegetation found from position {current_position}")
+        return self.environment.get_position(goal_index)
 
     @abstractmethod
-    def _find_goal_position(self, current_position: Position) -> Position:
+    def _find_goal_index(self, index: int,
+                         words: VegetationIndex) -> Optional[int]:
+        """
+        :param index: flat index of the current position
+        :param words: index of vegetation words to jump between
+        :return: flat index of the goal position or None if there is none
+        """
         raise NotImplementedError
 
 
@@ -217,42 +206,12 @@ class GrassStartJumpAction(GrassJumpAction):
                  ignore_stones: bool = False):
         super().__init__(environment, direction, ignore_stones)
 
-    def _find_goal_position(self, current_position: Position) -> Position:
-
-        current_tile = self.environment.tile_at(current_position)
-        source_tile = current_tile
-
-        position = self._increment_position_with_direction(current_position)
-
-        height = self.environment.get_tile_dimensions()[1] - 1
-
-        while 0 <= position.y < height:
-
-            tile = self.environment.tile_at(position)
-
-            if not source_tile.is_stone() and not source_tile.is_grass():
-                # starting on blank tile
-                if tile.is_grass() or tile.is_stone():
-                    return position
-
-            if source_tile.is_grass():
-                # starting on grass tile
-                if not self.ignore_stones and tile.is_stone():
-                    return position
-
-                if not tile.is_grass() and not tile.is_stone():
-                    source_tile = tile
-
-            if source_tile.is_stone():
-                # starting on stone tile
-                if not self.ignore_stones and tile.is_grass():
-                    return position
-                if not tile.is_grass() and not tile.is_stone():
-                    source_tile = tile
-
-            position = self._increment_position_with_direction(position)
-
-        return position
+    def _find_goal_index(self, index: int,
+                         words: VegetationIndex) -> Optional[int]:
+        if self.direction == CardinalDirection.EAST:
+            return words.next_start(index)
+        # going backwards, the last tile of a word is the first one reached
+        return words.previous_end(index)
 
 
 class GrassEndJumpAction(GrassJumpAction):
@@ -261,43 +220,12 @@ class GrassEndJumpAction(GrassJumpAction):
                  ignore_stones: bool = False):
         super().__init__(environment, direction, ignore_stones)
 
-    def _find_goal_position(self, current_position: Position) -> Position:
-        current_tile = self.environment.tile_at(current_position)
-
-        height = self.environment.get_tile_dimensions()[1] - 1
-
-        previous_position = self._increment_position_with_direction(
-            current_position)
-        next_position = self._increment_position_with_direction(
-            previous_position)
-
-        while 0 <= previous_position.y < height:
-
-            previous_tile = self.environment.tile_at(previous_position)
-            next_tile = self.environment.tile_at(next_position)
-
-            if ((previous_tile.is_stone() or previous_tile.is_grass())
-                    and ((
-                                 not next_tile.is_stone() and not next_tile.is_grass())
-                         or (
-                                 not self.environment.contains(
-                                     next_position)))):
-                # previous position was grass/stone and next position is blank
-                # or it is not in the bounds of the map
-                # so return previous position (end of word)
-                return previous_position
-
-            if not self.ignore_stones:
-                if previous_tile.is_grass() and next_tile.is_stone():
-                    return previous_position
-                if previous_tile.is_stone() and next_tile.is_grass():
-                    return previous_position
-
-            previous_position = next_position
-            next_position = self._increment_position_with_direction(
-                next_position)
-
-        return previous_position
+    def _find_goal_index(self, index: int,
+                         words: VegetationIndex) -> Optional[int]:
+        if self.direction == CardinalDirection.EAST:
+            return words.next_end(index)
+        # going backwards, the first tile of a word is the last one reached
+        return words.previous_start(index)
 
 
 @dataclass
@@ -308,34 +236,16 @@ class ContourJumpAction(AbstractAction):
 
     def apply(self, subject: Player):
         previous_position = subject.get_position()
+        y = previous_position.y
 
-        w, h = self.environment.get_tile_dimensions()
-
-        start_x = w - 1 if self.direction == CardinalDirection.EAST else 0
-        shift = -1 if self.direction == CardinalDirection.EAST else 1
+        x = self.environment.find_contour_x(y, self.direction,
+                                            self.to_vegetation)
+        if x is None:
+            raise ActionException("ContourJump not possible")
 
-        y = subject.get_position().y
-
-        position = Position(start_x, y)
-        while self.environment.contains(position):
-
-            if (not self.to_vegetation
-                    and self.environment.tile_at(position).is_walkable()):
-                subject.set_position(position)
-                subject.set_direction(self.get_direction(
-                    subject, previous_position.x, position.x))
-                return
-
-            if (self.to_vegetation
-                    and (self.environment.tile_at(position).is_grass()
-                         or self.environment.tile_at(position).is_stone())):
-                subject.set_position(position)
-                subject.set_direction(self.get_direction(
-                    subject, previous_position.x, position.x))
-                return
-
-            position = Position(position.x + shift, position.y)
-        raise ActionException("ContourJump not possible")
+        subject.set_position(Position(x, y))
+        subject.set_direction(self.get_direction(
+            subject, previous_position.x, x))
 
     @staticmethod
     def get_direction(player: Player,
@@ -386,26 +296,13 @@ class VerticalJumpAction(AbstractAction):
                 start_y = 0
                 shift = 1
 
-        position = Position(previous_position.x, start_y)
-
-        while self.environment.contains(position):
-
-            simulated_player = Player()
-            simulated_player.set_position(position)
-
-            try:
-                simulated_player.apply_action(
-                    ContourJumpAction(self.environment,
-                                      CardinalDirection.WEST,
-                                      to_vegetation=True)
-                )
-                subject.set_position(simulated_player.get_position())
-                subject.set_direction(simulated_player.direction)
-                return
-            except ActionException:
-                position = Position(position.x, position.y + shift)
-
-        raise ActionException("VerticalJump not possible")
-
-
+        y = self.environment.find_vegetation_row(start_y, shift)
+        if y is None:
+            raise ActionException("VerticalJump not possible")
 
+        x = self.environment.find_contour_x(y, CardinalDirection.WEST,
+                                            to_vegetation=True)
+        subject.set_position(Position(x, y))
+        # the landing direction is resolved as if facing east before the jump
+        subject.set_direction(CardinalDirection.WEST if x < previous_position.x
+                              else CardinalDirection.EAST)
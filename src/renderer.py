@@ -1,6 +1,17 @@
+import time
 from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, \
+    Tuple, Union
 
+import pygame
 from pygame import Surface
+from pygame.rect import Rect
+
+Blit = Tuple[Surface, Union[Rect, Tuple[int, int]]]  # image and destination
+
+
+class RendererException(Exception):
+    pass
 
 
 class AbstractRenderer(ABC):
@@ -13,3 +24,258 @@ class AbstractRenderer(ABC):
     def render(self, surface: Surface, *args, **kwargs) -> None:
         """Draw frames onto the given surface."""
         raise NotImplementedError
+
+
+class DirtyRenderer(AbstractRenderer):
+    """
+    Renders sprite groups over a static background and reports only the
+    regions of the surface that changed since the previous frame.
+    A sprite is changed whenever its image, image alpha or rect changes.
+    The background is restored under changed regions and all sprites
+    overlapping these regions are redrawn (in the order of the groups).
+    Regions where the background itself changed can be passed in as well.
+    Besides sprite groups, any object providing 'get_drawables()'
+    (identity, image and rect of everything it draws) can be rendered.
+    """
+    background: Optional[Surface]
+    full_redraw: bool  # whether the whole surface is drawn in the next frame
+    # image, image alpha and rect of everything drawn in the last frame
+    states: Dict[Hashable, Tuple[Surface, Optional[int], Rect]]
+
+    def __init__(self):
+        self.background = None
+        self.full_redraw = True
+        self.states = {}
+
+    def set_background(self, background: Surface) -> None:
+        """Set a new background - the next frame is drawn completely."""
+        self.background = background
+        self.full_redraw = True
+
+    def render(self, surface: Surface, *args,
+               changed: Iterable[Rect] = (), **kwargs) -> List[Rect]:
+        """
+        :param surface: surface to draw onto
+        :param args: sprite groups to draw (in this order)
+        :param changed: regions of the background that changed
+        since the previous frame
+        :return: list of regions of the surface that changed
+        """
+        drawables = [drawable for group in args
+                     for drawable in self._get_drawables(group)]
+        states = {key: (image, image.get_alpha(), Rect(rect))
+                  for key, image, rect in drawables}
+
+        if self.full_redraw:
+            surface.blit(self.background, (0, 0))
+            surface.blits([(image, rect) for _, image, rect in drawables],
+                          doreturn=False)
+            dirty_rects = [surface.get_rect()]
+            self.full_redraw = False
+        else:
+            bounds = surface.get_rect()
+            dirty_rects = [rect.clip(bounds)
+                           for rect in self._find_dirty_rects(states)
+                           + list(changed)
+                           if rect.colliderect(bounds)]
+            # the sprites are redrawn only within the restored regions -
+            # outside of them they would be blended over themselves
+            # (translucent images) or over the sprites above them
+            clip = surface.get_clip()
+            for dirty_rect in dirty_rects:
+                surface.set_clip(dirty_rect)
+                surface.blit(self.background, dirty_rect, dirty_rect)
+                surface.blits([(image, rect) for _, image, rect in drawables
+                               if rect.colliderect(dirty_rect)],
+                              doreturn=False)
+            surface.set_clip(clip)
+
+        self.states = states
+        return dirty_rects
+
+    def _find_dirty_rects(self, states: Dict[Hashable, Tuple[
+            Surface, Optional[int], Rect]]) -> List[Rect]:
+        dirty_rects = []
+
+        for key, state in states.items():
+            previous_state = self.states.get(key)
+            if previous_state is None:
+                dirty_rects.append(state[2])
+            elif (previous_state[0] is not state[0]
+                  or previous_state[1:] != state[1:]):
+                dirty_rects.append(previous_state[2])
+                dirty_rects.append(state[2])
+
+        # sprites that disappeared since the previous frame
+        for key, previous_state in self.states.items():
+            if key not in states:
+                dirty_rects.append(previous_state[2])
+
+        return dirty_rects
+
+    @staticmethod
+    def _get_drawables(group) -> List[Tuple[Hashable, Surface, Rect]]:
+        return get_drawables(group)
+
+
+def get_drawables(group) -> List[Tuple[Hashable, Surface, Rect]]:
+    """:return: identity, image and rect of everything the sprite group
+    (or any object providing 'get_drawables()') draws"""
+    get_group_drawables = getattr(group, "get_drawables", None)
+    if get_group_drawables is not None:
+        return get_group_drawables()
+
+    sprites = getattr(group, "visible_sprites", group.sprites)()
+    return [(sprite, sprite.image, sprite.rect) for sprite in sprites]
+
+
+def upscale_regions(canvas: Surface, screen: Surface,
+                    rects: List[Rect]) -> List[Rect]:
+    """
+    Upscale only the given regions of the canvas onto the screen.
+    Regions are scaled separately only by an integer ratio (the pixels
+    would not be aligned otherwise) - the whole canvas is upscaled instead.
+    :return: the upscaled regions of the screen
+    """
+    (width, height), (screen_width, screen_height) = \
+        canvas.get_size(), screen.get_size()
+    scale = screen_width // width
+    if scale * width != screen_width or scale * height != screen_height:
+        if not rects:
+            return []
+        pygame.transform.scale(canvas, screen.get_size(), screen)
+        return [screen.get_rect()]
+
+    screen_rects = []
+    for rect in rects:
+        screen_rect = Rect(rect.x * scale, rect.y * scale,
+                           rect.w * scale, rect.h * scale)
+        pygame.transform.scale(canvas.subsurface(rect), screen_rect.size,
+                               screen.subsurface(screen_rect))
+        screen_rects.append(screen_rect)
+    return screen_rects
+
+
+def get_blits(group) -> List[Blit]:
+    """:return: image and destination of everything the sprite group
+    (or any object providing 'get_blits()' or 'get_drawables()') draws"""
+    get_group_blits = getattr(group, "get_blits", None)
+    if get_group_blits is not None:
+        return get_group_blits()
+    return [(image, rect) for _, image, rect in get_drawables(group)]
+
+
+class RenderLayer(object):
+    """
+    Named layer of the RenderPipeline. Every frame the layer collects
+    the images it draws and submits them with a single 'blits' call.
+    The images are collected either from a source (a sprite group or
+    anything drawable by the DirtyRenderer) or by a 'collect' function.
+    A layer with a 'cache_key' is static - its images are collected again
+    only when the key changes.
+    """
+    name: str
+    z: int  # layers are drawn from the lowest z
+    source: Optional[Any]
+    collect: Callable[[], List[Blit]]
+    cache_key: Optional[Callable[[], Hashable]]
+    screen_space: bool  # drawn in the screen resolution after upscaling
+    blits: List[Blit]  # images collected for the last frame
+    last_key: Optional[Hashable]
+
+    def __init__(self, name: str, z: int, source: Any = None,
+                 collect: Callable[[], List[Blit]] = None,
+                 cache_key: Callable[[], Hashable] = None,
+                 screen_space: bool = False):
+        if (source is None) == (collect is None):
+            raise RendererException(f"Layer {name} needs either a source "
+                                    f"or a collect function")
+        self.name = name
+        self.z = z
+        self.source = source
+        self.collect = collect if collect is not None \
+            else lambda: get_blits(source)
+        self.cache_key = cache_key
+        self.screen_space = screen_space
+        self.blits = []
+        self.last_key = None
+
+    def render(self, surface: Surface) -> None:
+        if self.cache_key is None:
+            self.blits = self.collect()
+        else:
+            key = self.cache_key()
+            if key != self.last_key or not self.blits:
+                self.blits = self.collect()
+                self.last_key = key
+        surface.blits(self.blits, doreturn=False)
+
+
+class RenderPipeline(AbstractRenderer):
+    """
+    Draws named layers in their z-order and measures how long
+    each layer takes. World layers are drawn onto the canvas, which is
+    then upscaled onto the screen (if they differ), screen space layers
+    (e.g. the HUD) are drawn onto the screen at last.
+    """
+    layers: List[RenderLayer]
+    timings: Dict[str, float]  # total seconds spent by each step
+    n_frames: int
+
+    def __init__(self, *layers: RenderLayer):
+        self.layers = []
+        self.timings = {}
+        self.n_frames = 0
+        for layer in layers:
+            self.add_layer(layer)
+
+    def add_layer(self, layer: RenderLayer) -> None:
+        if any(other.name == layer.name for other in self.layers):
+            raise RendererException(f"Layer {layer.name} is already "
+                                    f"in the pipeline")
+        self.layers.append(layer)
+        # stable - layers with the same z are drawn in the order of adding
+        self.layers.sort(key=lambda other: (other.screen_space, other.z))
+        self.timings.setdefault(layer.name, 0.)
+
+    def get_layer(self, name: str) -> RenderLayer:
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        raise RendererException(f"Layer {name} is not in the pipeline")
+
+    def render(self, surface: Surface, *args, **kwargs) -> None:
+        """
+        :param surface: the canvas to draw the world layers onto
+        :param args: the screen (the canvas itself if not given)
+        """
+        screen = args[0] if args else surface
+
+        for layer in self.layers:
+            if layer.screen_space:
+                continue
+            self._render_layer(layer, surface)
+
+        if surface is not screen:
+            start = time.perf_counter()
+            pygame.transform.scale(surface, screen.get_size(), screen)
+            self._add_timing("upscale", time.perf_counter() - start)
+
+        for layer in self.layers:
+            if layer.screen_space:
+                self._render_layer(layer, screen)
+
+        self.n_frames += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """:return: average milliseconds per frame spent by each layer"""
+        return {name: round(seconds * 1000 / max(self.n_frames, 1), 3)
+                for name, seconds in self.timings.items()}
+
+    def _render_layer(self, layer: RenderLayer, surface: Surface) -> None:
+        start = time.perf_counter()
+        layer.render(surface)
+        self._add_timing(layer.name, time.perf_counter() - start)
+
+    def _add_timing(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.) + seconds
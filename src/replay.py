@@ -1,16 +1,23 @@
+import typing
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Optional, Tuple, Type, TypeVar
 
 from src.constants import VERSION
 from src.utils import Milliseconds, Position
 
+if typing.TYPE_CHECKING:
+    from src.replay_format import ReplayWriter
+
 
 class ParsingException(Exception):
     pass
 
 
 class RecordedEvent(ABC):
+    # events are the most numerous objects of long sessions - they have
+    # no instance dictionaries and the subclasses set the time directly
+    __slots__ = ("time",)
     time: Milliseconds
 
     def __init__(self, time: Milliseconds):
@@ -27,10 +34,11 @@ class RecordedEvent(ABC):
 
 
 class TextInput(RecordedEvent):
+    __slots__ = ("text_input",)
     text_input: str
 
     def __init__(self, time: Milliseconds, text_input: str):
-        super().__init__(time)
+        self.time = time
         self.text_input = text_input
 
     def serialize(self) -> str:
@@ -46,10 +54,11 @@ class TextInput(RecordedEvent):
 
 
 class ShardSpawn(RecordedEvent):
+    __slots__ = ("position",)
     position: Position
 
     def __init__(self, time: Milliseconds, position: Position):
-        super().__init__(time)
+        self.time = time
         self.position = position
 
     def serialize(self) -> str:
@@ -63,11 +72,52 @@ class ShardSpawn(RecordedEvent):
         return ShardSpawn(int(parts[1]), Position(int(parts[2]), int(parts[3])))
 
 
+class StateHash(RecordedEvent):
+    """Hash of the game state after the tick of a recorded input."""
+    __slots__ = ("state_hash",)
+    state_hash: int
+
+    def __init__(self, time: Milliseconds, state_hash: int):
+        self.time = time
+        self.state_hash = state_hash
+
+    def serialize(self) -> str:
+        return f"H {self.time} {self.state_hash:08x}"
+
+    @staticmethod
+    def parse(text: str) -> 'StateHash':
+        parts = text.split()
+        if parts[0] != "H" or len(parts) != 3:
+            raise ParsingException("Not a StateHash event")
+        return StateHash(int(parts[1]), int(parts[2], 16))
+
+
+class GameResult(RecordedEvent):
+    """Result claimed at the end of the game."""
+    __slots__ = ("collected_shards",)
+    collected_shards: int
+
+    def __init__(self, time: Milliseconds, collected_shards: int):
+        self.time = time
+        self.collected_shards = collected_shards
+
+    def serialize(self) -> str:
+        return f"R {self.time} {self.collected_shards}"
+
+    @staticmethod
+    def parse(text: str) -> 'GameResult':
+        parts = text.split()
+        if parts[0] != "R" or len(parts) != 3:
+            raise ParsingException("Not a GameResult event")
+        return GameResult(int(parts[1]), int(parts[2]))
+
+
 class VersionInfo(RecordedEvent):
+    __slots__ = ("info",)
     info: str
 
     def __init__(self, time: Milliseconds):
-        super().__init__(time)
+        self.time = time
         self.info = VERSION
 
     def serialize(self) -> str:
@@ -83,17 +133,24 @@ class VersionInfo(RecordedEvent):
         return version_info
 
 
+E = TypeVar("E", bound=RecordedEvent)
+
+
 class Recording(object):
     start_time: Milliseconds
     data: List[RecordedEvent]
+    # streams the events into a file instead of keeping them in 'data'
+    writer: Optional['ReplayWriter']
 
-    def __init__(self):
+    def __init__(self, writer: Optional['ReplayWriter'] = None):
         self.start_time = 0
         self.data = []
+        self.writer = writer
 
     def start(self, current_time: Milliseconds):
         self.start_time = current_time
-        self.data = [VersionInfo(self.get_recording_time(current_time))]
+        self.data = []
+        self._store_event(VersionInfo(self.get_recording_time(current_time)))
 
     def record_text_input(self, current_time: Milliseconds, text_input: str) -> 'Recording':
         if text_input:
@@ -107,42 +164,89 @@ class Recording(object):
                                      spawn_position))
         return self
 
+    def record_state_hash(self, current_time: Milliseconds,
+                          state_hash: int) -> 'Recording':
+        self._store_event(StateHash(self.get_recording_time(current_time),
+                                    state_hash))
+        return self
+
+    def record_result(self, current_time: Milliseconds,
+                      collected_shards: int) -> 'Recording':
+        self._store_event(GameResult(self.get_recording_time(current_time),
+                                     collected_shards))
+        return self
+
+    def tick(self, current_time: Milliseconds) -> 'Recording':
+        """Let the writer write out the events recorded for too long."""
+        if self.writer is not None:
+            self.writer.flush_due(self.get_recording_time(current_time))
+        return self
+
     def get_recording_time(self, current_time: Milliseconds) -> Milliseconds:
         return current_time - self.start_time
 
     def _store_event(self, event: RecordedEvent) -> 'Recording':
-        self.data.append(event)
+        if self.writer is None:
+            self.data.append(event)
+        else:
+            self.writer.write(event)
         return self
 
+    def get_events(self, event_type: Type[E]) -> List[E]:
+        """:return: the recorded events of the given type (in order)"""
+        return [event for event in self.data if isinstance(event, event_type)]
+
     def serialize(self) -> str:
         return "\n".join(map(lambda x: x.serialize(), self.data))
 
     @staticmethod
     def parse(text: str) -> 'Recording':
-        lines = text.split("\n")
-
-        events = []
-        for line in lines:
-            if len(line) == 0:
-                continue
-
-            first_char = line[0]
-
-            try:
-                if first_char == "I":
-                    events.append(TextInput.parse(line))
-                elif first_char == "S":
-                    events.append(ShardSpawn.parse(line))
-                elif first_char == "V":
-                    events.append(VersionInfo.parse(line))
-                else:
-                    raise ParsingException("Unsupported recorded event")
-            except ParsingException as e:
-                raise e
-            except Exception as e:
-                raise ParsingException(f"Unexpected parsing error: {str(e)}")
-
         recording = Recording()
-        recording.data = events
+        recording.data = [parse_event(line) for line in text.split("\n")
+                          if len(line) > 0]
         return recording
 
+
+def parse_event(line: str) -> RecordedEvent:
+    """:return: the event recorded on the (non-empty) line"""
+    first_char = line[0]
+
+    try:
+        if first_char == "I":
+            return TextInput.parse(line)
+        elif first_char == "S":
+            return ShardSpawn.parse(line)
+        elif first_char == "H":
+            return StateHash.parse(line)
+        elif first_char == "R":
+            return GameResult.parse(line)
+        elif first_char == "V":
+            return VersionInfo.parse(line)
+        else:
+            raise ParsingException("Unsupported recorded event")
+    except ParsingException as e:
+        raise e
+    except Exception as e:
+        raise ParsingException(f"Unexpected parsing error: {str(e)}")
+
+
+class RecordingPlayer(object):
+    """Plays the recorded text inputs back by the recording time."""
+    inputs: List[TextInput]
+    position: int  # index of the next input to be played
+
+    def __init__(self, recording: Recording):
+        self.inputs = recording.get_events(TextInput)
+        self.position = 0
+
+    def pop_inputs(self, recording_time: Milliseconds) -> List[TextInput]:
+        """:return: the inputs recorded until 'recording_time'
+        which were not played yet"""
+        start = self.position
+        while (self.position < len(self.inputs)
+               and self.inputs[self.position].time <= recording_time):
+            self.position += 1
+        return self.inputs[start:self.position]
+
+    def is_over(self) -> bool:
+        return self.position >= len(self.inputs)
@@ -0,0 +1,585 @@
+"""
+Compact binary format of the recordings.
+
+The file starts with a header (magic and version) followed by blocks
+of events. Each block has its own header - the compression of its events,
+the stored and the raw length, CRC-32 of the stored bytes and the times
+of its first and last event - so it can be checked, skipped or decoded
+on its own.
+
+Every event has a one-byte tag (the letter of its text form), a delta
+of its time from the previous event of the block and a compact payload.
+The events of a block are stored by columns - the tags, the time deltas,
+the lengths of the texts, the texts, the state hashes and the other
+numbers. The integer columns have the narrowest width fitting their values
+(given before the columns), so each column is read at once by numpy:
+
+* I - the inputted text
+* S - x and y of the spawned shard (deltas from the previous spawn)
+* H - 4 bytes of the state hash
+* R - number of the collected shards
+* V - the version info
+
+The events are written block by block while the game runs. They are
+read lazily from the memory-mapped file (see 'read_events') - the blocks
+out of the requested time range are skipped by their headers without
+being decompressed. Convert a text recording (run from the 'src'
+directory):
+
+    PYTHONPATH=.. python -m src.replay_format recording.txt recording.vzr
+"""
+import argparse
+import logging
+import lzma
+import mmap
+import os
+import struct
+import zlib
+from itertools import compress
+
+import numpy as np
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, \
+    Optional, Tuple
+
+from src.constants import REPLAY_BLOCK_SIZE, REPLAY_COMPRESSION, \
+    REPLAY_FLUSH_INTERVAL
+from src.replay import Recording, RecordedEvent, TextInput, ShardSpawn, \
+    StateHash, GameResult, VersionInfo, parse_event
+from src.utils import Milliseconds, Position
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"VZRP"
+VERSION = 2
+HEADER = struct.Struct("<4sH")  # magic, version
+# compression, stored length, raw length, checksum, first and last time
+BLOCK = struct.Struct("<BIIIQQ")
+STATE_HASH = np.dtype("<u4")
+# little-endian unsigned integers by their width in bytes
+_WIDTHS: Dict[int, np.dtype] = {width: np.dtype(f"<u{width}")
+                                for width in (1, 2, 4, 8)}
+
+TAG_TEXT_INPUT = ord("I")
+TAG_SHARD_SPAWN = ord("S")
+TAG_STATE_HASH = ord("H")
+TAG_GAME_RESULT = ord("R")
+TAG_VERSION_INFO = ord("V")
+
+_LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+
+COMPRESSIONS: Dict[str, int] = {"none": 0, "zlib": 1, "lzma": 2}
+_COMPRESSORS: Dict[int, Callable[[bytes], bytes]] = {
+    0: bytes,
+    1: lambda raw: zlib.compress(raw, 6),
+    2: lambda raw: lzma.compress(raw, lzma.FORMAT_RAW, filters=_LZMA_FILTERS),
+}
+_DECOMPRESSORS: Dict[int, Callable[[bytes], bytes]] = {
+    0: bytes,
+    1: zlib.decompress,
+    2: lambda stored: lzma.decompress(stored, lzma.FORMAT_RAW,
+                                      filters=_LZMA_FILTERS),
+}
+
+
+class ReplayFormatException(Exception):
+    pass
+
+
+def is_binary_replay(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    if value < 0:
+        raise ReplayFormatException(f"Negative varint {value}")
+    while value >= 0x80:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    """:return: the value and the position after it"""
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise ReplayFormatException("Data ends within a varint")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class BlockColumns(object):
+    """Raw events of a block split into columns by the kind of their values
+    (the similar values compress better and each column is decoded at once).
+    The numbers are stored by columns of the narrowest fitting width."""
+    tags: bytearray
+    deltas: List[int]  # of the times
+    texts: Dict[str, int]  # distinct texts of the block by their indices
+    text_indices: List[int]
+    hashes: List[int]
+    numbers: List[int]  # zigzag encoded
+    last_spawn: Position  # the spawns are stored as deltas from the last one
+
+    def __init__(self):
+        self.tags = bytearray()
+        self.deltas = []
+        self.texts = {}
+        self.text_indices = []
+        self.hashes = []
+        self.numbers = []
+        self.last_spawn = Position(0, 0)
+
+    def __len__(self) -> int:
+        """:return: the number of the events"""
+        return len(self.tags)
+
+    def write_text(self, text: str) -> None:
+        # the inputs repeat the few keys of the controls
+        self.text_indices.append(self.texts.setdefault(text, len(self.texts)))
+
+    def write_number(self, value: int) -> None:
+        self.numbers.append(value << 1 if value >= 0 else ~value << 1 | 1)
+
+    def to_bytes(self) -> bytes:
+        """:return: the number of the events and of the distinct texts
+        and the widths of the integer columns followed by the columns
+        (their lengths follow from the tags)"""
+        texts = [text.encode("utf-8") for text in self.texts]
+        columns = [self.deltas, self.text_indices, list(map(len, texts)),
+                   self.numbers]
+        widths = [_get_width(values) for values in columns]
+
+        raw = bytearray()
+        write_varint(raw, len(self.tags))
+        write_varint(raw, len(texts))
+        raw += bytes(widths)
+        raw += self.tags
+        for values, width in zip(columns[:3], widths):
+            raw += np.array(values, _WIDTHS[width]).tobytes()
+        raw += b"".join(texts)
+        raw += np.array(self.hashes, STATE_HASH).tobytes()
+        raw += np.array(self.numbers, _WIDTHS[widths[3]]).tobytes()
+        return bytes(raw)
+
+
+def _get_width(values: List[int]) -> int:
+    """:return: bytes of the narrowest integer fitting all the values"""
+    largest = max(values, default=0)
+    for width in _WIDTHS:
+        if largest < 1 << 8 * width:
+            return width
+    raise ReplayFormatException(f"Value {largest} does not fit 8 bytes")
+
+
+def _encode_text_input(columns: BlockColumns, event: TextInput) -> None:
+    columns.write_text(event.text_input)
+
+
+def _encode_shard_spawn(columns: BlockColumns, event: ShardSpawn) -> None:
+    columns.write_number(event.position.x - columns.last_spawn.x)
+    columns.write_number(event.position.y - columns.last_spawn.y)
+    columns.last_spawn = event.position
+
+
+def _encode_state_hash(columns: BlockColumns, event: StateHash) -> None:
+    columns.hashes.append(event.state_hash)
+
+
+def _encode_game_result(columns: BlockColumns, event: GameResult) -> None:
+    columns.write_number(event.collected_shards)
+
+
+def _encode_version_info(columns: BlockColumns, event: VersionInfo) -> None:
+    columns.write_text(event.info)
+
+
+# tags and payload encoders by the type of the event
+_ENCODERS: Dict[type, Tuple[int, Callable[[BlockColumns, RecordedEvent],
+                                          None]]] = {
+    TextInput: (TAG_TEXT_INPUT, _encode_text_input),
+    ShardSpawn: (TAG_SHARD_SPAWN, _encode_shard_spawn),
+    StateHash: (TAG_STATE_HASH, _encode_state_hash),
+    GameResult: (TAG_GAME_RESULT, _encode_game_result),
+    VersionInfo: (TAG_VERSION_INFO, _encode_version_info),
+}
+
+
+def _read_texts(lengths: np.ndarray, data: bytes) -> List[str]:
+    offsets = [0]
+    offsets.extend(np.cumsum(lengths).tolist())
+    return [data[start:end].decode("utf-8")
+            for start, end in zip(offsets, offsets[1:])]
+
+
+def decode_block(raw: bytes, time: Milliseconds) -> List[RecordedEvent]:
+    """Decode the columns of the block and put the events together.
+    :param raw: the decompressed events of a block
+    :param time: time of the first event of the block
+    :return: the decoded events"""
+    n_events, position = read_varint(raw, 0)
+    n_distinct_texts, position = read_varint(raw, position)
+    widths = raw[position:position + 4]
+    position += 4
+    if len(widths) != 4 or any(width not in _WIDTHS for width in widths):
+        raise ReplayFormatException(f"Block has invalid column widths "
+                                    f"{list(widths)}")
+    delta_type, index_type, length_type, number_type = (
+        _WIDTHS[width] for width in widths)
+
+    def read_column(dtype: np.dtype, count: int) -> np.ndarray:
+        nonlocal position
+        column = np.frombuffer(raw, dtype, count, position)
+        position += column.nbytes
+        return column
+
+    try:
+        tags = read_column(np.uint8, n_events)
+        counts = np.bincount(tags, minlength=256)
+        n_texts = int(counts[TAG_TEXT_INPUT] + counts[TAG_VERSION_INFO])
+        n_numbers = int(2 * counts[TAG_SHARD_SPAWN]
+                        + counts[TAG_GAME_RESULT])
+        deltas = read_column(delta_type, n_events)
+        text_indices = read_column(index_type, n_texts)
+        text_lengths = read_column(length_type, n_distinct_texts)
+        texts = raw[position:position + int(text_lengths.sum())]
+        position += len(texts)
+        hashes = read_column(STATE_HASH, int(counts[TAG_STATE_HASH]))
+        numbers = read_column(number_type, n_numbers).astype(np.int64)
+    except ValueError:
+        raise ReplayFormatException("Block ends within its columns")
+    if position != len(raw):
+        raise ReplayFormatException(f"Block has {len(raw) - position} B "
+                                    f"after its columns")
+    n_known = n_texts + int(counts[TAG_STATE_HASH] + counts[TAG_SHARD_SPAWN]
+                            + counts[TAG_GAME_RESULT])
+    if n_known != n_events:
+        raise ReplayFormatException(f"Block has {n_events - n_known} events "
+                                    f"of unknown tags")
+    if n_texts > 0 and text_indices.max() >= n_distinct_texts:
+        raise ReplayFormatException(f"Block has {n_distinct_texts} texts, "
+                                    f"text {text_indices.max()} used")
+
+    times = np.cumsum(deltas, dtype=np.int64) + time
+    texts = list(map(_read_texts(text_lengths, texts).__getitem__,
+                     text_indices.tolist()))
+    numbers = iter(((numbers >> 1) ^ -(numbers & 1)).tolist())  # zigzag
+
+    # the frequent events are constructed in bulk, the rare ones one by one
+    is_input = tags == TAG_TEXT_INPUT
+    is_state_hash = tags == TAG_STATE_HASH
+    is_text = is_input | (tags == TAG_VERSION_INFO)
+    inputs = np.flatnonzero(is_input)
+    state_hashes = np.flatnonzero(is_state_hash)
+    others = np.flatnonzero(~(is_input | is_state_hash))
+    events = list(map(TextInput, times[inputs].tolist(),
+                      compress(texts, is_input[is_text].tolist())))
+    events.extend(map(StateHash, times[state_hashes].tolist(),
+                      hashes.tolist()))
+
+    other_texts = compress(texts, (~is_input)[is_text].tolist())
+    x = y = 0
+    for tag, time in zip(tags[others].tolist(), times[others].tolist()):
+        if tag == TAG_SHARD_SPAWN:
+            x += next(numbers)
+            y += next(numbers)
+            events.append(ShardSpawn(time, Position(x, y)))
+        elif tag == TAG_GAME_RESULT:
+            events.append(GameResult(time, next(numbers)))
+        else:
+            version_info = VersionInfo(time)
+            version_info.info = next(other_texts)
+            events.append(version_info)
+
+    # back in the order of the tags
+    order = np.empty(n_events, np.intp)
+    order[np.concatenate((inputs, state_hashes, others))] = \
+        np.arange(n_events)
+    return list(map(events.__getitem__, order.tolist()))
+
+
+class ReplayWriter(object):
+    """Writes the recorded events into a binary replay block by block
+    (a block is written once it has the block size of events or once
+    it spans the flush interval)."""
+    file: BinaryIO
+    compression: int
+    block_size: int  # events in a block
+    flush_interval: Milliseconds  # the longest time span of a block
+    columns: BlockColumns  # of the current block
+    first_time: Optional[Milliseconds]  # of the current block
+    last_time: Milliseconds  # of the last written event
+    n_blocks: int
+    written: int  # number of bytes written into the file
+
+    def __init__(self, file: BinaryIO, compression: str = REPLAY_COMPRESSION,
+                 block_size: int = REPLAY_BLOCK_SIZE,
+                 flush_interval: Milliseconds = REPLAY_FLUSH_INTERVAL):
+        if compression not in COMPRESSIONS:
+            raise ReplayFormatException(
+                f"Unknown compression '{compression}', "
+                f"expected one of {list(COMPRESSIONS)}")
+        self.file = file
+        self.compression = COMPRESSIONS[compression]
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.columns = BlockColumns()
+        self.first_time = None
+        self.last_time = 0
+        self.n_blocks = 0
+        self.written = self.file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, event: RecordedEvent) -> 'ReplayWriter':
+        if event.time < self.last_time:
+            raise ReplayFormatException(
+                f"Event at {event.time} ms is older than the previous one "
+                f"({self.last_time} ms)")
+        tag, encode = _ENCODERS[type(event)]
+        if self.first_time is None:
+            self.first_time = event.time
+            self.last_time = event.time
+
+        self.columns.tags.append(tag)
+        self.columns.deltas.append(event.time - self.last_time)
+        encode(self.columns, event)
+        self.last_time = event.time
+
+        if len(self.columns) >= self.block_size:
+            self.flush()
+        else:
+            self.flush_due(event.time)
+        return self
+
+    def flush_due(self, time: Milliseconds) -> None:
+        """Write the current block if it spans the flush interval
+        at the given recording time."""
+        if (self.first_time is not None
+                and time - self.first_time >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the current block (if there are any events in it)."""
+        if self.first_time is None:
+            return
+        raw = self.columns.to_bytes()
+        compression = self.compression
+        stored = _COMPRESSORS[compression](raw)
+        if len(stored) >= len(raw):
+            # not worth decompressing
+            compression, stored = 0, raw
+
+        self.written += self.file.write(BLOCK.pack(
+            compression, len(stored), len(raw), zlib.crc32(stored),
+            self.first_time, self.last_time))
+        self.written += self.file.write(stored)
+        self.file.flush()
+
+        self.n_blocks += 1
+        self.columns = BlockColumns()
+        self.first_time = None
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+    def __enter__(self) -> 'ReplayWriter':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+
+class BlockHeader(NamedTuple):
+    compression: int
+    stored_length: int
+    raw_length: int
+    checksum: int  # CRC-32 of the stored events
+    first_time: Milliseconds
+    last_time: Milliseconds
+    position: int  # of the stored events
+
+    @property
+    def end(self) -> int:
+        """Position of the next block."""
+        return self.position + self.stored_length
+
+
+def read_header(data: bytes) -> int:
+    """Check the header of the replay.
+    :return: position of the first block"""
+    try:
+        magic, version = HEADER.unpack_from(data)
+    except struct.error:
+        raise ReplayFormatException("Replay is too short")
+    if magic != MAGIC or version != VERSION:
+        raise ReplayFormatException(f"Unsupported replay format "
+                                    f"({magic}, version {version})")
+    return HEADER.size
+
+
+def read_block_header(data: bytes, position: int) -> BlockHeader:
+    try:
+        header = BlockHeader(*BLOCK.unpack_from(data, position),
+                             position + BLOCK.size)
+    except struct.error:
+        raise ReplayFormatException(f"Truncated block at {position}")
+    if header.end > len(data):
+        raise ReplayFormatException(f"Block at {position} exceeds the replay")
+    if header.compression not in _DECOMPRESSORS:
+        raise ReplayFormatException(f"Unknown compression "
+                                    f"{header.compression} of block "
+                                    f"at {position}")
+    return header
+
+
+def read_block(data: bytes, header: BlockHeader) -> List[RecordedEvent]:
+    """Check, decompress and decode the events of the block."""
+    stored = data[header.position:header.end]
+    if zlib.crc32(stored) != header.checksum:
+        raise ReplayFormatException(f"Corrupted block at {header.position}")
+    try:
+        raw = _DECOMPRESSORS[header.compression](stored)
+    except (zlib.error, lzma.LZMAError) as e:
+        raise ReplayFormatException(f"Block at {header.position} "
+                                    f"cannot be decompressed - {e}")
+    if len(raw) != header.raw_length:
+        raise ReplayFormatException(f"Block at {header.position} has "
+                                    f"{len(raw)} B, {header.raw_length} B "
+                                    f"expected")
+    try:
+        return decode_block(raw, header.first_time)
+    except UnicodeDecodeError as e:
+        raise ReplayFormatException(f"Block at {header.position} has "
+                                    f"an invalid text - {e}")
+
+
+def iter_blocks(data: bytes, start_time: Optional[Milliseconds] = None,
+                end_time: Optional[Milliseconds] = None
+                ) -> Iterator[List[RecordedEvent]]:
+    """Decode the binary replay block by block.
+    :param start_time: the blocks ending before it are skipped without
+    being decompressed (no block is skipped if not given)
+    :param end_time: the reading stops at the first block starting after it
+    (all blocks are read if not given)
+    :return: the events of the read blocks"""
+    position = read_header(data)
+    while position < len(data):
+        header = read_block_header(data, position)
+        position = header.end
+        if end_time is not None and header.first_time > end_time:
+            return
+        if start_time is not None and header.last_time < start_time:
+            continue
+        events = read_block(data, header)
+        if (start_time is not None and header.first_time < start_time) \
+                or (end_time is not None and header.last_time > end_time):
+            # the block overlaps the range only partially
+            events = [event for event in events
+                      if _is_in_range(event, start_time, end_time)]
+        yield events
+
+
+def iter_binary(data: bytes, start_time: Optional[Milliseconds] = None,
+                end_time: Optional[Milliseconds] = None
+                ) -> Iterator[RecordedEvent]:
+    """Decode the events of the binary replay block by block.
+    :param start_time: first time of the yielded events (see 'iter_blocks')
+    :param end_time: last time of the yielded events"""
+    for events in iter_blocks(data, start_time, end_time):
+        yield from events
+
+
+def iter_text(lines: Iterator[bytes],
+              start_time: Optional[Milliseconds] = None,
+              end_time: Optional[Milliseconds] = None
+              ) -> Iterator[RecordedEvent]:
+    """Parse the events of the text recording line by line.
+    :param start_time: the earlier events are not yielded
+    :param end_time: the parsing stops at the first event after it"""
+    for line in lines:
+        line = line.decode("utf-8").rstrip("\n")
+        if len(line) == 0:
+            continue
+        event = parse_event(line)
+        if end_time is not None and event.time > end_time:
+            return
+        if _is_in_range(event, start_time, end_time):
+            yield event
+
+
+def _is_in_range(event: RecordedEvent, start_time: Optional[Milliseconds],
+                 end_time: Optional[Milliseconds]) -> bool:
+    return (start_time is None or event.time >= start_time) \
+        and (end_time is None or event.time <= end_time)
+
+
+def read_events(path: str, start_time: Optional[Milliseconds] = None,
+                end_time: Optional[Milliseconds] = None
+                ) -> Iterator[RecordedEvent]:
+    """Read the events of the recording in the text or in the binary format
+    lazily from the memory-mapped file - only a line or a block of events
+    is held at once, whatever the length of the game.
+    :param start_time: first recording time of the yielded events
+    :param end_time: last recording time of the yielded events"""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return  # an empty file cannot be mapped
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if is_binary_replay(data):
+                yield from iter_binary(data, start_time, end_time)
+            else:
+                yield from iter_text(iter(data.readline, b""), start_time,
+                                     end_time)
+
+
+def parse_binary(data: bytes) -> Recording:
+    recording = Recording()
+    for events in iter_blocks(data):
+        recording.data.extend(events)
+    return recording
+
+
+def encode_binary(recording: Recording, file: BinaryIO,
+                  compression: str = REPLAY_COMPRESSION,
+                  block_size: int = REPLAY_BLOCK_SIZE) -> int:
+    """Write the whole recording into the file as a binary replay.
+    :return: number of the written bytes"""
+    writer = ReplayWriter(file, compression, block_size)
+    for event in recording.data:
+        writer.write(event)
+    writer.flush()
+    return writer.written
+
+
+def load_recording(path: str) -> Recording:
+    """:return: the recording from the file in the text
+    or in the binary format"""
+    recording = Recording()
+    recording.data = list(read_events(path))
+    return recording
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Convert a recording into the binary format")
+    parser.add_argument("source", help="recording in the text format")
+    parser.add_argument("target")
+    parser.add_argument("--compression", choices=list(COMPRESSIONS),
+                        default=REPLAY_COMPRESSION)
+    parser.add_argument("--block-size", type=int, default=REPLAY_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    source_recording = load_recording(args.source)
+    with open(args.target, "wb") as target:
+        length = encode_binary(source_recording, target, args.compression,
+                               args.block_size)
+    log.info(f"Wrote {len(source_recording.data)} events into "
+             f"{args.target} ({length} B)")
@@ -1,32 +1,38 @@
 import logging
-import random
-from dataclasses import dataclass
+import os
+import time
 
-from pygame._sprite import Group
-
-from src.animation import AnimationManager
+from src.animation import AnimationManager, AnimationClock
+from src.camera import Camera, CameraGroup
 from src.control import PlayerController
-from src.ui.game_hud import GameHudFactory
+from src.ui.game_hud import GameHudFactory, ShardCountUI, ClockUI
 
 log = logging.getLogger(__name__)
 from abc import ABC, abstractmethod
-from typing import Any, List, cast, Optional
+from typing import Any, Dict, List, Optional
 
 import pygame
-import yaml
 from pygame.event import Event
+from pygame.rect import Rect
 from pygame.surface import Surface
-from pygame.time import Clock
 
-from src.constants import TICK_SPEED, HEIGHT_IN_TILES
-from src.environment import Environment, EnvironmentRenderer
+from src.clock import FrameClock
+from src.constants import HEIGHT_IN_TILES, BACKGROUND_COLOR, \
+    WIDTH_IN_TILES, TILE_SIZE_PX, FONT_JOYSTIX, HUD_FONT_SIZE
 from src.event import EventHandler, AppEventHandler, TextEventHandler
-from src.player import Player, PlayerSprite
-from src.replay import Recording
-from src.settings import GameSettings
+from src.loader import AssetLoader, GameAssets
+from src.player import PlayerSprite
+from src.renderer import DirtyRenderer, RenderPipeline, RenderLayer, \
+    upscale_regions
+from src.settings import GameSettings, load_settings
 from src.shard import ShardSprite, Shard
-from src.utils import Position, Milliseconds, CardinalDirection
-from src.particle import ParticleSprite
+from src.replay import Recording, RecordingPlayer
+from src.replay_format import ReplayWriter
+from src.simulation import GameSimulation, GameData, StepResult, \
+    create_replay_simulation
+from src.texture import texture_cache
+from src.utils import Position, CardinalDirection
+from src.particle import ParticleSpec, ParticleSystem
 
 
 class SceneException(Exception):
@@ -36,12 +42,11 @@ class SceneException(Exception):
 class Scene(ABC):
     screen: Surface
     settings: GameSettings
-    clock: Clock
+    clock: FrameClock
     event_handlers: List[EventHandler]
 
-    def __init__(self, screen: Surface, clock: Clock):
-        self.settings = GameSettings(
-            **yaml.load(open("../config.yaml"), Loader=yaml.FullLoader))
+    def __init__(self, screen: Surface, clock: FrameClock):
+        self.settings = load_settings()
         self.screen = screen
         self.clock = clock
         self.event_handlers = [AppEventHandler(self)]
@@ -89,10 +94,10 @@ class Scene(ABC):
 
 class EmptyScene(Scene):
 
-    def __init__(self, screen: Surface, clock: Clock):
+    def __init__(self, screen: Surface, clock: FrameClock):
         super().__init__(screen, clock)
 
-    def run(self) -> bool:
+    def run(self) -> str:
         while True:
 
             # handle events
@@ -105,202 +110,304 @@ class EmptyScene(Scene):
             self.screen.fill("gray")
 
             pygame.display.update()
-            self.clock.tick(TICK_SPEED)
+            self.clock.tick()
 
 
-@dataclass
-class GameData:
+class LoadingScene(Scene):
+    """Shows the loading progress while the assets are decoded and the
+    world is prepared in the background. Continues with the GameScene."""
+    loader: AssetLoader
+    assets: GameAssets
 
-    start_time: Optional[Milliseconds] = None
-    end_time: Optional[Milliseconds] = None
-    collected_shards: int = 0
+    def __init__(self, screen: Surface, clock: FrameClock,
+                 assets: Optional[GameAssets] = None):
+        """:param assets: to be loaded for the following games"""
+        super().__init__(screen, clock)
+        self.assets = GameAssets() if assets is None else assets
+        self.loader = AssetLoader()
+        self.loader.preload_graphics()
+        self.loader.preload_fonts(FONT_JOYSTIX, HUD_FONT_SIZE,
+                                  [ShardCountUI.color, ClockUI.color])
+        self.loader.preload_game(self.assets, self.settings)
 
+    def run(self) -> str:
+        start_time = pygame.time.get_ticks()
+        while True:
+            self.handle_events()
 
-class GameScene(Scene):
+            self.loader.poll()
+            if self.loader.is_done():
+                self.loader.shutdown()
+                log.info(f"Assets loaded in "
+                         f"{pygame.time.get_ticks() - start_time} ms")
+                return GameScene.__name__
+
+            self.draw_progress(self.loader.get_progress())
 
-    def __init__(self, screen: Surface, clock: Clock):
+            pygame.display.update()
+            self.clock.tick()
+
+    def draw_progress(self, progress: float) -> None:
+        width, height = self.screen.get_size()
+        bar = Rect(0, 0, width // 2, max(height // 48, 1))
+        bar.center = (width // 2, height // 2)
+
+        self.screen.fill(BACKGROUND_COLOR)
+        pygame.draw.rect(self.screen, "gray", bar, width=1)
+        pygame.draw.rect(self.screen, "white", Rect(
+            bar.topleft, (int(bar.width * progress), bar.height)))
+
+
+class GameScene(Scene):
+    """
+    Presents the headless game simulation - owns the sprites, particles
+    and animations and feeds the simulation with the input of each tick.
+    """
+
+    def __init__(self, screen: Surface, clock: FrameClock,
+                 replay: Optional[Recording] = None,
+                 assets: Optional[GameAssets] = None):
+        """:param replay: recording to play back instead of the input
+        :param assets: world prepared by the LoadingScene
+        (loaded synchronously if it is missing)"""
         super().__init__(screen, clock)
-        self.environment = Environment(self.settings,
-                                       open("../assets/maps/default.txt",
-                                            "r").read())
+        if assets is None:
+            assets = GameAssets()
+        if not assets.is_loaded():
+            log.warning("The world was not preloaded - loading it now")
+            assets.load(self.settings)
+
+        if replay is None:
+            self.simulation = GameSimulation(self.settings,
+                                             assets.encoded_map,
+                                             recording=self.create_recording(),
+                                             environment=assets.environment)
+            self.recording_player = None
+        else:
+            self.simulation = create_replay_simulation(
+                self.settings, assets.encoded_map, replay,
+                environment=assets.environment)
+            self.recording_player = RecordingPlayer(replay)
+        self.environment = self.simulation.environment
+        self.player = self.simulation.player
+        self.recording = self.simulation.recording
+        self.data = self.simulation.data
 
         self.animation_manager = AnimationManager(self)
+        self.animation_clock = AnimationClock(self.animation_manager,
+                                              self.clock.current_time)
 
-        self.vertical_shift = 0
-        self.environment_renderer = EnvironmentRenderer(self.environment,
-                                                        self.settings)
+        self.camera = Camera(self.settings.render_scale)
+        self.environment_renderer = assets.environment_renderer
 
         self.text_event_handler = TextEventHandler(self)
         self.add_event_handler(self.text_event_handler)
         self.player_controller = PlayerController(self)
 
-        self.recording = Recording()
-
-        self.player = Player()
-        self.player.set_position(self.environment.get_starting_position())
         self.player_sprite = PlayerSprite(self, self.player)
         self.player_group = pygame.sprite.GroupSingle(self.player_sprite)
 
-        self.shard_group = pygame.sprite.Group([])
+        self.shard_group = CameraGroup(self.camera)
+        self.shard_sprites: Dict[Position, ShardSprite] = {}
 
-        self.particle_group = pygame.sprite.Group([])
+        self.particle_system = ParticleSystem(self.camera,
+                                              self.animation_manager)
 
         self.hud_ui_group = GameHudFactory.build_group(self)
 
+        # the static environment is collected again only when the view shifts
+        self.render_pipeline = RenderPipeline(
+            RenderLayer("environment", 0,
+                        collect=lambda: self.environment_renderer.get_blits(
+                            self.camera),
+                        cache_key=lambda: self.vertical_shift),
+            RenderLayer("player", 10, self.player_group),
+            RenderLayer("shards", 20, self.shard_group),
+            RenderLayer("particles", 30, self.particle_system),
+            # HUD is always drawn in the resolution of the screen
+            RenderLayer("hud", 40, self.hud_ui_group, screen_space=True),
+        )
+
+        if self.settings.native_resolution:
+            # the world is drawn unscaled and upscaled once per frame
+            self.canvas = Surface((WIDTH_IN_TILES * TILE_SIZE_PX,
+                                   HEIGHT_IN_TILES * TILE_SIZE_PX)).convert()
+        else:
+            self.canvas = self.screen
+
+        self.dirty_rendering = self.settings.dirty_rendering
+        self.dirty_renderer = DirtyRenderer()
+        self.background = Surface(self.canvas.get_size())
+        self.background_shift = None  # vertical shift of the background
+        if self.canvas is not self.screen:
+            # the changed regions of the canvas are upscaled into the world
+            # image, the HUD is drawn over it in the screen resolution
+            self.upscaled_world = Surface(self.screen.get_size()).convert()
+            self.hud_renderer = DirtyRenderer()
+            self.hud_renderer.set_background(self.upscaled_world)
+
         self.player_group.update()
-        self.spawn_pack_of_shards()
+
+    def create_recording(self) -> Recording:
+        """:return: recording streamed into a new file in the recording
+        directory (kept in memory if there is no such directory)"""
+        if self.settings.recording_dir is None:
+            return Recording()
+        os.makedirs(self.settings.recording_dir, exist_ok=True)
+        path = os.path.join(self.settings.recording_dir,
+                            time.strftime("%Y%m%d-%H%M%S") + ".vzr")
+        log.info(f"Recording the game into {path}")
+        return Recording(ReplayWriter(open(path, "wb"),
+                                      self.settings.recording_compression))
+
+    @property
+    def vertical_shift(self) -> int:
+        """The first visible row of the world."""
+        return self.camera.vertical_shift
 
     def shift_view(self, amount: int) -> int:
         """Shift the view of the world by +amount
         :param amount: by how many rows down should the world shift
         :return the new vertical_shift
         """
-        self.vertical_shift += amount
-        return self.vertical_shift
+        return self.camera.shift(amount)
 
-    def spawn_particle(self, particle_sprite: ParticleSprite) -> None:
+    def spawn_particle(self, particle: ParticleSpec) -> None:
         """Spawns a given particle. Particles should destroy automatically
         once their animation is over."""
-        self.particle_group.add(particle_sprite)
-
-    def spawn_shard(self, position: Position) -> None:
-        """Spawns a shard at a given position.
-        :param position: where to spawn a shard
-        """
-        shard = Shard(position)
-        self.shard_group.add(ShardSprite(self, shard))
-        self.recording.record_shard_spawn(pygame.time.get_ticks(), position)
+        self.particle_system.spawn(particle,
+                                   self.animation_clock.current_time)
+
+    def present_actions(self, result: StepResult) -> None:
+        """Present the actions performed during a step of the simulation."""
+        for action in result.actions:
+            self.player_controller.present(action)
+
+    def present_shards(self, result: StepResult) -> None:
+        """Present the shards collected and spawned during a step
+        of the simulation."""
+        for shard in result.collected_shards:
+            self.shard_group.remove(self.shard_sprites.pop(shard.position))
+            self.spawn_particle(
+                ParticleSpec.create_shard_collected(shard.position))
+        for shard in result.spawned_shards:
+            self.present_shard_spawn(shard)
+
+    def present_shard_spawn(self, shard: Shard) -> None:
+        """Adds the sprite of a spawned shard and points to it
+        if it is out of the view."""
+        self.shard_sprites[shard.position] = ShardSprite(self, shard)
+        self.shard_group.add(self.shard_sprites[shard.position])
 
         if shard.position.y > self.vertical_shift + HEIGHT_IN_TILES:
             # shard is below the screen
-            particle = ParticleSprite.create_shard_pointer(
-                self,
+            particle = ParticleSpec.create_shard_pointer(
                 Position(shard.position.x, self.vertical_shift + HEIGHT_IN_TILES - 2),
                 CardinalDirection.SOUTH
             )
-            self.particle_group.add(particle)
+            self.spawn_particle(particle)
         elif shard.position.y < self.vertical_shift:
             # shard is above the screen
-            particle = ParticleSprite.create_shard_pointer(
-                self,
+            particle = ParticleSpec.create_shard_pointer(
                 Position(shard.position.x, self.vertical_shift + 1),
                 CardinalDirection.NORTH
             )
-            self.particle_group.add(particle)
-
-    def spawn_random_shard(self) -> None:
-        """Spawns a shard at a random walkable position.
-        At least 4 units far from the player.
-        And where there is no other shard."""
-
-        def get_random_position(environment: 'Environment') -> Position:
-            w, h = environment.get_tile_dimensions()
-            x = random.randint(0, w - 1)
-            y = random.randint(0, h - 2)
-            return Position(x, y)
-
-        def is_close_to_the_player(position: Position, player: Player) -> bool:
-            if abs(player.get_position().x - position.x) < 4:
-                return True
-            if abs(player.get_position().y - position.y) < 4:
-                return True
-            return False
-
-        def contains_shard(position: Position, shard_group: Group) -> bool:
-            for shard_sprite in shard_group.sprites():
-                shard_position = cast(ShardSprite, shard_sprite).shard.position
-                if position == shard_position:
-                    return True
-            return False
-
-        random_position = get_random_position(self.environment)
-        n_rolls = 1
-        while (not self.environment.tile_at(random_position).is_walkable()
-               or is_close_to_the_player(random_position, self.player)
-               or contains_shard(random_position, self.shard_group)):
-            random_position = get_random_position(self.environment)
-            n_rolls += 1
-
-            if n_rolls > 500:
-                log.error(f"Spawning random shard took too many ({n_rolls}) "
-                          f"tries, no shard was spawned")
-                return
-
-        log.debug(f"Shard spawn took {n_rolls} tries")
-        self.spawn_shard(random_position)
-
-    def spawn_pack_of_shards(self):
-        """Spawns two random shards."""
-        self.spawn_random_shard()
-        self.spawn_random_shard()
-
-    def handle_collisions(self):
-        colliding_sprites = pygame.sprite.spritecollide(
-            self.player_sprite, self.shard_group, dokill=False,
-            collided=self.is_player_colliding_with_shard)
-
-        if colliding_sprites:
-            log.debug("collision with shard")
-
-            # spawn shard collected particles
-            for sprite in colliding_sprites:
-                position = cast(ShardSprite, sprite).shard.position
-                self.spawn_particle(ParticleSprite.create_shard_collected(self, position))
-
-            # remove collected shards
-            number_of_shards = len(colliding_sprites)
-            self.shard_group.remove(colliding_sprites)
-
-            # add shards to score
-            self.data.collected_shards += number_of_shards
-
-            # spawn new random shards if there are no shards
-            if len(self.shard_group.sprites()) == 0:
-                self.spawn_pack_of_shards()
-
-    @staticmethod
-    def is_player_colliding_with_shard(player: PlayerSprite,
-                                       shard: ShardSprite):
-        return player.rect.colliderect(shard.hitbox)
-
-    def run(self) -> bool:
-
-        self.recording.start(pygame.time.get_ticks())
+            self.spawn_particle(particle)
+
+    def run(self) -> str:
+        try:
+            return self.play()
+        finally:
+            # also when the window is closed or the game crashes
+            self.end_recording()
+
+    def end_recording(self) -> None:
+        """Record the result (unless it is recorded already) and write
+        the rest of the recording."""
+        if self.data.end_time is None:
+            self.simulation.finish(self.simulation.current_time)
+        if self.recording.writer is not None:
+            self.recording.writer.close()
+
+    def play(self) -> str:
+
+        self.present_shards(self.simulation.start(self.clock.current_time))
         log.info("Started recording")
         while True:
 
+            # everything in this frame is timed by a single clock sample
+            current_time = self.clock.current_time
+            self.animation_clock.tick(current_time)
             events = self.handle_events()
 
-            text_input = self.text_event_handler.get_text_from_this_tick()
-
-            self.recording.record_text_input(pygame.time.get_ticks(), text_input)
-            self.player_controller.handle_input(text_input)
+            if self.recording_player is None:
+                text_input = self.text_event_handler.get_text_from_this_tick()
+                result = self.simulation.step(text_input, current_time)
+            else:
+                result = self.simulation.replay(self.recording_player,
+                                                current_time)
+            self.present_actions(result)
+            # presented before the update, so the changes of this step
+            # (e.g. the new shards) are drawn in this frame
+            self.present_shards(result)
 
             # additional event handling that will need to be refactored later
             # TODO: move this somewhere else
             for event in events:
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                    print("=======RECORDING=STARTS==")
-                    print(self.recording.serialize())
-                    print("=======RECORDING=ENDS====")
+                    self.simulation.finish(current_time)
+                    if self.recording.writer is None:
+                        print("=======RECORDING=STARTS==")
+                        print(self.recording.serialize())
+                        print("=======RECORDING=ENDS====")
+                    log.info(f"Texture cache: {texture_cache.get_stats()}")
+                    log.info(f"Particles: "
+                             f"{self.particle_system.get_stats()}")
+                    log.info(f"Render layers (ms per frame): "
+                             f"{self.render_pipeline.get_stats()}")
                     log.info("Return from game scene")
                     return None
 
-            self.screen.fill("dimgray")
-
             self.player_group.update()
             self.shard_group.update()
-            self.particle_group.update()
+            self.particle_system.update(current_time)
             self.hud_ui_group.update()
 
-            self.environment_renderer.render(self.screen, self.vertical_shift)
-            self.player_group.draw(self.screen)
-            self.shard_group.draw(self.screen)
-            self.particle_group.draw(self.screen)
-
-            self.hud_ui_group.draw(self.screen)
-
-            self.handle_collisions()
-
-            pygame.display.update()
-            self.clock.tick(TICK_SPEED)
+            if self.dirty_rendering:
+                dirty_rects = self.draw_changes()
+            else:
+                self.draw()
+                dirty_rects = [self.screen.get_rect()]
+
+            pygame.display.update(dirty_rects)
+            self.clock.tick()
+
+    def draw(self) -> None:
+        """Draw the whole scene onto the screen."""
+        self.canvas.fill(BACKGROUND_COLOR)
+        self.render_pipeline.render(self.canvas, self.screen)
+
+    def draw_changes(self) -> List[Rect]:
+        """Draw only the changed parts of the scene onto the screen.
+        The static environment is kept pre-rendered in the background,
+        the whole scene is redrawn whenever the view shifts.
+        In the native resolution only the changed parts are upscaled.
+        :return: list of screen regions that changed"""
+        if self.background_shift != self.vertical_shift:
+            self.background.fill(BACKGROUND_COLOR)
+            self.environment_renderer.render(self.background, self.camera)
+            self.background_shift = self.vertical_shift
+            self.dirty_renderer.set_background(self.background)
+
+        # layers without a source (the environment) are in the background
+        world = [layer.source for layer in self.render_pipeline.layers
+                 if layer.source is not None and not layer.screen_space]
+        hud = [layer.source for layer in self.render_pipeline.layers
+               if layer.source is not None and layer.screen_space]
+        if self.canvas is self.screen:
+            return self.dirty_renderer.render(self.screen, *world, *hud)
+
+        changed = upscale_regions(
+            self.canvas, self.upscaled_world,
+            self.dirty_renderer.render(self.canvas, *world))
+        return self.hud_renderer.render(self.screen, *hud, changed=changed)
@@ -1,7 +1,14 @@
+import os
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Optional
 import logging
 
+import yaml
+
+from src.constants import TEXTURE_CACHE_BUDGET, CHUNK_CACHE_BUDGET, \
+    TEXTURE_CACHE_DIR, REPLAY_COMPRESSION, REPLAY_STATE_HASH_INTERVAL, \
+    CONFIG
+
 log = logging.getLogger(__name__)
 
 
@@ -15,14 +22,40 @@ class GameSettings:
     controls: Dict[str, str]
     buffer_keys: str
     key_event_map: Dict[Key, str]
+    texture_cache_budget: int  # in bytes
+    texture_cache_dir: Optional[str]  # None disables the cache on disk
+    chunk_cache_budget: int  # in bytes
+    dirty_rendering: bool  # redraw only the changed regions of the screen
+    native_resolution: bool  # render the world unscaled and upscale it once
+    recording_dir: Optional[str]  # None prints the recordings as text
+    recording_compression: str  # of the blocks of the binary recordings
+    # inputs between the recorded state hashes (a game is verified
+    # with the interval it was recorded with)
+    state_hash_interval: int
 
     def __init__(self,
                  scale_factor: float = 5.,
                  controls: Dict[str, Key] = None,
-                 buffer_keys: str = "g"):
+                 buffer_keys: str = "g",
+                 texture_cache_budget: int = TEXTURE_CACHE_BUDGET,
+                 texture_cache_dir: Optional[str] = TEXTURE_CACHE_DIR,
+                 chunk_cache_budget: int = CHUNK_CACHE_BUDGET,
+                 dirty_rendering: bool = False,
+                 native_resolution: bool = False,
+                 recording_dir: Optional[str] = None,
+                 recording_compression: str = REPLAY_COMPRESSION,
+                 state_hash_interval: int = REPLAY_STATE_HASH_INTERVAL):
         self.scale_factor = scale_factor
         self.controls = controls
         self.buffer_keys = buffer_keys
+        self.texture_cache_budget = texture_cache_budget
+        self.texture_cache_dir = texture_cache_dir
+        self.chunk_cache_budget = chunk_cache_budget
+        self.dirty_rendering = dirty_rendering
+        self.native_resolution = native_resolution
+        self.recording_dir = recording_dir
+        self.recording_compression = recording_compression
+        self.state_hash_interval = state_hash_interval
 
         self.key_event_map = {}
 
@@ -40,4 +73,22 @@ class GameSettings:
                 raise TypeError(f"Unknown key type ({type(key_char)}) "
                                 f"in controls")
 
+    @property
+    def render_scale(self) -> float:
+        """Scale of the rendered world - in the native resolution mode
+        the world is rendered unscaled and the scale factor is applied
+        only when presenting the frame."""
+        return 1. if self.native_resolution else self.scale_factor
+
+
+def load_settings(path: str = CONFIG) -> GameSettings:
+    """:return: settings of the YAML config file - relative directories
+    in the config are relative to the directory of the file"""
+    with open(path) as config_file:
+        config = yaml.load(config_file, Loader=yaml.FullLoader)
 
+    directory = os.path.dirname(os.path.abspath(path))
+    for name in ("texture_cache_dir", "recording_dir"):
+        if config.get(name) is not None:
+            config[name] = os.path.join(directory, config[name])
+    return GameSettings(**config)
@@ -6,10 +6,9 @@ from pygame.rect import Rect
 from pygame.sprite import AbstractGroup
 from pygame.surface import Surface
 
-from src.animation import Animation
-from src.utils import Position, load_scaled_surface, load_scaled_surfaces
+from src.utils import Position, Point
 
-from src.constants import IMG_SHARD, TILE_SIZE_PX, ANIM_SHARD_IDLE
+from src.constants import TILE_SIZE_PX
 
 if TYPE_CHECKING:
     from src.scene import GameScene
@@ -29,20 +28,20 @@ class ShardSprite(pygame.sprite.Sprite):
     rect: Rect
     hitbox: Rect
 
-    animation: Animation
+    phase: int  # phase of the shared idle clip
 
     def __init__(self, scene: 'GameScene', shard: Shard, *groups: AbstractGroup):
         super().__init__(*groups)
         self.scene = scene
         self.shard = shard
 
-        scale_factor = self.scene.settings.scale_factor
+        scale_factor = self.scene.settings.render_scale
 
-        # load images and create looping animation
-        frames = load_scaled_surfaces(ANIM_SHARD_IDLE, scale_factor)
-        self.image = frames[0]
-        self.animation = Animation(frames, 75, loop=True)
-        self.animation.start(pygame.time.get_ticks())
+        # the idle animation is shared by all shards, each shard
+        # starts from its first frame
+        self.phase = self.scene.animation_clock.get_phase("shard-idle")
+        self.image = self.scene.animation_clock.get_image("shard-idle",
+                                                          self.phase)
 
         center_of_first_tile = ((TILE_SIZE_PX // 2) * scale_factor,
                                 (TILE_SIZE_PX // 2) * scale_factor)
@@ -54,17 +53,15 @@ class ShardSprite(pygame.sprite.Sprite):
 
     def update(self, *args, **kwargs) -> None:
         self._update_rectangle_based_on_current_position()
-        self.image = self.animation.get_image(pygame.time.get_ticks())
+        self.image = self.scene.animation_clock.get_image("shard-idle",
+                                                          self.phase)
 
-    def _update_rectangle_based_on_current_position(self):
-        scale_factor = self.scene.settings.scale_factor
-        position = self.shard.position
-
-        x = (position.x * TILE_SIZE_PX) + (TILE_SIZE_PX // 2)
-        x = x * scale_factor
+    def get_tile_position(self) -> Position:
+        return self.shard.position
 
-        y = ((position.y - self.scene.vertical_shift) * TILE_SIZE_PX) + (TILE_SIZE_PX // 2)
-        y = y * scale_factor
+    def _update_rectangle_based_on_current_position(self):
+        center = self.scene.camera.tile_to_px(
+            self.shard.position, Point(TILE_SIZE_PX // 2, TILE_SIZE_PX // 2))
 
-        self.rect.center = (x, y)
-        self.hitbox.center = (x, y)
+        self.rect.center = center
+        self.hitbox.center = center
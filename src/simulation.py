@@ -0,0 +1,335 @@
+"""
+Headless core of the game.
+
+The simulation holds the whole state of a game session (the environment,
+the player, the shards, the score and the recording) and advances it
+by the text input of each tick. It does not touch the display - the
+GameScene presents the results of its steps, while tests and bots can
+step it as fast as the CPU allows.
+"""
+import logging
+import random
+import zlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Iterable, Iterator
+
+from src.action import AbstractAction, ActionException
+from src.constants import HEIGHT_IN_TILES, TICK_DURATION
+from src.environment import Environment
+from src.player import Player, HorizontalMoveAction, VerticalMoveAction, \
+    GrassEndJumpAction, GrassStartJumpAction, ContourJumpAction, \
+    VerticalJumpAction
+from src.replay import Recording, RecordingPlayer, ShardSpawn
+from src.settings import GameSettings
+from src.shard import Shard
+from src.utils import Position, CardinalDirection, Milliseconds
+
+log = logging.getLogger(__name__)
+
+# actions of the player by the names of the events in the controls
+ACTIONS: Dict[str, Callable[[Environment], AbstractAction]] = {
+    "dash-left": lambda environment: HorizontalMoveAction(environment, -1),
+    "dash-down": lambda environment: VerticalMoveAction(environment, 1),
+    "dash-up": lambda environment: VerticalMoveAction(environment, -1),
+    "dash-right": lambda environment: HorizontalMoveAction(environment, 1),
+    "blink-to-the-end-of-next-vegetation": lambda environment:
+        GrassEndJumpAction(environment, CardinalDirection.EAST),
+    "blink-to-the-end-of-next-vegetation-chunk": lambda environment:
+        GrassEndJumpAction(environment, CardinalDirection.EAST,
+                           ignore_stones=True),
+    "blink-to-the-start-of-next-vegetation": lambda environment:
+        GrassStartJumpAction(environment, CardinalDirection.EAST),
+    "blink-to-the-start-of-next-vegetation-chunk": lambda environment:
+        GrassStartJumpAction(environment, CardinalDirection.EAST,
+                             ignore_stones=True),
+    "blink-to-the-start-of-previous-vegetation": lambda environment:
+        GrassEndJumpAction(environment, CardinalDirection.WEST),
+    "blink-to-the-start-of-previous-vegetation-chunk": lambda environment:
+        GrassEndJumpAction(environment, CardinalDirection.WEST,
+                           ignore_stones=True),
+    "blink-to-the-end-of-contour": lambda environment:
+        ContourJumpAction(environment, CardinalDirection.EAST),
+    "blink-to-the-start-of-contour": lambda environment:
+        ContourJumpAction(environment, CardinalDirection.WEST),
+    "blink-to-the-start-of-first-vegetation-chunk": lambda environment:
+        ContourJumpAction(environment, CardinalDirection.WEST,
+                          to_vegetation=True),
+    "blink-to-the-top": lambda environment:
+        VerticalJumpAction(environment, -1, CardinalDirection.NORTH),
+    "blink-up": lambda environment:
+        VerticalJumpAction(environment, HEIGHT_IN_TILES,
+                           CardinalDirection.NORTH),
+    "blink-up-half": lambda environment:
+        VerticalJumpAction(environment, HEIGHT_IN_TILES // 2,
+                           CardinalDirection.NORTH),
+    "blink-down": lambda environment:
+        VerticalJumpAction(environment, HEIGHT_IN_TILES,
+                           CardinalDirection.SOUTH),
+    "blink-down-half": lambda environment:
+        VerticalJumpAction(environment, HEIGHT_IN_TILES // 2,
+                           CardinalDirection.SOUTH),
+    "blink-to-the-bottom": lambda environment:
+        VerticalJumpAction(environment, -1, CardinalDirection.SOUTH),
+}
+
+
+@dataclass
+class GameData:
+
+    start_time: Optional[Milliseconds] = None
+    end_time: Optional[Milliseconds] = None
+    collected_shards: int = 0
+
+
+@dataclass
+class PerformedAction:
+    name: str  # name of the event in the controls
+    previous_position: Position
+    previous_direction: CardinalDirection
+    # right after the action (the player may perform more actions in a step)
+    position: Position
+    direction: CardinalDirection
+
+
+@dataclass
+class StepResult:
+    """What happened during one step (for the presentation)."""
+    actions: List[PerformedAction] = field(default_factory=list)
+    spawned_shards: List[Shard] = field(default_factory=list)
+    collected_shards: List[Shard] = field(default_factory=list)
+
+    def extend(self, other: 'StepResult') -> 'StepResult':
+        self.actions.extend(other.actions)
+        self.spawned_shards.extend(other.spawned_shards)
+        self.collected_shards.extend(other.collected_shards)
+        return self
+
+
+class GameSimulation(object):
+    settings: GameSettings
+    environment: Environment
+    player: Player
+    shards: Dict[Position, Shard]  # at most one shard per tile
+    data: GameData
+    recording: Recording
+    random: random.Random  # decides the positions of the spawned shards
+    # positions of the spawned shards given in advance (e.g. by a replay)
+    spawn_positions: Optional[Iterator[Position]]
+    current_time: Milliseconds
+    n_inputs: int  # non-empty inputs since the start
+    buffer: str  # buffered keys of a multi-key control (e.g. 'gg')
+    result: StepResult  # of the current step
+
+    def __init__(self, settings: GameSettings, encoded_map: str,
+                 seed: Optional[int] = None,
+                 spawn_positions: Optional[Iterable[Position]] = None,
+                 recording: Optional[Recording] = None,
+                 environment: Optional[Environment] = None):
+        """:param recording: to record the game into (e.g. streaming it
+        into a file)
+        :param environment: parsed from the encoded map in advance
+        (it is not changed by the game, so games can share it)"""
+        self.settings = settings
+        self.environment = Environment(settings, encoded_map) \
+            if environment is None else environment
+        self.player = Player()
+        self.player.set_position(self.environment.get_starting_position())
+        self.shards = {}
+        self.data = GameData()
+        self.recording = Recording() if recording is None else recording
+        self.random = random.Random(seed)
+        self.spawn_positions = iter(spawn_positions) \
+            if spawn_positions is not None else None
+        self.current_time = 0
+        self.n_inputs = 0
+        self.buffer = ""
+        self.result = StepResult()
+
+    def start(self, current_time: Milliseconds = 0) -> StepResult:
+        """Start the recording and spawn the first shards."""
+        self.current_time = current_time
+        self.n_inputs = 0
+        self.result = StepResult()
+        self.data.start_time = current_time
+        self.recording.start(current_time)
+        self.spawn_pack_of_shards()
+        return self.result
+
+    def step(self, text_input: str,
+             current_time: Optional[Milliseconds] = None) -> StepResult:
+        """Advance the game by one tick.
+        :param text_input: text inputted during the tick
+        :param current_time: time of the tick (one headless tick after
+        the previous one if not given)
+        :return: what happened during the tick"""
+        self.current_time = self.current_time + TICK_DURATION \
+            if current_time is None else current_time
+        self.result = StepResult()
+
+        self.recording.record_text_input(self.current_time, text_input)
+        self.handle_input(text_input)
+        self.handle_collisions()
+        if text_input:
+            # the state changes only by the input - the trail of the hashes
+            # (every few inputs and at the end) reveals where a replay
+            # diverges
+            self.n_inputs += 1
+            if self.n_inputs % self.settings.state_hash_interval == 0:
+                self.recording.record_state_hash(self.current_time,
+                                                 self.get_state_hash())
+        self.recording.tick(self.current_time)
+        return self.result
+
+    def finish(self, current_time: Milliseconds) -> GameData:
+        """End the game and record its last state and its result."""
+        self.current_time = current_time
+        self.data.end_time = current_time
+        self.recording.record_state_hash(current_time, self.get_state_hash())
+        self.recording.record_result(current_time,
+                                     self.data.collected_shards)
+        return self.data
+
+    def get_state_hash(self) -> int:
+        """:return: CRC-32 of the player, the shards, the score
+        and the buffered keys"""
+        position = self.player.get_position()
+        state = [f"{position.x},{position.y},{self.player.direction.value}",
+                 str(self.data.collected_shards), self.buffer]
+        state.extend(f"{x},{y}" for x, y in sorted(self.shards))
+        return zlib.crc32(";".join(state).encode("utf-8"))
+
+    def replay(self, player: RecordingPlayer,
+               current_time: Milliseconds) -> StepResult:
+        """Play back the inputs recorded until 'current_time', each of them
+        in its own step at its recorded time.
+        :return: what happened during all the played steps"""
+        result = StepResult()
+        for text_input in player.pop_inputs(
+                self.recording.get_recording_time(current_time)):
+            result.extend(self.step(
+                text_input.text_input,
+                self.recording.start_time + text_input.time))
+        self.result = result
+        return result
+
+    def handle_input(self, text_input: str) -> None:
+        for char in text_input:
+            log.debug(f"detected char: {char} ({bytes(char, 'ascii')})")
+            text = char
+
+            # check for buffer
+            if len(self.buffer) > 0:
+                # something is in the buffer - take it out and clear buffer
+                text = self.buffer + char
+                self.buffer = ""
+            else:
+                if char in self.settings.buffer_keys:
+                    # add buffer key to an empty buffer
+                    self.buffer = self.buffer + char
+                    log.debug(f"buffer: {bytes(self.buffer, 'ascii')}")
+                    return
+
+            if text in self.settings.key_event_map:
+                self.perform(self.settings.key_event_map[text])
+            else:
+                log.warning(f"Unknown input text {bytes(text, 'ascii')}")
+
+    def perform(self, action_name: str) -> bool:
+        """Apply the action of the given name to the player.
+        :return: whether the action was valid"""
+        action = ACTIONS.get(action_name)
+        if action is None:
+            log.warning(f"Unknown action {action_name}")
+            return False
+
+        previous_position = self.player.get_position()
+        previous_direction = self.player.direction
+        try:
+            self.player.apply_action(action(self.environment))
+        except ActionException as e:
+            log.debug(f"invalid action - {e}")
+            return False
+
+        self.result.actions.append(PerformedAction(
+            action_name, previous_position, previous_direction,
+            self.player.get_position(), self.player.direction))
+        return True
+
+    def spawn_shard(self, position: Position) -> None:
+        shard = Shard(position)
+        self.shards[position] = shard
+        self.recording.record_shard_spawn(self.current_time, position)
+        self.result.spawned_shards.append(shard)
+
+    def spawn_random_shard(self) -> None:
+        """Spawns a shard at a random walkable position.
+        At least 4 units far from the player.
+        And where there is no other shard.
+        The positions given in advance are used first."""
+        if self.spawn_positions is not None:
+            position = next(self.spawn_positions, None)
+            if position is not None:
+                self.spawn_shard(position)
+                return
+            log.warning("No more spawn positions given - shards are "
+                        "spawned randomly")
+            self.spawn_positions = None
+
+        w, h = self.environment.get_tile_dimensions()
+
+        def get_random_position() -> Position:
+            x = self.random.randint(0, w - 1)
+            y = self.random.randint(0, h - 2)
+            return Position(x, y)
+
+        def is_close_to_the_player(position: Position) -> bool:
+            player_position = self.player.get_position()
+            return (abs(player_position.x - position.x) < 4
+                    or abs(player_position.y - position.y) < 4)
+
+        random_position = get_random_position()
+        n_rolls = 1
+        while (not self.environment.tile_at(random_position).is_walkable()
+               or is_close_to_the_player(random_position)
+               or random_position in self.shards):
+            random_position = get_random_position()
+            n_rolls += 1
+
+            if n_rolls > 500:
+                log.error(f"Spawning random shard took too many ({n_rolls}) "
+                          f"tries, no shard was spawned")
+                return
+
+        log.debug(f"Shard spawn took {n_rolls} tries")
+        self.spawn_shard(random_position)
+
+    def spawn_pack_of_shards(self) -> None:
+        """Spawns two random shards."""
+        self.spawn_random_shard()
+        self.spawn_random_shard()
+
+    def handle_collisions(self) -> None:
+        """Collect the shard on the tile of the player (if any)."""
+        shard = self.shards.pop(self.player.get_position(), None)
+        if shard is None:
+            return
+
+        log.debug("collision with shard")
+        self.result.collected_shards.append(shard)
+        self.data.collected_shards += 1
+
+        # spawn new random shards if there are no shards
+        if not self.shards:
+            self.spawn_pack_of_shards()
+
+
+def create_replay_simulation(settings: GameSettings, encoded_map: str,
+                             recording: Recording,
+                             environment: Optional[Environment] = None
+                             ) -> GameSimulation:
+    """:return: simulation spawning the shards where they were recorded"""
+    spawn_positions = [spawn.position
+                       for spawn in recording.get_events(ShardSpawn)]
+    return GameSimulation(settings, encoded_map,
+                          spawn_positions=spawn_positions,
+                          environment=environment)
@@ -1,26 +1,27 @@
 import unittest
-from dataclasses import dataclass
-from typing import cast
 
 import pygame
+from pygame.surface import Surface
 
 from src.animation import Animation, FallbackAnimator, AnimationException, \
-    LinearAlphaFadeAnimation
+    LinearAlphaFadeAnimation, AnimationClock
 from src.environment import Environment, EnvironmentException
 from src.settings import GameSettings
 from src.utils import Position
 
 
-@dataclass
-class MockedAlphaSurface:
-    frame: str  # test frame
-    alpha: int = 255
+class DummyAnimationManager:
 
-    def set_alpha(self, value: int):
-        self.alpha = value
+    def __init__(self):
+        self.animations = {
+            "idle": Animation(["A", "B", "C"], 100, loop=True),
+            "dash": Animation(["D"], 100),
+        }
+        self.n_copies = 0
 
-    def get_alpha(self) -> int:
-        return self.alpha
+    def get_animation(self, name: str) -> Animation:
+        self.n_copies += 1
+        return self.animations[name].copy()
 
 
 class AnimationTest(unittest.TestCase):
@@ -74,16 +75,41 @@ class AnimationTest(unittest.TestCase):
         self.assertEqual("1", a.get_image(410))
         self.assertFalse(a.is_over())
 
+    def test_animation_should_use_prebuilt_mirrored_frames(self):
+        a = Animation(["0", "1"], 10).add_flipped_frames(
+            True, False, ["0-left", "1-left"])
+        copy = a.copy()
+
+        copy.start(100)
+        self.assertEqual("0", copy.get_image(100))
+        self.assertEqual("0-left", copy.get_image(100, flip_x=True))
+        self.assertEqual("1-left", copy.get_image(115, flip_x=True))
+        self.assertIs(a.get_frames(True, False),
+                      copy.get_frames(True, False))
+
+        self.assertRaises(AnimationException, a.add_flipped_frames,
+                          False, True, ["0-south"])
+
+
+def create_frame(color: str, alpha: int = 255) -> Surface:
+    frame = Surface((2, 2), pygame.SRCALPHA)
+    frame.fill(pygame.Color(color)[:3] + (alpha,))
+    return frame
+
+
+def get_pixel_alpha(image: Surface) -> int:
+    return image.get_at((0, 0)).a
+
 
 class LinearAlphaFadeAnimationTest(unittest.TestCase):
 
     def test_animation_should_end_correctly(self):
 
         dummy_frames = [
-            MockedAlphaSurface("A"),
-            MockedAlphaSurface("B"),
-            MockedAlphaSurface("C"),
-            MockedAlphaSurface("D"),
+            create_frame("red"),
+            create_frame("green"),
+            create_frame("blue"),
+            create_frame("white"),
         ]
         a = LinearAlphaFadeAnimation(dummy_frames, 100)
 
@@ -92,25 +118,60 @@ class LinearAlphaFadeAnimationTest(unittest.TestCase):
         # start animation at 10_000-th millisecond
         a.start(10_000)
         self.assertFalse(a.is_over())
-        self.assertEqual("A", cast(MockedAlphaSurface, a.get_image(10_000)).frame)
-        self.assertEqual(255, a.get_image(10_000).get_alpha())
-
-        self.assertEqual("A",
-                         cast(MockedAlphaSurface, a.get_image(10_050)).frame)
-        self.assertGreater(255, a.get_image(10_050).get_alpha())
-        self.assertLess(255 / 4 * 3, a.get_image(10_050).get_alpha())
-
-        self.assertEqual("B",
-                         cast(MockedAlphaSurface, a.get_image(10_100)).frame)
-        self.assertGreater(255, a.get_image(10_100).get_alpha())
-        self.assertLess(255 / 4 * 2, a.get_image(10_100).get_alpha())
-
-        self.assertEqual("D",
-                         cast(MockedAlphaSurface, a.get_image(10_300)).frame)
-        self.assertGreater(255 / 4 * 2, a.get_image(10_300).get_alpha())
-        self.assertLess(0, a.get_image(10_300).get_alpha())
-
-        self.assertEqual(0, a.get_image(10_400).get_alpha())
+        self.assertIs(dummy_frames[0], a.get_image(10_000))
+        self.assertEqual(255, get_pixel_alpha(a.get_image(10_000)))
+
+        self.assertEqual((255, 0, 0),
+                         a.get_image(10_050).get_at((0, 0))[:3])
+        self.assertGreater(255, get_pixel_alpha(a.get_image(10_050)))
+        self.assertLess(255 / 4 * 3, get_pixel_alpha(a.get_image(10_050)))
+
+        self.assertEqual((0, 255, 0),
+                         a.get_image(10_100).get_at((0, 0))[:3])
+        self.assertGreater(255, get_pixel_alpha(a.get_image(10_100)))
+        self.assertLess(255 / 4 * 2, get_pixel_alpha(a.get_image(10_100)))
+
+        self.assertEqual((255, 255, 255),
+                         a.get_image(10_300).get_at((0, 0))[:3])
+        self.assertGreater(255 / 4 * 2, get_pixel_alpha(a.get_image(10_300)))
+        self.assertLess(0, get_pixel_alpha(a.get_image(10_300)))
+
+        self.assertEqual(0, get_pixel_alpha(a.get_image(10_400)))
+
+    def test_fading_should_not_modify_shared_frames(self):
+        dummy_frames = [create_frame("red"), create_frame("green")]
+        a = LinearAlphaFadeAnimation(dummy_frames, 100, alpha_levels=5)
+        first, second = a.copy(), a.copy()
+
+        first.start(0)
+        second.start(150)
+        self.assertEqual(191, get_pixel_alpha(first.get_image(50)))
+        self.assertEqual(255, get_pixel_alpha(second.get_image(150)))
+        self.assertEqual(63, get_pixel_alpha(first.get_image(150)))
+
+        self.assertEqual([255, 255],
+                         [get_pixel_alpha(f) for f in dummy_frames])
+        self.assertEqual(5, len(a.get_fade_table()[0]))
+        self.assertIs(first.get_fade_table(), second.get_fade_table())
+
+    def test_alpha_should_be_multiplied_into_pixels(self):
+        translucent = create_frame("red", alpha=128)
+        opaque = Surface((2, 2))
+        opaque.fill("blue")
+        a = LinearAlphaFadeAnimation([translucent, opaque], 100,
+                                     alpha_levels=3)
+
+        for frame, faded_frames in zip([translucent, opaque],
+                                       a.get_fade_table()):
+            self.assertIs(frame, faded_frames[2])
+            for faded_frame in faded_frames[:2]:
+                # no surface alpha is applied by blitting
+                self.assertEqual(255, faded_frame.get_alpha())
+
+        [[hidden, half, _], [_, half_opaque, _]] = a.get_fade_table()
+        self.assertEqual((255, 0, 0, 0), hidden.get_at((1, 1)))
+        self.assertEqual((255, 0, 0, 128 * 127 // 255), half.get_at((1, 1)))
+        self.assertEqual((0, 0, 255, 127), half_opaque.get_at((1, 1)))
 
 
 class FallbackAnimatorTest(unittest.TestCase):
@@ -171,5 +232,49 @@ class FallbackAnimatorTest(unittest.TestCase):
         self.assertEqual("B", animator.get_image(10_330))
 
 
+class AnimationClockTest(unittest.TestCase):
+
+    def test_clock_should_share_clips_between_phases(self):
+        manager = DummyAnimationManager()
+        clock = AnimationClock(manager, 1_050)
+
+        first_phase = clock.get_phase("idle")
+        self.assertEqual("A", clock.get_image("idle", first_phase))
+        self.assertEqual("B", clock.get_image("idle"))
+
+        clock.tick(1_120)
+        second_phase = clock.get_phase("idle")
+        self.assertEqual("B", clock.get_image("idle", first_phase))
+        self.assertEqual("A", clock.get_image("idle", second_phase))
+
+        clock.tick(1_310)
+        self.assertEqual("A", clock.get_image("idle", first_phase))
+        self.assertEqual("C", clock.get_image("idle", second_phase))
+        self.assertEqual(1, manager.n_copies)
+
+    def test_clock_should_only_share_looping_clips(self):
+        clock = AnimationClock(DummyAnimationManager(), 0)
+
+        self.assertRaises(AnimationException, clock.get_image, "dash")
+
+    def test_animator_should_fall_back_to_clock_clip(self):
+        clock = AnimationClock(DummyAnimationManager(), 10_000)
+        animator = FallbackAnimator({
+            "idle": Animation(["X"], 100, loop=True),
+            "dash": Animation(["D"], 50)}, clock)
+
+        animator.start(clock.current_time)
+        self.assertEqual("A", animator.get_image(clock.current_time))
+
+        animator.start_animation("dash", clock.tick(10_120))
+        self.assertEqual("D", animator.get_image(clock.current_time))
+        # the clip restarts when the dash ends (at 10 170),
+        # its frames change at the boundaries shared by all the phases
+        clock.tick(10_199)
+        self.assertEqual("A", animator.get_image(clock.current_time))
+        clock.tick(10_200)
+        self.assertEqual("B", animator.get_image(clock.current_time))
+
+
 if __name__ == '__main__':
     unittest.main()
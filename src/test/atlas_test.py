@@ -0,0 +1,70 @@
+import unittest
+
+import pygame
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+from src.atlas import pack_frames, SpriteAtlas, AtlasException, \
+    get_atlas_name
+
+
+class AtlasTest(unittest.TestCase):
+
+    def test_packed_frames_should_not_overlap(self):
+        sizes = {f"frame_{i:02d}.png": (8 + i % 3 * 4, 16 - i % 4 * 2)
+                 for i in range(30)}
+
+        (width, height), placement = pack_frames(sizes, 64, padding=1)
+
+        self.assertEqual(set(sizes), set(placement))
+        atlas_rect = Rect(0, 0, width, height)
+        rects = list(placement.values())
+        for i, rect in enumerate(rects):
+            self.assertEqual(sizes[list(placement)[i]], rect.size)
+            self.assertTrue(atlas_rect.contains(rect))
+            self.assertEqual(-1, rect.collidelist(rects[i + 1:]))
+
+    def test_atlas_should_be_at_least_as_wide_as_widest_frame(self):
+        (width, _), placement = pack_frames({"wide": (100, 4)}, 64,
+                                            padding=1)
+
+        self.assertEqual(102, width)
+        self.assertEqual(Rect(1, 1, 100, 4), placement["wide"])
+
+    def test_frames_should_be_scaled_subsurfaces_of_atlas(self):
+        image = Surface((4, 2), pygame.SRCALPHA, depth=32)
+        image.fill("red", Rect(0, 0, 2, 2))
+        image.fill("blue", Rect(2, 0, 2, 2))
+        atlas = SpriteAtlas(image, {"a/red.png": Rect(0, 0, 2, 2),
+                                    "a/blue.png": Rect(2, 0, 2, 2)})
+
+        blue = atlas.get_frame("a/blue.png", 3)
+
+        self.assertEqual((6, 6), blue.get_size())
+        self.assertEqual(pygame.Color("blue"), blue.get_at((5, 5)))
+        self.assertIs(atlas.get_frame("a/red.png", 3).get_parent(),
+                      blue.get_parent())
+
+        # non-integer scale factors scale the frame separately
+        red = atlas.get_frame("a/red.png", 2.5)
+        self.assertEqual((5, 5), red.get_size())
+        self.assertEqual(pygame.Color("red"), red.get_at((4, 4)))
+
+        self.assertRaises(AtlasException, atlas.get_frame, "a/green.png", 1)
+
+    def test_atlas_should_list_frames_of_directory(self):
+        frames = {name: Rect(0, 0, 1, 1) for name in [
+            "anim/idle/idle_01.png", "anim/idle/idle_00.png",
+            "anim/idle/extra/x.png", "anim/idle-2/idle_00.png"]}
+        atlas = SpriteAtlas(Surface((1, 1)), frames)
+
+        self.assertEqual(["anim/idle/idle_00.png", "anim/idle/idle_01.png"],
+                         atlas.list_directory("anim/idle/"))
+        self.assertEqual([], atlas.list_directory("anim/dash"))
+
+    def test_atlas_name_should_be_relative_to_root(self):
+        self.assertEqual("effects/shard/shard.png", get_atlas_name(
+            "../assets/graphics/effects/./shard/shard.png",
+            "../assets/graphics/"))
+        self.assertIsNone(get_atlas_name("../assets/maps/default.txt",
+                                         "../assets/graphics/"))
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+from src.bundle import pack_bundle, AssetBundle, BundleException, \
+    get_bundle_name, asset_exists, read_asset_text
+from src.constants import MAP_DEFAULT, FONT_JOYSTIX
+
+
+class AssetBundleTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, "assets")
+        self.files = {
+            "maps/default.txt": b"...\n.S.\n",
+            "graphics/idle/idle_00.png": b"\x89PNG first",
+            "graphics/idle/idle_01.png": b"\x89PNG second",
+            "graphics/shard.png": b"",
+        }
+        for name, content in self.files.items():
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(content)
+
+        self.bundle_path = os.path.join(self.directory.name, "assets.bundle")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_bundle_should_contain_all_packed_files(self):
+        pack_bundle(self.root, self.bundle_path)
+        bundle = AssetBundle(self.bundle_path)
+
+        self.assertEqual(set(self.files), set(bundle.index))
+        for name, content in self.files.items():
+            with bundle.read(name) as view:
+                self.assertEqual(content, bytes(view))
+            with bundle.open(name) as file:
+                self.assertEqual(content, file.read())
+
+        self.assertFalse(bundle.contains("maps/other.txt"))
+        self.assertRaises(BundleException, bundle.read, "maps/other.txt")
+        bundle.close()
+
+    def test_bundle_should_list_directories(self):
+        pack_bundle(self.root, self.bundle_path)
+        bundle = AssetBundle(self.bundle_path)
+
+        self.assertEqual(["graphics/idle/idle_00.png",
+                          "graphics/idle/idle_01.png"],
+                         bundle.list_directory("graphics/idle/"))
+        self.assertEqual(["graphics/idle/idle_00.png",
+                          "graphics/idle/idle_01.png",
+                          "graphics/shard.png"],
+                         bundle.find("graphics"))
+        bundle.close()
+
+    def test_bundle_of_unknown_format_should_not_be_loaded(self):
+        with open(self.bundle_path, "wb") as file:
+            file.write(b"PK\x03\x04 not a bundle")
+
+        self.assertRaises(BundleException, AssetBundle, self.bundle_path)
+
+    def test_bundle_name_should_be_relative_to_assets_root(self):
+        self.assertEqual("maps/default.txt", get_bundle_name(
+            "../assets/maps/default.txt", "../assets/"))
+        self.assertIsNone(get_bundle_name("../config.yaml", "../assets/"))
+
+    def test_assets_should_not_depend_on_working_directory(self):
+        working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            self.assertTrue(asset_exists(MAP_DEFAULT))
+            self.assertTrue(asset_exists(FONT_JOYSTIX))
+            self.assertIn("S", read_asset_text(MAP_DEFAULT))
+            self.assertEqual("maps/default.txt", get_bundle_name(MAP_DEFAULT))
+        finally:
+            os.chdir(working_directory)
@@ -0,0 +1,97 @@
+import unittest
+
+from pygame.rect import Rect
+from pygame.sprite import Sprite
+from pygame.surface import Surface
+
+from src.camera import Camera, CameraGroup
+from src.constants import TILE_SIZE_PX
+from src.utils import Position, Point
+
+
+class DummySprite(Sprite):
+
+    def __init__(self, position: Position):
+        super().__init__()
+        self.position = position
+        self.image = Surface((1, 1))
+        self.rect = Rect(0, 0, 1, 1)
+        self.n_updates = 0
+
+    def update(self, *args, **kwargs) -> None:
+        self.n_updates += 1
+
+    def get_tile_position(self) -> Position:
+        return self.position
+
+
+class CameraTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.camera = Camera(2., width=4, height=3, margin=1)
+
+    def test_camera_should_convert_tiles_to_pixels(self):
+        tile_px = TILE_SIZE_PX * 2
+
+        self.assertEqual((0, 0), self.camera.tile_to_px(Position(0, 0)))
+        self.assertEqual((3 * tile_px + 2, 2 * tile_px + 4),
+                         self.camera.tile_to_px(Position(3, 2), Point(1, 2)))
+
+        self.camera.shift(5)
+        self.assertEqual((tile_px, -tile_px),
+                         self.camera.tile_to_px(Position(1, 4)))
+        # far outside of the precomputed area
+        self.assertEqual((10 * tile_px, -5 * tile_px),
+                         self.camera.tile_to_px(Position(10, 0)))
+
+    def test_camera_should_follow_position(self):
+        camera = Camera(1., height=12)
+
+        camera.follow(Position(0, 5))
+        self.assertEqual(0, camera.vertical_shift)
+        camera.follow(Position(0, 10))
+        self.assertEqual(1, camera.vertical_shift)
+        camera.follow(Position(0, 30))
+        self.assertEqual(21, camera.vertical_shift)
+        camera.follow(Position(0, 0))
+        self.assertEqual(-2, camera.vertical_shift)
+
+    def test_camera_should_know_visible_rows(self):
+        self.camera.shift(2)
+
+        self.assertEqual(range(2, 5), self.camera.visible_rows())
+        self.assertEqual(range(1, 6), self.camera.visible_rows(margin=1))
+        self.assertTrue(self.camera.is_visible(4))
+        self.assertFalse(self.camera.is_visible(5))
+        self.assertTrue(self.camera.is_visible(5, margin=1))
+
+
+class CameraGroupTest(unittest.TestCase):
+
+    def test_group_should_update_only_visible_sprites(self):
+        camera = Camera(1., width=4, height=3)
+        visible = DummySprite(Position(0, 1))
+        hidden = DummySprite(Position(0, 10))
+        group = CameraGroup(camera, visible, hidden, margin=0)
+
+        self.assertEqual([visible], list(group.visible_sprites()))
+
+        group.update()
+        self.assertEqual(1, visible.n_updates)
+        self.assertEqual(0, hidden.n_updates)
+
+        group.update()
+        self.assertEqual(2, visible.n_updates)
+        self.assertEqual(0, hidden.n_updates)
+
+        camera.shift(9)
+        group.update()
+        self.assertEqual(1, hidden.n_updates)
+
+        hidden.kill()
+        self.assertEqual([], list(group.visible_sprites()))
+        self.assertNotIn(10, group.rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import pygame
+
+from src.clock import FixedStepClock, AcceleratedClock, ClockException, \
+    create_frame_clock
+
+
+class FrameClockTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pygame.init()
+
+    def test_fixed_step_clock_should_not_depend_on_real_time(self):
+        clock = FixedStepClock(step=15, start_time=100)
+
+        self.assertEqual(100, clock.current_time)
+        self.assertEqual(115, clock.tick())
+        self.assertEqual(130, clock.tick())
+        self.assertEqual(130, clock.current_time)
+
+    def test_accelerated_clock_should_run_faster_than_real_time(self):
+        clock = AcceleratedClock(speed=50., tick_speed=100)
+        real_start = pygame.time.get_ticks()
+        game_start = clock.current_time
+
+        for _ in range(3):
+            clock.tick()
+
+        real_elapsed = pygame.time.get_ticks() - real_start
+        self.assertGreaterEqual(real_elapsed, 20)
+        self.assertGreaterEqual(clock.current_time - game_start,
+                                int(real_elapsed * 50 * 0.9))
+
+    def test_clock_should_be_created_by_mode(self):
+        self.assertIsInstance(create_frame_clock("fixed"), FixedStepClock)
+        self.assertEqual(20., create_frame_clock("accelerated", 20.).speed)
+        self.assertRaises(ClockException, create_frame_clock, "slow-motion")
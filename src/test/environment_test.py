@@ -1,8 +1,24 @@
+import itertools
+import os
+import random
 import unittest
+from typing import List
 
-from src.environment import Environment, EnvironmentException
+import numpy as np
+import pygame
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+from src.atlas import SpriteAtlas, get_atlas_name, set_sprite_atlas
+from src.camera import Camera
+from src.constants import TILE_SIZE_PX, CHUNK_HEIGHT_IN_TILES, \
+    IMG_TILE_GRASS_LIST, IMG_TILE_STONE_LIST
+from src.environment import Environment, EnvironmentException, WALKABLE, \
+    DIRT, GRASS, STONE, EnvironmentRenderer, DIRT_TILE_RULES, \
+    compile_dirt_lookup_table, construct_dirt_bitmasks
 from src.settings import GameSettings
-from src.utils import Position
+from src.texture import texture_cache, get_surface_size
+from src.utils import Position, CardinalDirection
 
 
 class EnvironmentTest(unittest.TestCase):
@@ -78,6 +94,240 @@ class EnvironmentTest(unittest.TestCase):
         self.assertFalse(e.contains(Position(500, 300)))
         self.assertFalse(e.contains(Position(-2, 1)))
 
+    def test_tile_flags_of_the_environment(self):
+        dummy_map = "S/o\n" \
+                    ". ."
+
+        e = Environment(self.settings, dummy_map)
+
+        self.assertEqual((3, 3), e.get_tile_dimensions())
+        self.assertEqual(WALKABLE, e.flags_at(Position(0, 0)))
+        self.assertEqual(WALKABLE | GRASS, e.flags_at(Position(1, 0)))
+        self.assertEqual(WALKABLE | STONE, e.flags_at(Position(2, 0)))
+        self.assertEqual(WALKABLE | DIRT, e.flags_at(Position(0, 1)))
+        self.assertEqual(DIRT, e.flags_at(Position(1, 1)))
+        self.assertEqual(DIRT, e.flags_at(Position(1, 2)))
+
+    def test_large_environment_creation(self):
+        dummy_map = "\n".join(["S" + "./o " * 5] + ["/o. " * 5 + "."] * 9_999)
+
+        e = Environment(self.settings, dummy_map)
+
+        self.assertEqual((21, 10_001), e.get_tile_dimensions())
+        self.assertEqual(21 * 10_001, len(e.get_all_tiles()))
+        self.assertTrue(e.tile_at(Position(0, 10_000)).is_dirt())
+        self.assertTrue(e.tile_at(Position(20, 9_999)).is_walkable())
+        self.assertTrue(e.tile_at(Position(1, 9_999)).is_stone())
+
+    def test_vegetation_words_of_the_environment(self):
+        #            01234
+        dummy_map = "S/o/.\n" \
+                    "//.oo"
+
+        e = Environment(self.settings, dummy_map)
+
+        words = e.get_vegetation_index(ignore_stones=False)
+        self.assertEqual([1, 2, 3, 5, 8], words.starts.tolist())
+        self.assertEqual([1, 2, 3, 6, 9], words.ends.tolist())
+
+        chunks = e.get_vegetation_index(ignore_stones=True)
+        self.assertEqual([1, 5, 8], chunks.starts.tolist())
+        self.assertEqual([3, 6, 9], chunks.ends.tolist())
+
+        self.assertEqual(5, chunks.next_start(1))
+        self.assertIsNone(chunks.next_start(8))
+        self.assertEqual(6, chunks.previous_end(8))
+        self.assertIsNone(chunks.previous_end(3))
+        self.assertEqual(9, words.next_end(8))
+        self.assertEqual(5, words.previous_start(8))
+        self.assertEqual(Position(3, 1), e.get_position(8))
+        self.assertEqual(8, e.get_index(Position(3, 1)))
+
+    def test_contours_of_the_environment(self):
+        #            01234
+        dummy_map = " ./. \n" \
+                    ".....\n" \
+                    "S o  "
+
+        e = Environment(self.settings, dummy_map)
+
+        self.assertEqual(1, e.find_contour_x(0, CardinalDirection.WEST))
+        self.assertEqual(3, e.find_contour_x(0, CardinalDirection.EAST))
+        self.assertEqual(2, e.find_contour_x(0, CardinalDirection.WEST,
+                                             to_vegetation=True))
+        self.assertIsNone(e.find_contour_x(1, CardinalDirection.EAST,
+                                           to_vegetation=True))
+        self.assertIsNone(e.find_contour_x(3, CardinalDirection.EAST))
+        self.assertIsNone(e.find_contour_x(-1, CardinalDirection.EAST))
+
+        self.assertEqual(0, e.find_vegetation_row(0, 1))
+        self.assertEqual(2, e.find_vegetation_row(1, 1))
+        self.assertIsNone(e.find_vegetation_row(3, 1))
+        self.assertEqual(0, e.find_vegetation_row(1, -1))
+        self.assertEqual(2, e.find_vegetation_row(3, -1))
+
+
+def fits_dirt_map(tile_mask: List[List[int]],
+                  dirt_map: List[List[bool]]) -> bool:
+    """Matching of a smooth tiling rule to a 3x3 dirt neighbourhood
+    the way it was done tile by tile (before the lookup table)."""
+    for y in range(3):
+        for x in range(3):
+            if tile_mask[y][x] == 0 and dirt_map[y][x]:
+                return False
+            if tile_mask[y][x] == 1 and not dirt_map[y][x]:
+                return False
+    return True
+
+
+class DirtAutotilingTest(unittest.TestCase):
+
+    def test_lookup_table_should_match_the_rules_for_all_bitmasks(self):
+        lookup_table = compile_dirt_lookup_table()
+        seen_bitmasks = set()
+
+        # all the neighbourhoods of a dirt tile
+        for neighbours in itertools.product([False, True], repeat=8):
+            cells = list(neighbours[:4]) + [True] + list(neighbours[4:])
+            dirt_map = [cells[0:3], cells[3:6], cells[6:9]]
+
+            bitmask = int(construct_dirt_bitmasks(np.array(dirt_map))[4])
+            seen_bitmasks.add(bitmask)
+
+            expected = next(i for i, rule in enumerate(DIRT_TILE_RULES)
+                            if fits_dirt_map(rule["mask"], dirt_map))
+            self.assertEqual(expected, lookup_table[bitmask],
+                             f"neighbourhood {dirt_map}")
+
+        self.assertEqual(256, len(seen_bitmasks))
+
+
+def build_tile_atlas() -> SpriteAtlas:
+    """:return: atlas of all the tile images filled with random
+    (partly translucent) pixels"""
+    paths = [rule["image"] for rule in DIRT_TILE_RULES] \
+        + IMG_TILE_GRASS_LIST + IMG_TILE_STONE_LIST
+    names = sorted({get_atlas_name(path) for path in paths})
+
+    image = Surface((len(names) * TILE_SIZE_PX, TILE_SIZE_PX),
+                    pygame.SRCALPHA, depth=32)
+    pixels = np.random.RandomState(0).randint(
+        256, size=image.get_size() + (4,), dtype=np.uint8)
+    pygame.surfarray.blit_array(image, pixels[..., :3])
+    pygame.surfarray.pixels_alpha(image)[:] = pixels[..., 3]
+
+    return SpriteAtlas(image, {
+        name: Rect(i * TILE_SIZE_PX, 0, TILE_SIZE_PX, TILE_SIZE_PX)
+        for i, name in enumerate(names)})
+
+
+def generate_map(width: int, height: int) -> str:
+    """:return: random map with the start in the top left corner"""
+    generator = random.Random(4)
+    rows = ["".join(generator.choice(" ../o") for _ in range(width))
+            for _ in range(height)]
+    rows[0] = "S" + rows[0][1:]
+    return "\n".join(rows)
+
+
+def render_whole_map(renderer: EnvironmentRenderer) -> Surface:
+    """:return: all tiles rendered into one surface (as it was done
+    before the map was split into chunks)"""
+    w, h = renderer.environment.get_tile_dimensions()
+    surface = Surface((w * TILE_SIZE_PX, h * TILE_SIZE_PX), pygame.SRCALPHA)
+    surface.blits([(tile_surface, (x * TILE_SIZE_PX, y * TILE_SIZE_PX))
+                   for y in range(h)
+                   for x in range(w)
+                   for tile_surface in renderer.surfaces[y][x]])
+    return surface
+
+
+class EnvironmentRendererTest(unittest.TestCase):
+    width = 5
+    height = 3 * CHUNK_HEIGHT_IN_TILES - 1  # 3 chunks with the dirt row
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # opaque tiles are converted to the display format
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+
+    def setUp(self) -> None:
+        texture_cache.clear()
+        set_sprite_atlas(build_tile_atlas())
+
+        self.chunk_size = get_surface_size(Surface(
+            (self.width * TILE_SIZE_PX,
+             CHUNK_HEIGHT_IN_TILES * TILE_SIZE_PX), pygame.SRCALPHA))
+        self.settings = GameSettings(scale_factor=1.,
+                                     chunk_cache_budget=2 * self.chunk_size)
+        self.environment = Environment(
+            self.settings, generate_map(self.width, self.height))
+        self.renderer = EnvironmentRenderer(self.environment, self.settings)
+        self.camera = Camera(1., width=self.width)
+
+    def tearDown(self) -> None:
+        set_sprite_atlas(None)
+        texture_cache.clear()
+
+    def view(self, vertical_shift: int) -> List[int]:
+        """Collect the view at the shift.
+        :return: numbers of the chunks kept in the cache afterwards"""
+        self.camera.vertical_shift = vertical_shift
+        self.renderer.get_blits(self.camera)
+        return list(self.renderer.chunks.surfaces)
+
+    def test_chunks_should_be_baked_when_they_become_visible(self):
+        self.assertEqual([], list(self.renderer.chunks.surfaces))
+
+        self.assertEqual([0], self.view(0))
+        self.assertEqual([0, 1], self.view(5))
+        self.assertEqual([0, 1], self.view(3))
+        self.assertEqual(0, self.renderer.chunks.evictions)
+
+    def test_chunks_should_be_evicted_under_budget(self):
+        self.view(5)
+        self.assertEqual([1, 2], self.view(CHUNK_HEIGHT_IN_TILES + 5))
+
+        self.assertEqual(1, self.renderer.chunks.evictions)
+        self.assertLessEqual(self.renderer.chunks.size,
+                             self.settings.chunk_cache_budget)
+
+    def test_rebaked_chunk_should_be_identical(self):
+        self.view(0)
+        chunk = self.renderer.chunks.surfaces[0]
+        pixels = pygame.image.tobytes(chunk, "RGBA")
+
+        self.view(2 * CHUNK_HEIGHT_IN_TILES)
+        self.view(CHUNK_HEIGHT_IN_TILES)
+        self.assertEqual([2, 1], self.view(CHUNK_HEIGHT_IN_TILES))
+        self.view(0)
+
+        rebaked = self.renderer.chunks.surfaces[0]
+        self.assertIsNot(chunk, rebaked)
+        self.assertEqual(pixels, pygame.image.tobytes(rebaked, "RGBA"))
+
+    def test_view_across_chunks_should_match_whole_map(self):
+        whole_map = render_whole_map(self.renderer)
+        view_size = (self.width * TILE_SIZE_PX,
+                     self.camera.height * TILE_SIZE_PX)
+
+        for vertical_shift in [0, 7, CHUNK_HEIGHT_IN_TILES,
+                               self.height + 1 - self.camera.height]:
+            self.camera.vertical_shift = vertical_shift
+            screen = Surface(view_size)
+            screen.fill("purple")
+            self.renderer.render(screen, self.camera)
+
+            expected = Surface(view_size)
+            expected.fill("purple")
+            expected.blit(whole_map, (0, -vertical_shift * TILE_SIZE_PX))
+
+            self.assertEqual(pygame.image.tobytes(expected, "RGB"),
+                             pygame.image.tobytes(screen, "RGB"),
+                             f"vertical shift {vertical_shift}")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+import pygame
+from pygame.font import Font
+
+from src.ui.font import GlyphAtlas
+
+
+class GlyphAtlasTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pygame.font.init()
+        cls.font = Font(None, 20)
+
+    def test_text_should_be_composed_like_rendered_text(self):
+        color = (93, 255, 238)
+        atlas = GlyphAtlas(self.font, color, "0123456789.:")
+
+        for text in ["7", "1:05.3", "42"]:
+            composed = atlas.render(text)
+            rendered = self.font.render(text, False, color)
+
+            self.assertEqual(rendered.get_size(), composed.get_size())
+            for x in range(composed.get_width()):
+                for y in range(composed.get_height()):
+                    is_text = rendered.get_at((x, y))[:3] == color
+                    self.assertEqual(is_text, composed.get_at((x, y)).a > 0)
+
+    def test_glyphs_should_be_rasterized_once(self):
+        atlas = GlyphAtlas(self.font, (255, 255, 255), "01")
+
+        self.assertIs(atlas.image, atlas.get_glyph("1").get_parent())
+        missing_glyph = atlas.get_glyph("x")
+        self.assertIs(missing_glyph, atlas.get_glyph("x"))
+        self.assertEqual(atlas.height, atlas.render("10x").get_height())
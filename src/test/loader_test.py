@@ -0,0 +1,65 @@
+import threading
+import unittest
+
+from src.loader import AssetLoader
+
+
+class AssetLoaderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loader = AssetLoader(max_workers=2)
+
+    def tearDown(self) -> None:
+        self.loader.shutdown()
+
+    def wait_until_done(self) -> None:
+        while not self.loader.is_done():
+            self.loader.poll()
+
+    def test_loader_should_finish_tasks_on_polling_thread(self):
+        finished = []
+
+        def finish(result):
+            finished.append((result, threading.current_thread()))
+
+        for i in range(10):
+            self.loader.submit(lambda x: x * 2, finish, i)
+        self.assertEqual(10, self.loader.n_tasks)
+
+        self.wait_until_done()
+
+        self.assertEqual(list(range(0, 20, 2)),
+                         sorted(result for result, _ in finished))
+        self.assertTrue(all(thread is threading.current_thread()
+                            for _, thread in finished))
+        self.assertEqual(1., self.loader.get_progress())
+
+    def test_loader_should_count_failed_tasks_as_finished(self):
+        def fail():
+            raise IOError("missing file")
+
+        self.loader.submit(fail, lambda _: None)
+        self.loader.submit(lambda: 1, lambda _: None)
+
+        self.wait_until_done()
+
+        self.assertEqual(1, self.loader.n_failed)
+        self.assertEqual(2, self.loader.n_finished)
+
+    def test_loader_should_run_tasks_submitted_by_finishing(self):
+        finished = []
+
+        def submit_followup(result):
+            self.loader.submit(lambda x: x + 1, finished.append, result)
+
+        self.loader.submit(lambda: 1, submit_followup)
+        self.loader.submit(lambda: 10, finished.append)
+
+        self.wait_until_done()
+
+        self.assertEqual([2, 10], sorted(finished))
+        self.assertEqual(3, self.loader.n_finished)
+
+    def test_loader_without_tasks_should_be_done(self):
+        self.assertTrue(self.loader.is_done())
+        self.assertEqual(1., self.loader.get_progress())
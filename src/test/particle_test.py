@@ -0,0 +1,96 @@
+import unittest
+
+from pygame.surface import Surface
+
+from src.animation import Animation, LinearAlphaFadeAnimation
+from src.camera import Camera
+from src.particle import ParticleSystem, ParticleSpec
+from src.utils import Position, CardinalDirection
+
+
+class DummyAnimationManager:
+
+    def __init__(self):
+        self.animations = {
+            "blink": Animation([Surface((4, 4)), Surface((6, 6))], 10)
+            .add_flipped_frames(True, False),
+            "dash": LinearAlphaFadeAnimation([Surface((4, 4))], 100,
+                                             alpha_levels=5),
+        }
+
+    def get_animation(self, name: str) -> Animation:
+        return self.animations[name].copy()
+
+
+class ParticleSystemTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.camera = Camera(1.)
+        self.animation_manager = DummyAnimationManager()
+        self.system = ParticleSystem(self.camera, self.animation_manager,
+                                     capacity=2)
+
+    def get_visible_images(self):
+        return [self.system.images[i]
+                for i in self.system.visible_images.tolist()]
+
+    def test_particles_should_follow_their_animation(self):
+        frames = self.animation_manager.animations["blink"].frames
+        mirrored = self.animation_manager.animations["blink"].get_frames(
+            True, False)
+        self.system.spawn(ParticleSpec("blink", Position(1, 1)), 0)
+        self.system.spawn(ParticleSpec("blink", Position(2, 1),
+                                         flip_x=True), 5)
+
+        self.system.update(12)
+
+        self.assertEqual([frames[1], mirrored[0]], self.get_visible_images())
+        # image centered in the tile shifted by the offset
+        self.assertEqual([[16 + 8 - 3, 16 + 8 - 3], [32 + 8 - 2, 16 + 8 - 2]],
+                         self.system.visible_topleft.tolist())
+
+    def test_fading_particles_should_use_alpha_levels(self):
+        self.system.spawn(ParticleSpec("dash", Position(0, 0)), 0)
+
+        self.system.update(0)
+        self.assertEqual([255], [image.get_at((0, 0)).a
+                                 for image in self.get_visible_images()])
+        self.system.update(50)
+        self.assertEqual([127], [image.get_at((0, 0)).a
+                                 for image in self.get_visible_images()])
+
+    def test_finished_particles_should_free_their_slots(self):
+        for x in range(5):
+            self.system.spawn(ParticleSpec("blink", Position(x, 0)), 0)
+        self.assertEqual(5, len(self.system))
+        self.assertLessEqual(5, len(self.system.alive))
+
+        self.system.update(20)
+        self.assertEqual(0, len(self.system))
+        self.assertEqual(0, len(self.system.visible_slots))
+
+        slot = self.system.spawn(ParticleSpec("blink", Position(0, 0)), 20)
+        self.assertLess(slot, 5)
+        stats = self.system.get_stats()
+        self.assertEqual(6, stats["spawned"])
+        self.assertEqual(5, stats["high_water_mark"])
+
+    def test_particles_out_of_view_should_not_be_drawn(self):
+        self.system.spawn(ParticleSpec("blink", Position(0, 0)), 0)
+        self.system.spawn(ParticleSpec("blink", Position(0, 30)), 0)
+
+        self.system.update(0)
+        self.assertEqual([0], self.system.visible_slots.tolist())
+
+        self.camera.shift(25)
+        self.system.update(0)
+        self.assertEqual([1], self.system.visible_slots.tolist())
+
+    def test_factories_should_describe_particles(self):
+        particle = ParticleSpec.create_blink_out(
+            Position(3, 4), CardinalDirection.WEST)
+
+        self.assertEqual("particle-blink-out", particle.kind)
+        self.assertEqual(Position(3, 4), particle.get_tile_position())
+        self.assertTrue(particle.flip_x)
+        self.assertFalse(particle.flip_y)
@@ -317,6 +317,22 @@ class GrassJumpsTest(unittest.TestCase):
         self.assertEqual((0, 0), self.player.get_position())
         self.assertRaises(ActionException, jump_left)
 
+    def test_player_should_grass_jump_across_many_rows(self):
+        dummy_map = "\n".join(["S..."] + ["...."] * 5_000 + ["./o."])
+
+        self.environment = Environment(self.settings, dummy_map)
+        self.player.set_position(self.environment.get_starting_position())
+
+        self.player.apply_action(
+            GrassStartJumpAction(self.environment, CardinalDirection.EAST))
+        self.assertEqual((1, 5_001), self.player.get_position())
+        self.player.apply_action(
+            GrassEndJumpAction(self.environment, CardinalDirection.EAST,
+                               ignore_stones=True))
+        self.assertEqual((2, 5_001), self.player.get_position())
+        self.assertRaises(ActionException, lambda: self.player.apply_action(
+            GrassStartJumpAction(self.environment, CardinalDirection.EAST)))
+
 
 class ContourJumpTest(unittest.TestCase):
 
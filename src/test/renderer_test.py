@@ -0,0 +1,224 @@
+import random
+import unittest
+
+import pygame
+from pygame.rect import Rect
+from pygame.sprite import Sprite, Group
+from pygame.surface import Surface
+
+from src.camera import Camera
+from src.constants import WIDTH_IN_TILES, HEIGHT_IN_TILES, TILE_SIZE_PX
+from src.renderer import DirtyRenderer, RenderPipeline, RenderLayer, \
+    RendererException, upscale_regions
+from src.settings import GameSettings
+from src.utils import Position
+
+
+class DummySprite(Sprite):
+
+    def __init__(self, color: str, rect: Rect):
+        super().__init__()
+        self.image = Surface(rect.size)
+        self.image.fill(color)
+        self.rect = rect
+
+
+class DirtyRendererTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.screen = Surface((100, 100))
+        self.background = Surface((100, 100))
+        self.background.fill("black")
+
+        self.renderer = DirtyRenderer()
+        self.renderer.set_background(self.background)
+
+    def test_renderer_should_report_only_changed_regions(self):
+        still = DummySprite("red", Rect(0, 0, 10, 10))
+        moving = DummySprite("blue", Rect(50, 50, 10, 10))
+        group = Group(still, moving)
+
+        # the first frame is drawn completely
+        self.assertEqual([Rect(0, 0, 100, 100)],
+                         self.renderer.render(self.screen, group))
+
+        # nothing changed
+        self.assertEqual([], self.renderer.render(self.screen, group))
+
+        moving.rect = Rect(60, 50, 10, 10)
+        self.assertEqual([Rect(50, 50, 10, 10), Rect(60, 50, 10, 10)],
+                         self.renderer.render(self.screen, group))
+        self.assertEqual((0, 0, 0, 255), self.screen.get_at((55, 55)))
+        self.assertEqual((0, 0, 255, 255), self.screen.get_at((65, 55)))
+        self.assertEqual((255, 0, 0, 255), self.screen.get_at((5, 5)))
+
+        moving.kill()
+        self.assertEqual([Rect(60, 50, 10, 10)],
+                         self.renderer.render(self.screen, group))
+        self.assertEqual((0, 0, 0, 255), self.screen.get_at((65, 55)))
+
+    def test_renderer_should_redraw_overlapping_sprites(self):
+        below = DummySprite("red", Rect(0, 0, 20, 20))
+        above = DummySprite("blue", Rect(10, 10, 20, 20))
+        group = Group(below, above)
+        self.renderer.render(self.screen, group)
+
+        above.rect = Rect(-5, 40, 20, 20)
+        self.assertEqual([Rect(10, 10, 20, 20), Rect(0, 40, 15, 20)],
+                         self.renderer.render(self.screen, group))
+        self.assertEqual((255, 0, 0, 255), self.screen.get_at((15, 15)))
+        self.assertEqual((0, 0, 0, 255), self.screen.get_at((25, 25)))
+        self.assertEqual((0, 0, 255, 255), self.screen.get_at((5, 45)))
+
+    def test_redrawn_sprites_should_be_clipped_to_changed_regions(self):
+        particle = DummySprite("white", Rect(0, 0, 20, 20))
+        particle.image.set_alpha(128)
+        above = DummySprite("red", Rect(15, 15, 20, 20))
+        moving = DummySprite("blue", Rect(0, 50, 10, 10))
+        group = Group(particle, above)
+        self.renderer.render(self.screen, group, Group(moving))
+        translucent = self.screen.get_at((5, 5))
+        self.assertEqual((255, 0, 0, 255), self.screen.get_at((17, 17)))
+
+        # the regions overlap only the corner of the translucent sprite
+        for x in range(4):
+            moving.rect = Rect(12 + x, 0, 10, 10)
+            self.renderer.render(self.screen, group, Group(moving))
+
+        # not blended again outside the regions
+        self.assertEqual(translucent, self.screen.get_at((5, 5)))
+        self.assertEqual(translucent, self.screen.get_at((11, 1)))
+        self.assertEqual(translucent, self.screen.get_at((12, 12)))
+        # the lower sprite is not drawn over the upper one
+        self.assertEqual((255, 0, 0, 255), self.screen.get_at((17, 17)))
+        self.assertEqual((0, 0, 255, 255), self.screen.get_at((20, 5)))
+
+    def test_changed_background_should_be_restored_under_sprites(self):
+        sprite = DummySprite("blue", Rect(10, 10, 10, 10))
+        group = Group(sprite)
+        self.renderer.render(self.screen, group)
+
+        self.background.fill("green", Rect(0, 0, 30, 30))
+        self.assertEqual([Rect(5, 5, 10, 10)], self.renderer.render(
+            self.screen, group, changed=[Rect(5, 5, 10, 10)]))
+
+        self.assertEqual((0, 255, 0, 255), self.screen.get_at((5, 5)))
+        self.assertEqual((0, 0, 255, 255), self.screen.get_at((12, 12)))
+        # outside of the changed region
+        self.assertEqual((0, 0, 0, 255), self.screen.get_at((25, 25)))
+
+
+class NativeCanvasTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.settings = GameSettings(scale_factor=5., native_resolution=True)
+        self.canvas = Surface((WIDTH_IN_TILES * TILE_SIZE_PX,
+                               HEIGHT_IN_TILES * TILE_SIZE_PX))
+        self.screen = Surface((int(self.canvas.get_width() * 5),
+                               int(self.canvas.get_height() * 5)))
+
+    def test_tile_should_land_at_its_position_after_upscaling(self):
+        self.assertEqual((320, 192), self.canvas.get_size())
+        camera = Camera(self.settings.render_scale)
+        camera.shift(3)
+        tile = DummySprite("blue", Rect(
+            camera.tile_to_px(Position(4, 7)), (TILE_SIZE_PX, TILE_SIZE_PX)))
+        pipeline = RenderPipeline(RenderLayer("tiles", 0, Group(tile)))
+
+        pipeline.render(self.canvas, self.screen)
+
+        # 4 columns and 7 - 3 rows from the top left corner of the view
+        self.assertEqual(Rect(64, 64, 16, 16), tile.rect)
+        self.assertEqual((0, 0, 255, 255), self.canvas.get_at((64, 64)))
+        self.assertEqual((0, 0, 255, 255), self.canvas.get_at((79, 79)))
+        self.assertEqual((0, 0, 0, 255), self.canvas.get_at((63, 80)))
+        self.assertEqual((0, 0, 255, 255), self.screen.get_at((320, 320)))
+        self.assertEqual((0, 0, 255, 255), self.screen.get_at((399, 399)))
+        self.assertEqual((0, 0, 0, 255), self.screen.get_at((319, 400)))
+
+    def test_regions_should_be_upscaled_like_the_whole_canvas(self):
+        colors = random.Random(2)
+        for y in range(0, self.canvas.get_height(), 4):
+            for x in range(0, self.canvas.get_width(), 4):
+                self.canvas.fill([colors.randrange(256) for _ in range(3)],
+                                 Rect(x, y, 4, 3))
+        expected = pygame.transform.scale(self.canvas, self.screen.get_size())
+        rects = [Rect(0, 0, 7, 9), Rect(101, 33, 50, 17), Rect(310, 180, 10, 12)]
+
+        screen_rects = upscale_regions(self.canvas, self.screen, rects)
+
+        self.assertEqual([Rect(0, 0, 35, 45), Rect(505, 165, 250, 85),
+                          Rect(1550, 900, 50, 60)], screen_rects)
+        for rect in screen_rects:
+            self.assertEqual(
+                pygame.image.tobytes(expected.subsurface(rect), "RGB"),
+                pygame.image.tobytes(self.screen.subsurface(rect), "RGB"))
+        # outside of the regions
+        self.assertEqual((0, 0, 0, 255), self.screen.get_at((40, 50)))
+
+    def test_regions_of_non_integer_ratio_should_upscale_whole_canvas(self):
+        screen = Surface((self.canvas.get_width() * 3 // 2,
+                          self.canvas.get_height() * 3 // 2))
+        self.canvas.fill("red")
+
+        self.assertEqual([], upscale_regions(self.canvas, screen, []))
+        self.assertEqual([screen.get_rect()], upscale_regions(
+            self.canvas, screen, [Rect(0, 0, 1, 1)]))
+        self.assertEqual((255, 0, 0, 255), screen.get_at((479, 287)))
+
+
+class RenderPipelineTest(unittest.TestCase):
+
+    def test_layers_should_be_drawn_in_z_order(self):
+        top = Group(DummySprite("blue", Rect(0, 0, 10, 10)))
+        bottom = Group(DummySprite("red", Rect(5, 5, 10, 10)))
+        pipeline = RenderPipeline(RenderLayer("top", 20, top),
+                                  RenderLayer("bottom", 10, bottom))
+        screen = Surface((20, 20))
+
+        pipeline.render(screen)
+
+        self.assertEqual(["bottom", "top"],
+                         [layer.name for layer in pipeline.layers])
+        self.assertEqual((0, 0, 255, 255), screen.get_at((7, 7)))
+        self.assertEqual((255, 0, 0, 255), screen.get_at((12, 12)))
+        self.assertEqual({"bottom", "top"}, set(pipeline.get_stats()))
+        self.assertRaises(RendererException, pipeline.add_layer,
+                          RenderLayer("top", 0, top))
+
+    def test_static_layer_should_be_collected_on_key_change(self):
+        image = Surface((1, 1))
+        collected = []
+        key = [0]
+
+        def collect():
+            collected.append(key[0])
+            return [(image, (0, 0))]
+
+        pipeline = RenderPipeline(RenderLayer("static", 0, collect=collect,
+                                              cache_key=lambda: key[0]))
+        screen = Surface((1, 1))
+        pipeline.render(screen)
+        pipeline.render(screen)
+        key[0] = 1
+        pipeline.render(screen)
+
+        self.assertEqual([0, 1], collected)
+
+    def test_screen_space_layers_should_be_drawn_after_upscaling(self):
+        canvas = Surface((10, 10))
+        canvas.fill("red")
+        screen = Surface((20, 20))
+        hud = Group(DummySprite("blue", Rect(15, 15, 5, 5)))
+        pipeline = RenderPipeline(
+            RenderLayer("hud", 0, hud, screen_space=True))
+
+        pipeline.render(canvas, screen)
+
+        self.assertEqual((255, 0, 0, 255), screen.get_at((14, 14)))
+        self.assertEqual((0, 0, 255, 255), screen.get_at((15, 15)))
+        self.assertIn("upscale", pipeline.get_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
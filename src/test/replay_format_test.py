@@ -0,0 +1,261 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+import zlib
+from typing import List
+
+from src.replay import Recording, ParsingException
+from src.settings import GameSettings
+from src.simulation import GameSimulation
+from src.replay_format import ReplayWriter, ReplayFormatException, \
+    parse_binary, encode_binary, load_recording, write_varint, read_varint, \
+    is_binary_replay, read_block_header, read_events, decode_block, \
+    COMPRESSIONS, HEADER, BLOCK
+from src.utils import Position
+
+
+class ReplayFormatTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.recording = Recording()
+        self.recording.start(10_000)
+        self.recording.record_shard_spawn(10_000, Position(3, 200))
+        for i in range(100):
+            self.recording.record_text_input(10_100 + i * 150, "kLhi"[i % 4])
+            # the hashes are as random as the real ones
+            self.recording.record_state_hash(10_100 + i * 150,
+                                             zlib.crc32(bytes([i])))
+        self.recording.record_text_input(80_000, "gg")
+        self.recording.record_result(90_000, 12)
+
+    def encode(self, recording: Recording, compression: str = "zlib",
+               block_size: int = 4096) -> bytes:
+        file = io.BytesIO()
+        encode_binary(recording, file, compression, block_size)
+        return file.getvalue()
+
+    def test_varints_should_round_trip(self):
+        buffer = bytearray()
+        values = [0, 1, 127, 128, 300, 2 ** 35 + 7]
+        for value in values:
+            write_varint(buffer, value)
+
+        position = 0
+        for value in values:
+            decoded, position = read_varint(buffer, position)
+            self.assertEqual(value, decoded)
+        self.assertEqual(len(buffer), position)
+
+    def test_all_compressions_should_round_trip(self):
+        for compression in COMPRESSIONS:
+            data = self.encode(self.recording, compression)
+            self.assertTrue(is_binary_replay(data))
+            self.assertEqual(self.recording.serialize(),
+                             parse_binary(data).serialize(), compression)
+
+    def test_binary_replay_should_be_smaller_than_text(self):
+        # the random state hashes (4 B per input) cannot be compressed
+        data = self.encode(self.recording)
+        self.assertLess(len(data) * 4, len(self.recording.serialize()))
+
+    def play_random_game(self, state_hash_interval: int) -> Recording:
+        """:return: recording of a game of random keys at random times"""
+        dummy_map = "\n".join(["............",
+                               "..//o//.....",
+                               "....S.......",
+                               "//..//// ..."] + ["............"] * 8)
+        settings = GameSettings(scale_factor=1., controls={
+            "dash-left": "h", "dash-down": "j", "dash-up": "k",
+            "dash-right": "l", "blink-to-the-top": "gg",
+            "blink-to-the-bottom": "G", "blink-to-the-start-of-contour": "0",
+            "blink-to-the-end-of-contour": "$"},
+            state_hash_interval=state_hash_interval)
+        simulation = GameSimulation(settings, dummy_map, seed=3)
+        keys = random.Random(3)
+        simulation.start(0)
+        time = 0
+        for _ in range(2_000):
+            time += keys.randint(16, 200)
+            simulation.step(keys.choice(list(settings.key_event_map)), time)
+        simulation.finish(time + 100)
+        return simulation.recording
+
+    def test_binary_replay_of_a_game_should_be_ten_times_smaller(self):
+        data = self.encode(self.play_random_game(16))
+        # the random keys and times are incompressible beyond ~5x,
+        # the hashes of every input took most of the former text replays
+        self.assertLess(len(data) * 5,
+                        len(self.play_random_game(16).serialize()))
+        self.assertLess(len(data) * 10,
+                        len(self.play_random_game(1).serialize()))
+
+    def test_events_should_be_split_into_blocks(self):
+        file = io.BytesIO()
+        writer = ReplayWriter(file, "none", block_size=32)
+        for event in self.recording.data:
+            writer.write(event)
+        writer.flush()
+
+        self.assertGreater(writer.n_blocks, 5)
+        self.assertEqual(writer.written, len(file.getvalue()))
+        self.assertEqual(self.recording.serialize(),
+                         parse_binary(file.getvalue()).serialize())
+
+    def test_streamed_recording_should_not_keep_events(self):
+        file = io.BytesIO()
+        writer = ReplayWriter(file, block_size=16)
+        recording = Recording(writer)
+        recording.start(0)
+        for i in range(50):
+            recording.record_text_input(i * 10, "j")
+
+        self.assertEqual([], recording.data)
+        # full blocks are written while recording
+        self.assertGreater(len(file.getvalue()), HEADER.size)
+        writer.flush()
+        self.assertEqual(51, len(parse_binary(file.getvalue()).data))
+
+    def test_corrupted_block_should_be_detected(self):
+        data = bytearray(self.encode(self.recording))
+        data[-3] ^= 0xFF
+        with self.assertRaises(ReplayFormatException):
+            parse_binary(bytes(data))
+        with self.assertRaises(ReplayFormatException):
+            parse_binary(bytes(data[:-3]))
+
+    def test_truncated_or_malformed_blocks_should_be_detected(self):
+        data = self.encode(self.recording, "none")
+        block = HEADER.size + BLOCK.size
+        for truncated in [data[:-1], data[:block + 1]]:
+            with self.assertRaises(ReplayFormatException):
+                parse_binary(truncated)
+
+        # raw events cut within the columns (or with extra bytes)
+        # with a valid header
+        header = read_block_header(data, HEADER.size)
+        for raw in [data[header.position:header.end - 3],
+                    data[header.position:header.end] + b"\x01"]:
+            forged = data[:HEADER.size] + BLOCK.pack(
+                0, len(raw), len(raw), zlib.crc32(raw), 0, 0) + raw
+            with self.assertRaises(ReplayFormatException):
+                parse_binary(forged)
+
+        # columns of an unknown width or texts out of the block
+        for raw in [bytes([1, 0, 3, 1, 1, 1]) + b"R\x00\x00",
+                    bytes([1, 0, 1, 1, 1, 1]) + b"I\x00\x00"]:
+            with self.assertRaises(ReplayFormatException):
+                decode_block(raw, 0)
+
+        # compressed stream broken, with a matching checksum
+        stored = b"\x78\x9c" + bytes(20)
+        forged = data[:HEADER.size] + BLOCK.pack(
+            1, len(stored), 100, zlib.crc32(stored), 0, 0) + stored
+        with self.assertRaises(ReplayFormatException):
+            parse_binary(forged)
+
+    def test_varints_should_not_be_read_beyond_the_data(self):
+        with self.assertRaises(ReplayFormatException):
+            read_varint(bytes([0x80, 0x80]), 0)
+
+    def test_blocks_should_be_flushed_after_the_interval(self):
+        file = io.BytesIO()
+        writer = ReplayWriter(file, flush_interval=1_000)
+        recording = Recording(writer)
+        recording.start(0)
+        recording.record_text_input(500, "j")
+        recording.tick(900)
+        self.assertEqual(0, writer.n_blocks)
+
+        # even with no new events
+        recording.tick(1_000)
+        self.assertEqual(1, writer.n_blocks)
+        self.assertEqual(2, len(parse_binary(file.getvalue()).data))
+
+    def test_events_should_be_written_in_order(self):
+        writer = ReplayWriter(io.BytesIO())
+        writer.write(self.recording.data[2])
+        with self.assertRaises(ReplayFormatException):
+            writer.write(self.recording.data[0])
+
+    def test_recording_should_be_loaded_in_both_formats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for path in self.write_recordings(directory):
+                self.assertEqual(self.recording.serialize(),
+                                 load_recording(path).serialize(), path)
+
+    def write_recordings(self, directory: str, block_size: int = 4096,
+                         text_tail: str = "", binary_tail: bytes = b""
+                         ) -> List[str]:
+        """:return: paths of the recording in the text and in the binary
+        format (with the tails appended)"""
+        text_path = os.path.join(directory, "recording.txt")
+        with open(text_path, "w") as file:
+            file.write(self.recording.serialize() + text_tail)
+        binary_path = os.path.join(directory, "recording.vzr")
+        with open(binary_path, "wb") as file:
+            file.write(self.encode(self.recording, block_size=block_size)
+                       + binary_tail)
+        return [text_path, binary_path]
+
+    def test_events_should_be_read_lazily(self):
+        # a broken end is reached only after the events before it
+        corrupted_block = BLOCK.pack(0, 1, 1, 0, 90_000, 90_000) + b"\x00"
+        with tempfile.TemporaryDirectory() as directory:
+            for path in self.write_recordings(directory, 32, "\nX 1 broken",
+                                              corrupted_block):
+                events = read_events(path)
+                for recorded in self.recording.data:
+                    self.assertEqual(recorded.serialize(),
+                                     next(events).serialize(), path)
+                with self.assertRaises((ParsingException,
+                                        ReplayFormatException)):
+                    next(events)
+
+    def test_blocks_out_of_the_time_range_should_be_skipped(self):
+        data = bytearray(self.encode(self.recording, block_size=32))
+        headers = []
+        position = HEADER.size
+        while position < len(data):
+            headers.append(read_block_header(data, position))
+            position = headers[-1].end
+        self.assertGreater(len(headers), 5)
+        # the first and the last block cannot be decompressed
+        for header in [headers[0], headers[-1]]:
+            data[header.position] ^= 0xFF
+        start_time = headers[0].last_time + 1
+        end_time = headers[-1].first_time - 1
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "recording.vzr")
+            with open(path, "wb") as file:
+                file.write(data)
+            with self.assertRaises(ReplayFormatException):
+                list(read_events(path))
+
+            expected = [event.serialize() for event in self.recording.data
+                        if start_time <= event.time <= end_time]
+            self.assertEqual(expected, [
+                event.serialize()
+                for event in read_events(path, start_time, end_time)])
+
+    def test_time_range_should_be_read_from_both_formats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for path in self.write_recordings(directory, 32):
+                events = list(read_events(path, 1_000, 5_000))
+                self.assertEqual(
+                    [event.serialize() for event in self.recording.data
+                     if 1_000 <= event.time <= 5_000],
+                    [event.serialize() for event in events], path)
+                self.assertEqual(54, len(events))  # inputs and hashes
+
+    def test_empty_file_should_have_no_events(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "recording.txt")
+            open(path, "w").close()
+            self.assertEqual([], list(read_events(path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
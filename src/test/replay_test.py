@@ -4,7 +4,8 @@ from typing import cast
 from src.animation import Animation, FallbackAnimator, AnimationException
 from src.constants import VERSION
 from src.environment import Environment, EnvironmentException
-from src.replay import Recording, VersionInfo, TextInput, ShardSpawn
+from src.replay import Recording, VersionInfo, TextInput, ShardSpawn, \
+    RecordingPlayer, StateHash, GameResult
 from src.settings import GameSettings
 from src.utils import Position
 
@@ -69,6 +70,43 @@ class ReplayTest(unittest.TestCase):
         self.assertEqual("I", cast(TextInput, r.data[4]).text_input)
         self.assertIsInstance(r.data[4], TextInput)
 
+    def test_state_hashes_and_result_should_survive_parsing(self):
+        r = Recording()
+        r.start(10_000)
+        r.record_text_input(10_100, "k")
+        r.record_state_hash(10_100, 0x0badf00d)
+        r.record_result(12_000, 3)
+
+        output = r.serialize()
+        self.assertEqual(f"V 0 {VERSION}\nI 100 k\nH 100 0badf00d\nR 2000 3",
+                         output)
+
+        parsed = Recording.parse(output)
+        state_hash, = parsed.get_events(StateHash)
+        self.assertEqual((100, 0x0badf00d),
+                         (state_hash.time, state_hash.state_hash))
+        result, = parsed.get_events(GameResult)
+        self.assertEqual((2000, 3), (result.time, result.collected_shards))
+
+
+class RecordingPlayerTest(unittest.TestCase):
+
+    def test_player_should_pop_inputs_by_recording_time(self):
+        r = Recording.parse("V 0 test\nI 100 k\nS 150 1 1\nI 200 j\n"
+                            "I 200 l\nI 500 h\n")
+        player = RecordingPlayer(r)
+
+        self.assertEqual([], player.pop_inputs(99))
+        self.assertEqual(["k"], [i.text_input for i in player.pop_inputs(150)])
+        self.assertEqual(["j", "l"],
+                         [i.text_input for i in player.pop_inputs(499)])
+        self.assertFalse(player.is_over())
+        self.assertEqual(["h"],
+                         [i.text_input for i in player.pop_inputs(10_000)])
+        self.assertTrue(player.is_over())
+        self.assertEqual([(1, 1)],
+                         [s.position for s in r.get_events(ShardSpawn)])
+
 
 if __name__ == '__main__':
     unittest.main()
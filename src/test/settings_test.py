@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from src.constants import CONFIG
+from src.settings import load_settings
+
+
+class LoadSettingsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.directory.name, "config.yaml")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write_config(self, text: str) -> None:
+        with open(self.config_path, "w") as config_file:
+            config_file.write(text)
+
+    def test_relative_directories_should_be_relative_to_config(self):
+        self.write_config("scale_factor: 2.\n"
+                          "texture_cache_dir: cache/textures/\n"
+                          "recording_dir: /tmp/recordings/\n")
+
+        settings = load_settings(self.config_path)
+
+        self.assertEqual(2., settings.scale_factor)
+        self.assertEqual(os.path.join(self.directory.name, "cache/textures/"),
+                         settings.texture_cache_dir)
+        self.assertEqual("/tmp/recordings/", settings.recording_dir)
+
+    def test_disabled_directories_should_stay_disabled(self):
+        self.write_config("texture_cache_dir: null\n")
+
+        settings = load_settings(self.config_path)
+
+        self.assertIsNone(settings.texture_cache_dir)
+        self.assertIsNone(settings.recording_dir)
+
+    def test_default_config_should_not_depend_on_working_directory(self):
+        working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            settings = load_settings()
+        finally:
+            os.chdir(working_directory)
+
+        self.assertTrue(settings.texture_cache_dir.startswith(
+            os.path.dirname(CONFIG) + os.sep))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+
+from src.settings import GameSettings
+from src.constants import TICK_DURATION
+from src.replay import Recording, RecordingPlayer
+from src.simulation import GameSimulation, create_replay_simulation
+from src.utils import Position
+
+
+class GameSimulationTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # shards spawn at least 4 tiles away from the player in both axes
+        self.dummy_map = "\n".join(["............",
+                               "..//o//.....",
+                               "....S.......",
+                               "//..//// ..."] + ["............"] * 8)
+
+        self.settings = GameSettings(scale_factor=1., controls={
+            "dash-left": "h", "dash-right": "l",
+            "blink-to-the-top": "gg", "blink-to-the-bottom": "G"})
+        self.simulation = GameSimulation(self.settings, self.dummy_map,
+                                         seed=7)
+
+    def test_input_should_perform_actions(self):
+        self.simulation.start(1_000)
+
+        result = self.simulation.step("ll")
+        self.assertEqual(Position(6, 2), self.simulation.player.position)
+        self.assertEqual(["dash-right", "dash-right"],
+                         [action.name for action in result.actions])
+        self.assertEqual(Position(4, 2), result.actions[0].previous_position)
+        # each action knows where it took the player
+        self.assertEqual([Position(5, 2), Position(6, 2)],
+                         [action.position for action in result.actions])
+        self.assertEqual(1_000 + TICK_DURATION, self.simulation.current_time)
+
+        # the first 'g' is buffered until the next key
+        self.assertEqual([], self.simulation.step("g").actions)
+        result = self.simulation.step("g")
+        self.assertEqual(["blink-to-the-top"],
+                         [action.name for action in result.actions])
+
+    def test_invalid_actions_should_not_be_performed(self):
+        self.simulation.start()
+        self.simulation.player.set_position(Position(0, 2))
+
+        self.assertEqual([], self.simulation.step("h").actions)
+        self.assertEqual(Position(0, 2), self.simulation.player.position)
+
+    def test_shards_should_be_collected_on_the_tile_of_player(self):
+        spawned = self.simulation.start().spawned_shards
+        self.assertEqual(2, len(spawned))
+        self.assertEqual(2, len(self.simulation.shards))
+
+        first, second = spawned
+        self.simulation.player.set_position(first.position)
+        result = self.simulation.step("")
+        self.assertEqual([first], result.collected_shards)
+        self.assertEqual([], result.spawned_shards)
+        self.assertEqual(1, self.simulation.data.collected_shards)
+
+        # a new pack is spawned once all the shards are collected
+        self.simulation.player.set_position(second.position)
+        result = self.simulation.step("")
+        self.assertEqual([second], result.collected_shards)
+        self.assertEqual(2, len(result.spawned_shards))
+        self.assertEqual(2, self.simulation.data.collected_shards)
+
+    def test_simulation_should_be_recorded(self):
+        self.settings.state_hash_interval = 2
+        self.simulation.start(500)
+        self.simulation.step("l", 600)
+        self.simulation.step("", 700)
+        self.simulation.step("h", 800)
+
+        lines = self.simulation.recording.serialize().split("\n")
+        self.assertEqual("V 0 Vizard_0.1", lines[0])
+        self.assertTrue(lines[1].startswith("S 0 "))
+        self.assertTrue(lines[2].startswith("S 0 "))
+        # the state is hashed after every second (non-empty) input
+        self.assertEqual(["I 100 l", "I 300 h"], lines[3:5])
+        self.assertEqual(f"H 300 {self.simulation.get_state_hash():08x}",
+                         lines[5])
+        self.assertEqual(6, len(lines))
+
+    def test_finish_should_record_the_result(self):
+        self.simulation.start(500)
+        self.simulation.step("l", 600)
+        data = self.simulation.finish(2_500)
+
+        self.assertEqual(2_500, data.end_time)
+        self.assertEqual([f"H 2000 {self.simulation.get_state_hash():08x}",
+                          "R 2000 0"],
+                         self.simulation.recording.serialize().split("\n")[-2:])
+
+    def test_state_hash_should_change_with_the_state(self):
+        self.simulation.start()
+        state_hash = self.simulation.get_state_hash()
+        self.assertEqual(state_hash, self.simulation.get_state_hash())
+
+        self.simulation.step("g")  # buffered key is a part of the state
+        self.assertNotEqual(state_hash, self.simulation.get_state_hash())
+
+    def test_replay_should_reproduce_the_recorded_session(self):
+        self.simulation.start(1_000)
+        for time, text_input in [(1_100, "l"), (1_150, "g"), (1_200, "g"),
+                                 (1_400, "G"), (1_500, "hh")]:
+            self.simulation.step(text_input, time)
+        recording = Recording.parse(self.simulation.recording.serialize())
+
+        replay = create_replay_simulation(self.settings, self.dummy_map,
+                                          recording)
+        replay.start(50_000)
+        player = RecordingPlayer(recording)
+        # accelerated - multiple recorded inputs are played in one frame
+        result = replay.replay(player, 50_300)
+        self.assertEqual(["dash-right", "blink-to-the-top"],
+                         [action.name for action in result.actions])
+        replay.replay(player, 51_000)
+
+        self.assertTrue(player.is_over())
+        self.assertEqual(self.simulation.player.position,
+                         replay.player.position)
+        self.assertEqual(list(self.simulation.shards), list(replay.shards))
+        self.assertEqual(self.simulation.recording.serialize(),
+                         replay.recording.serialize())
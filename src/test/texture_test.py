@@ -0,0 +1,166 @@
+import os
+import tempfile
+import unittest
+
+from pygame.surface import Surface
+
+from src.texture import SurfaceCache, get_surface_size, DiskSurfaceCache, \
+    TextureKey
+from src.utils import get_source_key
+
+
+class SurfaceCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.surface = Surface((16, 16), depth=32)
+        self.surface_size = get_surface_size(self.surface)
+        self.assertEqual(16 * 16 * 4, self.surface_size)
+
+    def test_cache_should_count_hits_and_misses(self):
+        cache = SurfaceCache(10 * self.surface_size)
+
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", self.surface)
+        self.assertIs(self.surface, cache.get("a"))
+        self.assertIs(self.surface, cache.get("a"))
+
+        stats = cache.get_stats()
+        self.assertEqual(2, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(self.surface_size, stats["bytes"])
+
+    def test_uncounted_lookups_should_not_change_stats(self):
+        cache = SurfaceCache(10 * self.surface_size)
+
+        self.assertIsNone(cache.get("a", count=False))
+        cache.put("a", self.surface)
+        self.assertIs(self.surface, cache.get("a", count=False))
+
+        self.assertEqual(0, cache.hits)
+        self.assertEqual(0, cache.misses)
+
+    def test_source_key_should_differ_from_unscaled_texture(self):
+        path = "assets/graphics/shard.png"
+
+        self.assertNotEqual(TextureKey(path, 1., False, False, True),
+                            get_source_key(path))
+        self.assertEqual(path, get_source_key(path).path)
+
+    def test_cache_should_evict_least_recently_used_surfaces(self):
+        cache = SurfaceCache(2 * self.surface_size)
+
+        cache.put("a", self.surface)
+        cache.put("b", self.surface.copy())
+        cache.get("a")
+        cache.put("c", self.surface.copy())
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(1, cache.evictions)
+        self.assertEqual(2 * self.surface_size, cache.size)
+
+        cache.set_budget(self.surface_size)
+        self.assertEqual(1, len(cache.surfaces))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_cache_should_not_store_surfaces_over_budget(self):
+        cache = SurfaceCache(self.surface_size - 1)
+
+        self.assertIs(self.surface, cache.put("a", self.surface))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, cache.size)
+
+
+
+class DiskSurfaceCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "image.png")
+        with open(self.source, "wb") as file:
+            file.write(b"first version")
+
+        self.cache = DiskSurfaceCache(os.path.join(self.directory.name,
+                                                   "cache"))
+        self.key = TextureKey(self.source, 2., False, False, True)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_entries_should_differ_by_variant(self):
+        flipped_key = self.key._replace(flip_x=True)
+        scaled_key = self.key._replace(scale_factor=3.)
+
+        paths = {self.cache.get_entry_path(key)
+                 for key in (self.key, flipped_key, scaled_key)}
+
+        self.assertEqual(3, len(paths))
+
+    def test_entry_should_be_invalidated_by_source_change(self):
+        first_path = self.cache.get_entry_path(self.key)
+
+        with open(self.source, "wb") as file:
+            file.write(b"second version")
+        os.utime(self.source, ns=(0, 0))
+
+        self.assertNotEqual(first_path, self.cache.get_entry_path(self.key))
+
+    def test_unchanged_source_should_not_be_hashed_again(self):
+        first_path = self.cache.get_entry_path(self.key)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.cache.directory, DiskSurfaceCache.INDEX)))
+
+        # same size and modification time - the content is not read
+        status = os.stat(self.source)
+        with open(self.source, "wb") as file:
+            file.write(b"other version")
+        os.utime(self.source, ns=(status.st_atime_ns, status.st_mtime_ns))
+
+        cache = DiskSurfaceCache(self.cache.directory)
+        self.assertEqual(first_path, cache.get_entry_path(self.key))
+
+        os.utime(self.source, ns=(0, 0))
+        self.assertNotEqual(first_path, cache.get_entry_path(self.key))
+        # the new hash is in the index for the next run
+        self.assertEqual(cache.get_entry_path(self.key), DiskSurfaceCache(
+            self.cache.directory).get_entry_path(self.key))
+
+    def test_malformed_index_should_be_ignored(self):
+        first_path = self.cache.get_entry_path(self.key)
+        with open(os.path.join(self.cache.directory,
+                               DiskSurfaceCache.INDEX), "w") as file:
+            file.write("[not an index")
+
+        cache = DiskSurfaceCache(self.cache.directory)
+        self.assertEqual(first_path, cache.get_entry_path(self.key))
+
+    def test_stored_entry_should_hold_raw_pixels(self):
+        self.cache.store(self.key, Surface((3, 2), depth=32))
+
+        with open(self.cache.get_entry_path(self.key), "rb") as file:
+            entry = file.read()
+
+        self.assertEqual(DiskSurfaceCache.HEADER.size + 3 * 2 * 4, len(entry))
+        self.assertEqual((DiskSurfaceCache.MAGIC, 3, 2),
+                         DiskSurfaceCache.HEADER.unpack_from(entry))
+
+    def test_malformed_entry_should_be_ignored(self):
+        os.makedirs(self.cache.directory)
+        with open(self.cache.get_entry_path(self.key), "wb") as file:
+            file.write(DiskSurfaceCache.HEADER.pack(
+                DiskSurfaceCache.MAGIC, 3, 2) + b"truncated")
+
+        self.assertIsNone(self.cache.load(self.key))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_disabled_cache_should_not_store_anything(self):
+        cache = DiskSurfaceCache(None)
+        cache.store(self.key, Surface((3, 2)))
+
+        self.assertIsNone(cache.get_entry_path(self.key))
+        self.assertIsNone(cache.load(self.key))
+
+
+if __name__ == '__main__':
+    unittest.main()
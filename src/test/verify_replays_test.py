@@ -0,0 +1,163 @@
+import os
+import tempfile
+import unittest
+from typing import List
+
+import pygame
+
+from src.replay import Recording, GameResult, TextInput, StateHash
+from src.replay_format import encode_binary
+from src.settings import GameSettings
+from src.simulation import GameSimulation
+from src.utils import Position
+from src.verify_replays import verify_recording, verify_files, \
+    verify_file, find_recordings, VerificationResult
+
+
+class VerifyReplaysTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dummy_map = "\n".join(["............",
+                                    "..//o//.....",
+                                    "....S.......",
+                                    "//..//// ..."] + ["............"] * 8)
+        self.settings = GameSettings(scale_factor=1., controls={
+            "dash-left": "h", "dash-right": "l",
+            "blink-to-the-top": "gg", "blink-to-the-bottom": "G"},
+            state_hash_interval=2)
+
+    def record_game(self) -> Recording:
+        # the first shard lies on the way of the first dash
+        simulation = GameSimulation(self.settings, self.dummy_map, seed=7,
+                                    spawn_positions=[Position(5, 2),
+                                                     Position(11, 11)])
+        simulation.start(1_000)
+        for time, text_input in [(1_100, "l"), (1_150, "g"), (1_200, "g"),
+                                 (1_400, "G"), (1_500, "hh")]:
+            simulation.step(text_input, time)
+        simulation.step("", 1_600)
+        simulation.finish(2_000)
+        return Recording.parse(simulation.recording.serialize())
+
+    def test_recorded_game_should_be_valid(self):
+        result = verify_recording(self.record_game(), self.settings,
+                                  self.dummy_map)
+
+        self.assertTrue(result.is_valid, result.errors)
+        self.assertEqual(1_000, result.end_time)
+        self.assertEqual(1, result.collected_shards)
+        # after the second and the fourth input and at the end
+        self.assertEqual([150, 400, 1_000],
+                         [time for time, _ in result.trail])
+        self.assertIsNone(result.diverging_tick)
+
+    def test_forged_result_should_be_invalid(self):
+        recording = self.record_game()
+        claimed = recording.get_events(GameResult)[-1]
+        claimed.collected_shards += 1
+
+        result = verify_recording(recording, self.settings, self.dummy_map)
+        self.assertFalse(result.is_valid)
+        self.assertEqual(1, len(result.errors))
+
+    def test_verification_should_find_the_diverging_tick(self):
+        recording = self.record_game()
+        # the fourth input is altered, its recorded state hash is not
+        altered, = [event for event in recording.data
+                    if isinstance(event, TextInput) and event.time == 400]
+        altered.text_input = "l"
+
+        result = verify_recording(recording, self.settings, self.dummy_map)
+        self.assertFalse(result.is_valid)
+        self.assertEqual(1, result.diverging_tick)
+        self.assertEqual(400, result.diverging_time)
+
+    def test_missing_state_hashes_should_diverge(self):
+        recording = self.record_game()
+        last_state_hash = recording.get_events(StateHash)[-1]
+        recording.data.remove(last_state_hash)
+
+        result = verify_recording(recording, self.settings, self.dummy_map)
+        self.assertFalse(result.is_valid)
+        self.assertEqual(2, result.diverging_tick)
+        self.assertEqual(last_state_hash.time, result.diverging_time)
+
+    def test_other_state_hash_interval_should_diverge(self):
+        recording = self.record_game()
+        self.settings.state_hash_interval = 1
+
+        result = verify_recording(recording, self.settings, self.dummy_map)
+        self.assertEqual(0, result.diverging_tick)
+        self.assertEqual(100, result.diverging_time)
+
+    def test_inputs_after_the_end_should_be_invalid(self):
+        recording = self.record_game()
+        recording.get_events(GameResult)[-1].time = 300
+
+        result = verify_recording(recording, self.settings, self.dummy_map)
+        self.assertFalse(result.is_valid)
+
+    def test_recording_without_result_should_be_invalid(self):
+        recording = Recording()
+        recording.start(0)
+        recording.record_shard_spawn(0, Position(10, 10))
+
+        result = verify_recording(recording, self.settings, self.dummy_map)
+        self.assertEqual(["no result was recorded"], result.errors)
+
+    def verify_by_pool(self) -> List[VerificationResult]:
+        with tempfile.TemporaryDirectory() as directory:
+            valid = self.record_game()
+            forged = self.record_game()
+            forged.get_events(GameResult)[-1].collected_shards = 10
+            for name, recording in [("valid.txt", valid),
+                                    ("forged.txt", forged)]:
+                with open(os.path.join(directory, name), "w") as file:
+                    file.write(recording.serialize())
+            with open(os.path.join(directory, "notes.md"), "w") as file:
+                file.write("not a recording")
+
+            paths = find_recordings([directory])
+            self.assertEqual(["forged.txt", "valid.txt"],
+                             [os.path.basename(path) for path in paths])
+            return list(verify_files(paths, self.settings, self.dummy_map,
+                                     processes=2, chunk_size=1))
+
+    def test_pool_should_verify_all_files(self):
+        self.assertEqual([False, True],
+                         [result.is_valid for result in self.verify_by_pool()])
+
+    def test_pool_should_finish_after_pygame_init(self):
+        # the signal handlers of SDL must not leak into the workers
+        pygame.init()
+        try:
+            for _ in range(3):
+                self.assertEqual([False, True], [
+                    result.is_valid for result in self.verify_by_pool()])
+        finally:
+            pygame.quit()
+
+    def test_binary_recording_should_be_verified_from_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "valid.vzr")
+            with open(path, "wb") as file:
+                encode_binary(self.record_game(), file, block_size=16)
+
+            result = verify_file(path, self.settings, self.dummy_map)
+            self.assertTrue(result.is_valid, result.errors)
+            self.assertEqual(3, len(result.trail))
+
+            result = verify_file(path, self.settings, self.dummy_map,
+                                 keep_trail=False)
+            self.assertTrue(result.is_valid, result.errors)
+            self.assertEqual([], result.trail)
+
+            with open(path, "r+b") as file:
+                file.truncate(os.path.getsize(path) - 1)
+            result = verify_file(path, self.settings, self.dummy_map)
+            self.assertFalse(result.is_valid)
+            self.assertTrue(result.errors[0].startswith("unreadable"))
+
+
+if __name__ == '__main__':
+    unittest.main()
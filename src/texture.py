@@ -0,0 +1,269 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+import pygame
+from pygame.surface import Surface
+
+from src.bundle import is_bundled, open_asset
+from src.constants import TEXTURE_CACHE_BUDGET, TEXTURE_CACHE_DIR, \
+    ASSET_BUNDLE
+
+log = logging.getLogger(__name__)
+
+
+class TextureKey(NamedTuple):
+    path: str
+    scale_factor: Optional[float]  # None for the unscaled source image
+    flip_x: bool
+    flip_y: bool
+    has_alpha: bool
+
+
+def get_surface_size(surface: Surface) -> int:
+    """:return: the number of bytes taken by the pixels of the surface"""
+    return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+
+class SurfaceCache(object):
+    """
+    Least-recently-used cache of surfaces limited by a memory budget.
+    Whenever the cached surfaces take more than 'budget' bytes,
+    the least recently used surfaces are evicted.
+    """
+    budget: int  # in bytes
+    surfaces: 'OrderedDict[Hashable, Surface]'
+    size: int  # bytes taken by all cached surfaces
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.surfaces = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, count: bool = True) -> Optional[Surface]:
+        """
+        :param count: whether the lookup is counted in the hits and misses
+        :return: the cached surface or None if it is not cached
+        """
+        surface = self.surfaces.get(key)
+        if surface is None:
+            if count:
+                self.misses += 1
+            return None
+
+        if count:
+            self.hits += 1
+        self.surfaces.move_to_end(key)
+        return surface
+
+    def put(self, key: Hashable, surface: Surface) -> Surface:
+        """Store the surface in the cache (surfaces larger than the whole
+        budget are not stored at all).
+        :return: the stored surface"""
+        self.discard(key)
+
+        surface_size = get_surface_size(surface)
+        if surface_size > self.budget:
+            log.debug(f"Surface {key} does not fit into the cache budget")
+            return surface
+
+        self.surfaces[key] = surface
+        self.size += surface_size
+        self._evict()
+        return surface
+
+    def discard(self, key: Hashable) -> None:
+        """Remove the surface from the cache (if it is cached)."""
+        surface = self.surfaces.pop(key, None)
+        if surface is not None:
+            self.size -= get_surface_size(surface)
+
+    def set_budget(self, budget: int) -> None:
+        self.budget = budget
+        self._evict()
+
+    def clear(self) -> None:
+        self.surfaces.clear()
+        self.size = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "surfaces": len(self.surfaces),
+            "bytes": self.size,
+            "budget": self.budget,
+        }
+
+    def _evict(self) -> None:
+        while self.size > self.budget:
+            _, surface = self.surfaces.popitem(last=False)
+            self.size -= get_surface_size(surface)
+            self.evictions += 1
+
+
+class DiskSurfaceCache(object):
+    """
+    Persistent cache of scaled image assets stored as raw RGBA pixels.
+    Entries are keyed by the hash of the source file (so they are
+    invalidated whenever the source changes), the scale factor
+    and the flips. Each entry is loaded by memory-mapping a single file.
+    The hashes are kept in an index by the path, modification time and
+    size of the source, a source is hashed again only when these change.
+    """
+    HEADER = struct.Struct("<4sII")  # magic, width, height
+    MAGIC = b"VZTX"
+    INDEX = "index.json"  # of the source hashes within the directory
+
+    directory: Optional[str]  # None disables the cache
+    # mtime, file size and hash by path (None until the index is read)
+    hashes: Optional[Dict[str, List]]
+    hits: int
+    misses: int
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.hashes = None
+        self.hits = 0
+        self.misses = 0
+
+    def set_directory(self, directory: Optional[str]) -> None:
+        self.directory = directory
+        self.hashes = None
+
+    def get_entry_path(self, key: TextureKey) -> Optional[str]:
+        """:return: path to the cache entry of the texture or None
+        if the cache is disabled or the source file does not exist"""
+        if self.directory is None:
+            return None
+        try:
+            source_hash = self._get_source_hash(key.path)
+        except OSError:
+            return None
+
+        return os.path.join(self.directory, (
+            f"{source_hash}_{key.scale_factor!r}_{key.flip_x:d}{key.flip_y:d}"
+            f"{key.has_alpha:d}.rgba"))
+
+    def load(self, key: TextureKey) -> Optional[Surface]:
+        """:return: the cached texture converted to the display format
+        or None if it is not cached"""
+        path = self.get_entry_path(key)
+        if path is None:
+            return None
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        try:
+            with open(path, "rb") as file, \
+                    mmap.mmap(file.fileno(), 0,
+                              access=mmap.ACCESS_READ) as pixels:
+                magic, width, height = self.HEADER.unpack_from(pixels)
+                if (magic != self.MAGIC or len(pixels)
+                        != self.HEADER.size + width * height * 4):
+                    raise ValueError("malformed texture cache entry")
+
+                with memoryview(pixels)[self.HEADER.size:] as view:
+                    image = pygame.image.frombuffer(view, (width, height),
+                                                    "RGBA")
+                    # converting copies the pixels out of the mapped file
+                    surface = image.convert_alpha() if key.has_alpha \
+                        else image.convert()
+                    del image
+        except (OSError, ValueError, struct.error) as e:
+            log.warning(f"Ignoring texture cache entry {path}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return surface
+
+    def store(self, key: TextureKey, surface: Surface) -> None:
+        path = self.get_entry_path(key)
+        if path is None:
+            return
+
+        width, height = surface.get_size()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write into a temporary file first so that no reader
+            # can see a partially written entry
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(self.HEADER.pack(self.MAGIC, width, height))
+                file.write(pygame.image.tostring(surface, "RGBA"))
+            os.replace(temporary_path, path)
+        except OSError as e:
+            log.warning(f"Texture {key} could not be cached on disk: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _get_source_hash(self, path: str) -> str:
+        # bundled sources change only together with the bundle
+        status = os.stat(ASSET_BUNDLE if is_bundled(path) else path)
+        identity = [status.st_mtime_ns, status.st_size]
+
+        if self.hashes is None:
+            self.hashes = self._read_index()
+        entry = self.hashes.get(path)
+        if entry is not None and entry[:2] == identity:
+            return entry[2]
+
+        with open_asset(path) as file:
+            source_hash = hashlib.sha1(file.read()).hexdigest()
+        self.hashes[path] = identity + [source_hash]
+        self._write_index()
+        return source_hash
+
+    def _read_index(self) -> Dict[str, List]:
+        """:return: the hashes of the index or no hashes if there
+        is no valid index"""
+        try:
+            with open(os.path.join(self.directory, self.INDEX)) as file:
+                hashes = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring the texture cache index: {e}")
+            return {}
+
+        if not isinstance(hashes, dict):
+            log.warning("Ignoring the texture cache index: not a mapping")
+            return {}
+        return {path: entry for path, entry in hashes.items()
+                if isinstance(entry, list) and len(entry) == 3}
+
+    def _write_index(self) -> None:
+        index_path = os.path.join(self.directory, self.INDEX)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(self.hashes, file)
+            os.replace(temporary_path, index_path)
+        except OSError as e:
+            log.warning(f"Texture cache index could not be written: {e}")
+
+
+# process-wide cache of the loaded and scaled assets
+texture_cache = SurfaceCache(TEXTURE_CACHE_BUDGET)
+
+# process-wide persistent cache of the scaled assets
+disk_texture_cache = DiskSurfaceCache(TEXTURE_CACHE_DIR)
@@ -0,0 +1,126 @@
+"""
+Shared fonts and pre-rasterized glyphs of the HUD text.
+
+The HUD font is monospace, so any text can be composed from the images
+of its single characters. Each character is rasterized once into a glyph
+atlas and the text is then only blitted together from the atlas
+(shifted by the kerning of the neighbouring characters, which is measured
+once per pair of characters).
+"""
+import logging
+import string
+from typing import Dict, Tuple, Iterable, List
+
+import pygame
+from pygame.font import Font
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+from src.bundle import open_asset
+
+log = logging.getLogger(__name__)
+
+Color = Tuple[int, int, int]
+
+# characters rasterized into every glyph atlas in advance
+GLYPH_CHARACTERS = string.digits + string.ascii_letters \
+                   + string.punctuation + " "
+
+_fonts: Dict[Tuple[str, int], Font] = {}
+_glyph_atlases: Dict[Tuple[str, int, Color], 'GlyphAtlas'] = {}
+
+
+def get_font(path: str, size: int) -> Font:
+    """:return: the shared font of the given size (loaded on the first use)"""
+    font = _fonts.get((path, size))
+    if font is None:
+        font = Font(open_asset(path), size)
+        _fonts[(path, size)] = font
+    return font
+
+
+class GlyphAtlas(object):
+    """Images of single characters rendered once by a monospace font
+    into one surface, text is composed from them without rasterizing."""
+    font: Font
+    color: Color
+    image: Surface
+    glyphs: Dict[str, Surface]  # subsurfaces of the image by character
+    kerning: Dict[Tuple[str, str], int]  # shift of the second character
+    height: int
+
+    def __init__(self, font: Font, color: Color,
+                 characters: str = GLYPH_CHARACTERS):
+        self.font = font
+        self.color = color
+
+        rendered = [font.render(character, False, color)
+                    for character in characters]
+        self.height = max(glyph.get_height() for glyph in rendered)
+        self.image = Surface((sum(glyph.get_width() for glyph in rendered),
+                              self.height), pygame.SRCALPHA)
+
+        self.glyphs = {}
+        self.kerning = {}
+        x = 0
+        for character, glyph in zip(characters, rendered):
+            self.image.blit(glyph, (x, 0))
+            self.glyphs[character] = self.image.subsurface(
+                Rect(x, 0, glyph.get_width(), glyph.get_height()))
+            x += glyph.get_width()
+
+    def get_glyph(self, character: str) -> Surface:
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            log.debug(f"Glyph {character!r} was not pre-rasterized")
+            glyph = self.font.render(character, False, self.color)
+            self.glyphs[character] = glyph
+        return glyph
+
+    def get_kerning(self, first: str, second: str) -> int:
+        """:return: horizontal shift of the second character
+        when it follows the first one"""
+        kerning = self.kerning.get((first, second))
+        if kerning is None:
+            kerning = self.font.size(first + second)[0] \
+                      - self.font.size(first)[0] - self.font.size(second)[0]
+            self.kerning[(first, second)] = kerning
+        return kerning
+
+    def render(self, text: str) -> Surface:
+        """:return: new surface with the text composed from the glyphs"""
+        positions = []
+        x = 0
+        for i, character in enumerate(text):
+            if i > 0:
+                x += self.get_kerning(text[i - 1], character)
+            glyph = self.get_glyph(character)
+            positions.append((glyph, (x, 0)))
+            x += glyph.get_width()
+
+        surface = Surface((x, self.height), pygame.SRCALPHA)
+        surface.blits(positions, doreturn=False)
+        return surface
+
+
+def get_glyph_atlas(path: str, size: int, color: Color) -> GlyphAtlas:
+    """:return: the shared glyph atlas of the font in the given color"""
+    atlas = _glyph_atlases.get((path, size, color))
+    if atlas is None:
+        atlas = GlyphAtlas(get_font(path, size), color)
+        _glyph_atlases[(path, size, color)] = atlas
+    return atlas
+
+
+def load_glyph_atlases(path: str, size: int,
+                       colors: Iterable[Color]) -> List[GlyphAtlas]:
+    """Rasterize the glyph atlases of a newly loaded font, which is not
+    shared with any other thread (so it can be run in the background).
+    :return: the atlases in the order of the colors"""
+    font = Font(open_asset(path), size)
+    return [GlyphAtlas(font, color) for color in colors]
+
+
+def set_glyph_atlas(path: str, size: int, atlas: GlyphAtlas) -> None:
+    """Share a glyph atlas loaded in advance (see load_glyph_atlases)."""
+    _glyph_atlases[(path, size, atlas.color)] = atlas
@@ -1,13 +1,13 @@
 import typing
 
-import pygame
-from pygame.font import Font
 from pygame.rect import Rect
 from pygame.sprite import Sprite, AbstractGroup, Group
 from pygame.surface import Surface
 
 from src.animation import \
     WIDTH_IN_TILES, TILE_SIZE_PX, HEIGHT_IN_TILES, ANIM_SHARD_IDLE
+from src.constants import FONT_JOYSTIX, HUD_FONT_SIZE
+from src.ui.font import GlyphAtlas, get_glyph_atlas
 from src.utils import load_scaled_surfaces
 
 if typing.TYPE_CHECKING:
@@ -50,8 +50,9 @@ class ShardIconUI(Sprite):
 
 class ShardCountUI(Sprite):
     scene: 'GameScene'
-    font: Font
+    glyph_atlas: GlyphAtlas
     color = (93, 255, 238)
+    text: str  # currently displayed text
     image: Surface
     rect: Rect
 
@@ -61,21 +62,28 @@ class ShardCountUI(Sprite):
         self.scene = scene
         scale_factor = self.scene.settings.scale_factor
 
-        self.font = pygame.font.Font('../assets/fonts/joystix.monospace.ttf', 20)
+        self.glyph_atlas = get_glyph_atlas(FONT_JOYSTIX, HUD_FONT_SIZE,
+                                           self.color)
 
-        self.image = self.font.render("nan", False, self.color)
+        self.text = "nan"
+        self.image = self.glyph_atlas.render(self.text)
         self.rect = self.image.get_rect(
             bottomleft=((WIDTH_IN_TILES - 3) * TILE_SIZE_PX * scale_factor,
                         HEIGHT_IN_TILES * TILE_SIZE_PX * scale_factor))
 
     def update(self, *args, **kwargs) -> None:
-        self.image =  self.font.render(
-            f"{self.scene.data.collected_shards}", False, self.color)
+        text = f"{self.scene.data.collected_shards}"
+        if text != self.text:
+            # the count changes rarely, the image is kept until it does
+            self.text = text
+            self.image = self.glyph_atlas.render(text)
 
 
 class ClockUI(Sprite):
     scene: 'GameScene'
-    font: Font
+    glyph_atlas: GlyphAtlas
+    color = (255, 255, 255)
+    text: str  # currently displayed text
     image: Surface
     rect: Rect
 
@@ -83,10 +91,11 @@ class ClockUI(Sprite):
         super().__init__(*groups)
 
         self.scene = scene
-        self.font = pygame.font.Font('../assets/fonts/joystix.monospace.ttf',
-                                     20)
+        self.glyph_atlas = get_glyph_atlas(FONT_JOYSTIX, HUD_FONT_SIZE,
+                                           self.color)
 
-        self.image = self.font.render("nan", False, (255, 255, 255))
+        self.text = "nan"
+        self.image = self.glyph_atlas.render(self.text)
         self._update_position_of_timer_text()
 
     def _update_position_of_timer_text(self):
@@ -97,7 +106,7 @@ class ClockUI(Sprite):
 
     def update(self, *args, **kwargs) -> None:
         ms_since_start = self.scene.recording.get_recording_time(
-            pygame.time.get_ticks())
+            self.scene.clock.current_time)
         seconds = ms_since_start // 1000
         minutes = seconds // 60
 
@@ -105,8 +114,9 @@ class ClockUI(Sprite):
         second_string = f"{seconds % 60:02d}." if minutes > 0 else f"{seconds % 60}."
         ms_string = f"{(ms_since_start % 1000) // 100}"
 
-        self.image = self.font.render(
-            f"{minute_string + second_string + ms_string}", False,
-            (255, 255, 255))
-
-        self._update_position_of_timer_text()
+        text = minute_string + second_string + ms_string
+        if text != self.text:
+            # the displayed text changes only every 100 ms
+            self.text = text
+            self.image = self.glyph_atlas.render(text)
+            self._update_position_of_timer_text()
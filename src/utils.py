@@ -5,6 +5,10 @@ from typing import NamedTuple, List
 import pygame
 from pygame import Surface
 
+from src.bundle import open_asset, list_asset_directory
+from src.atlas import get_sprite_atlas, get_atlas_name
+from src.texture import TextureKey, texture_cache, disk_texture_cache
+
 
 class Milliseconds(int):
     pass
@@ -40,20 +44,89 @@ class CardinalDirection(Enum):
 
 
 def load_scaled_surface(path_to_asset: str, scale_factor: float,
-                        has_alpha: bool = True) -> Surface:
-    surface = pygame.image.load(path_to_asset)
-    surface = surface.convert_alpha() if has_alpha else surface.convert()
+                        has_alpha: bool = True, flip_x: bool = False,
+                        flip_y: bool = False) -> Surface:
+    """Load an image asset through the process-wide texture cache
+    (from the sprite atlas if the asset is packed in it, otherwise
+    from the persistent texture cache on disk).
+    The returned surface is shared - copy it before modifying it."""
+    key = TextureKey(os.path.normpath(path_to_asset), scale_factor,
+                     flip_x, flip_y, has_alpha)
+    surface = texture_cache.get(key)
+    if surface is not None:
+        return surface
+
+    atlas = get_sprite_atlas()
+    name = get_atlas_name(path_to_asset)
+    if atlas is not None and name is not None and atlas.contains(name):
+        surface = atlas.get_frame(name, scale_factor)
+        if not has_alpha:
+            surface = surface.convert()
+        if flip_x or flip_y:
+            surface = pygame.transform.flip(surface, flip_x, flip_y)
+    else:
+        surface = disk_texture_cache.load(key)
+        if surface is None:
+            surface = _scale_image_asset(key)
+            disk_texture_cache.store(key, surface)
+
+    return texture_cache.put(key, surface)
+
+
+def _scale_image_asset(key: TextureKey) -> Surface:
+    # the image may have been decoded already by the asset loader
+    # (only if it was preloaded, so the lookup is not counted as a miss)
+    surface = texture_cache.get(get_source_key(key.path), count=False)
+    if surface is None:
+        surface = decode_image(key.path)
+        surface = surface.convert_alpha() if key.has_alpha \
+            else surface.convert()
+    elif not key.has_alpha:
+        surface = surface.convert()
+
     surface = pygame.transform.scale(surface, (
-        int(surface.get_size()[0] * scale_factor),
-        int(surface.get_size()[1] * scale_factor)
+        int(surface.get_size()[0] * key.scale_factor),
+        int(surface.get_size()[1] * key.scale_factor)
     ))
-
+    if key.flip_x or key.flip_y:
+        surface = pygame.transform.flip(surface, key.flip_x, key.flip_y)
     return surface
 
 
+def decode_image(path_to_asset: str) -> Surface:
+    """Decode an image asset (safe to be called from any thread)."""
+    with open_asset(path_to_asset) as file:
+        return pygame.image.load(file, path_to_asset)
+
+
+def get_source_key(path_to_asset: str) -> TextureKey:
+    """:return: cache key of the unscaled image asset (different from
+    the key of the image loaded with the scale factor 1)"""
+    return TextureKey(os.path.normpath(path_to_asset), None, False, False,
+                      True)
+
+
+def cache_source_surface(path_to_asset: str, image: Surface) -> Surface:
+    """Convert an already decoded image asset into the display format
+    and cache it as the source of its scaled variants.
+    Must be called from the main thread."""
+    return texture_cache.put(get_source_key(path_to_asset),
+                             image.convert_alpha())
+
+
 def load_scaled_surfaces(path_to_directory: str, scale_factor: float,
-                         has_alpha: bool = True) -> List[Surface]:
-    files = os.listdir(path_to_directory)
+                         has_alpha: bool = True, flip_x: bool = False,
+                         flip_y: bool = False) -> List[Surface]:
+    atlas = get_sprite_atlas()
+    name = get_atlas_name(path_to_directory)
+    if atlas is not None and name is not None:
+        files = [os.path.basename(frame)
+                 for frame in atlas.list_directory(name)]
+    else:
+        files = []
+    if not files:
+        files = list_asset_directory(path_to_directory)
     return [load_scaled_surface(os.path.join(path_to_directory, file),
-                                scale_factor, has_alpha=has_alpha)
+                                scale_factor, has_alpha=has_alpha,
+                                flip_x=flip_x, flip_y=flip_y)
             for file in sorted(files)]
@@ -0,0 +1,276 @@
+"""
+Verification of recorded games.
+
+Every recording is re-simulated headlessly against the map - the shards
+are spawned where the recording says and its inputs are played back at
+their recorded times. The replay has to reach the claimed result
+(the collected shards and the end time) and spawn the same shards,
+and the hashes of its state (every few inputs and at the end) are compared
+with the hashes recorded during the game - the first mismatch bounds
+the tick where the replay diverged.
+
+A recording is streamed from its file tick by tick (the events of the same
+time), so its verification takes constant memory however long the game.
+
+The recordings are verified by a pool of processes. Verify all the
+recordings in a directory (run from the 'src' directory, like the game):
+
+    PYTHONPATH=.. python -m src.verify_replays recordings/
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import groupby, zip_longest
+from operator import attrgetter
+from typing import Deque, List, Optional, Tuple, Iterator, Iterable
+
+from src.bundle import read_asset_text
+from src.constants import MAP_DEFAULT, REPLAY_EXTENSIONS, \
+    REPLAY_VERIFICATION_CHUNK, CONFIG
+from src.replay import Recording, RecordedEvent, TextInput, StateHash, \
+    ShardSpawn, GameResult, ParsingException
+from src.replay_format import read_events, ReplayFormatException
+from src.settings import GameSettings, load_settings
+from src.simulation import GameSimulation
+from src.utils import Milliseconds, Position
+
+log = logging.getLogger(__name__)
+
+StateTrail = List[Tuple[Milliseconds, int]]  # state hashes by recording time
+
+
+@dataclass
+class VerificationResult:
+    name: str
+    errors: List[str] = field(default_factory=list)
+    collected_shards: int = 0  # by the replay
+    end_time: Optional[Milliseconds] = None  # claimed by the recording
+    # index of the first diverging state hash
+    diverging_tick: Optional[int] = None
+    diverging_time: Optional[Milliseconds] = None
+    trail: StateTrail = field(default_factory=list)  # of the replay
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+
+def verify_recording(recording: Recording, settings: GameSettings,
+                     encoded_map: str, name: str = "") -> VerificationResult:
+    """Re-simulate the recording and compare it with its claims."""
+    return verify_events(recording.data, settings, encoded_map, name)
+
+
+def _pop_positions(positions: Deque[Position]) -> Iterator[Optional[Position]]:
+    """:return: the positions added to the queue (None if it is empty)"""
+    while True:
+        yield positions.popleft() if positions else None
+
+
+def verify_events(events: Iterable[RecordedEvent], settings: GameSettings,
+                  encoded_map: str, name: str = "",
+                  keep_trail: bool = True) -> VerificationResult:
+    """Re-simulate the recorded events and compare them with their claims.
+    The events are consumed tick by tick - the shards recorded in a tick are
+    spawned by its inputs and the replayed hashes and spawns are compared
+    with the recorded ones right away.
+    :param keep_trail: whether to keep the replayed state hashes
+    in the result"""
+    result = VerificationResult(name)
+    spawn_positions: Deque[Position] = deque()  # recorded in the tick
+    simulation = GameSimulation(settings, encoded_map,
+                                spawn_positions=_pop_positions(
+                                    spawn_positions))
+
+    claimed: Optional[GameResult] = None
+    last_input_time: Milliseconds = 0
+    n_hashes = 0  # of the ticks before
+    n_replayed_spawns = n_recorded_spawns = 0
+    spawns_differ = False
+    for _, tick_events in groupby(events, key=attrgetter("time")):
+        # the inputs and the end of the game are replayed in their order
+        steps, recorded_trail, recorded_spawns = [], [], []
+        for event in tick_events:
+            if isinstance(event, TextInput):
+                steps.append(event)
+            elif isinstance(event, StateHash):
+                recorded_trail.append((event.time, event.state_hash))
+            elif isinstance(event, ShardSpawn):
+                recorded_spawns.append((event.time, event.position))
+            elif isinstance(event, GameResult):
+                claimed = event
+                steps.append(event)
+
+        spawn_positions.extend(position for _, position in recorded_spawns)
+        if simulation.data.start_time is None:
+            simulation.start(0)
+        for event in steps:
+            if isinstance(event, GameResult):
+                simulation.finish(event.time)
+            else:
+                simulation.step(event.text_input, event.time)
+                last_input_time = event.time
+        spawn_positions.clear()  # not spawned by the replay
+
+        trail, replayed_spawns = [], []
+        for event in simulation.recording.data:
+            if isinstance(event, StateHash):
+                trail.append((event.time, event.state_hash))
+            elif isinstance(event, ShardSpawn):
+                replayed_spawns.append((event.time, event.position))
+        simulation.recording.data.clear()
+
+        # a missing or an extra state hash is a divergence too
+        if result.diverging_tick is None and trail != recorded_trail:
+            for tick, (replayed, recorded) in enumerate(
+                    zip_longest(trail, recorded_trail), n_hashes):
+                if replayed != recorded:
+                    result.diverging_tick = tick
+                    result.diverging_time = (replayed or recorded)[0]
+                    break
+        n_hashes += max(len(trail), len(recorded_trail))
+        if keep_trail:
+            result.trail.extend(trail)
+
+        n_replayed_spawns += len(replayed_spawns)
+        n_recorded_spawns += len(recorded_spawns)
+        spawns_differ = spawns_differ or replayed_spawns != recorded_spawns
+
+    if claimed is None:
+        result.errors.append("no result was recorded")
+        return result
+    result.end_time = claimed.time
+    result.collected_shards = simulation.data.collected_shards
+
+    if last_input_time > result.end_time:
+        result.errors.append(f"inputs recorded after the end of the game "
+                             f"({result.end_time} ms)")
+    if result.diverging_tick is not None:
+        result.errors.append(f"state diverged by {result.diverging_time} ms "
+                             f"(state hash {result.diverging_tick})")
+    if spawns_differ:
+        result.errors.append(f"replay spawned {n_replayed_spawns} shards "
+                             f"differently from the {n_recorded_spawns} "
+                             f"recorded ones")
+    if result.collected_shards != claimed.collected_shards:
+        result.errors.append(f"replay collected {result.collected_shards} "
+                             f"shards, {claimed.collected_shards} claimed")
+    return result
+
+
+def verify_file(path: str, settings: GameSettings, encoded_map: str,
+                keep_trail: bool = True) -> VerificationResult:
+    """Verify the recording streamed from the file."""
+    try:
+        return verify_events(read_events(path), settings, encoded_map, path,
+                             keep_trail)
+    except (OSError, UnicodeDecodeError, ParsingException,
+            ReplayFormatException) as e:
+        return VerificationResult(path, errors=[f"unreadable - {e}"])
+
+
+# settings and map of a worker process (sent once, not with every task)
+_worker_settings: Optional[GameSettings] = None
+_worker_map: Optional[str] = None
+_worker_keeps_trails = True
+
+
+def _init_worker(settings: GameSettings, encoded_map: str,
+                 keep_trails: bool) -> None:
+    global _worker_settings, _worker_map, _worker_keeps_trails
+    _worker_settings = settings
+    _worker_map = encoded_map
+    _worker_keeps_trails = keep_trails
+
+
+def _verify_in_worker(path: str) -> VerificationResult:
+    return verify_file(path, _worker_settings, _worker_map,
+                       _worker_keeps_trails)
+
+
+def verify_files(paths: List[str], settings: GameSettings, encoded_map: str,
+                 processes: Optional[int] = None,
+                 chunk_size: int = REPLAY_VERIFICATION_CHUNK,
+                 keep_trails: bool = True) -> Iterator[VerificationResult]:
+    """Verify the recordings by a pool of processes.
+    :param processes: size of the pool (the number of CPUs if not given)
+    :param keep_trails: whether to return the replayed state hashes
+    :return: the results in the order of the verified paths"""
+    # forked workers would inherit the signal handlers of an initialised
+    # pygame (SDL) and could not be terminated
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes, _init_worker,
+                      (settings, encoded_map, keep_trails)) as pool:
+        yield from pool.imap(_verify_in_worker, paths, chunk_size)
+        # all verified - let the workers exit instead of terminating them
+        pool.close()
+        pool.join()
+
+
+def find_recordings(paths: Iterable[str]) -> List[str]:
+    """:return: the recording files and the recordings found (recursively)
+    in the directories"""
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for directory, _, files in os.walk(path):
+            found.extend(sorted(os.path.join(directory, file)
+                                for file in files
+                                if file.endswith(REPLAY_EXTENSIONS)))
+    return found
+
+
+def write_trail(result: VerificationResult, trail_directory: str) -> str:
+    """:return: path of the written trail (a state hash per line)"""
+    path = os.path.join(trail_directory,
+                        os.path.basename(result.name) + ".trail")
+    with open(path, "w") as file:
+        file.writelines(f"{time} {state_hash:08x}\n"
+                        for time, state_hash in result.trail)
+    return path
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    # the replayed invalid inputs are reported by the verification
+    logging.getLogger("src.simulation").setLevel(logging.ERROR)
+
+    parser = argparse.ArgumentParser(
+        description="Verify recorded games by re-simulating them")
+    parser.add_argument("paths", nargs="+",
+                        help="recordings or directories with recordings")
+    parser.add_argument("--map", default=MAP_DEFAULT)
+    parser.add_argument("--config", default=CONFIG)
+    parser.add_argument("--processes", type=int, default=None,
+                        help="size of the process pool (all CPUs by default)")
+    parser.add_argument("--trail-dir",
+                        help="directory to write the state hash trails to")
+    args = parser.parse_args()
+
+    game_settings = load_settings(args.config)
+    recording_paths = find_recordings(args.paths)
+    if args.trail_dir is not None:
+        os.makedirs(args.trail_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    n_invalid = 0
+    for verification in verify_files(recording_paths, game_settings,
+                                     read_asset_text(args.map),
+                                     args.processes,
+                                     keep_trails=args.trail_dir is not None):
+        if args.trail_dir is not None:
+            write_trail(verification, args.trail_dir)
+        if not verification.is_valid:
+            n_invalid += 1
+            log.error(f"{verification.name}: "
+                      f"{'; '.join(verification.errors)}")
+
+    log.info(f"Verified {len(recording_paths)} recordings in "
+             f"{time.perf_counter() - started:.2f} s, {n_invalid} invalid")
+    raise SystemExit(1 if n_invalid else 0)